@@ -32,6 +32,73 @@ class Settings(BaseSettings):
     BALANCE_STRATEGY: int = 10
 
     MAX_SLEEP_TIME: int = 10800
+    # Deadlines closer than this to the next wake are handled by the same wake
+    AGENDA_MERGE_WINDOW: int = 120
+    # Dailies are claimed after the server reset, profiles are spread over this many seconds
+    DAILY_RESET_SPREAD: int = 1800
+
+    UPGRADE_STRATEGY: str = 'significance'
+
+    API_BASE_URL: str = "https://api.hamsterkombat.io"
+    # aiohttp or http2 (needs httpx[http2])
+    TRANSPORT: str = 'aiohttp'
+    HTTP2_MAX_CONNECTIONS: int = 4
+    REQUEST_CONNECT_TIMEOUT: float = 10
+    REQUEST_READ_TIMEOUT: float = 30
+    REQUEST_TIMEOUT: float = 60
+    # Per endpoint overrides, e.g. {"TAP": {"read": 15, "total": 20}, "BUY_UPGRADE": {"total": 30}}
+    REQUEST_TIMEOUTS: dict[str, dict[str, float]] = {}
+    # Time a wake may spend on its actions, sleeps between requests don't count
+    CYCLE_BUDGET: float = 300
+    CYCLE_RETRY_DELAY: int = 60
+    # Fleet-wide request rate, 0 means unlimited. Over it requests queue by the value of their action
+    # and are deferred after REQUEST_MAX_WAIT seconds or once their action's deadline has passed
+    REQUEST_RATE: float = 0
+    REQUEST_BURST: int = 10
+    REQUEST_MAX_WAIT: float = 60
+    REQUEST_BUDGET_REPORT_INTERVAL: float = 600
+    # Upgrades are valued at the income they add over this many hours
+    UPGRADE_VALUE_HOURS: float = 24
+
+    # Profiles started per second and first wakes in flight while the fleet boots
+    STARTUP_RATE: float = 5
+    STARTUP_CONCURRENCY: int = 20
+
+    # Shared lease store for running the fleet on several nodes, sqlite:///path/leases.db or redis://host:6379/0
+    LEASE_STORE: str | None = None
+    LEASE_TTL: int = 60
+    NODE_ID: str | None = None
+
+    # Crashed profiles are restarted with exponential backoff and quarantined after too many crashes in a row
+    RESTART_BACKOFF_BASE: float = 10
+    RESTART_BACKOFF_MAX: float = 900
+    RESTART_MAX_CRASHES: int = 5
+    RESTART_QUARANTINE: float = 21600
+
+    FLOOD_WAIT_RETRIES: int = 3
+    TG_CLIENT_POOL_SIZE: int = 10
+
+    CONFIG_RELOAD_INTERVAL: int = 60
+
+    DASHBOARD_REFRESH_INTERVAL: float = 2
+    DASHBOARD_MAX_ROWS: int = 40
+    DASHBOARD_LOG_FILE: Path = ROOT_PATH.joinpath('bot.log')
+    DASHBOARD_LOG_LEVEL: str = 'WARNING'
+
+    PROFILING: bool = False
+    PROFILING_OUTPUT: Path = ROOT_PATH.joinpath('bot.prof')
+    LOOP_LAG_THRESHOLD_MS: int = 200
+
+    # Spans of sampled, failed and slow cycles are written as OTLP JSON lines
+    TRACING: bool = False
+    TRACING_OUTPUT: Path = ROOT_PATH.joinpath('traces.jsonl')
+    TRACING_SAMPLE_RATE: float = 0.01
+    TRACING_SLOW_CYCLE: float = 60
+
+    HISTORY_ENABLED: bool = True
+    HISTORY_FILE: Path = ROOT_PATH.joinpath('history.db')
+    HISTORY_BATCH_SIZE: int = 100
+    HISTORY_FLUSH_INTERVAL: float = 30
 
     DAILY_JSON_URL: str = "https://dntaya.github.io/HamsterKombatBot/daily_combo.json"
     
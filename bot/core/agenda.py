@@ -0,0 +1,51 @@
+import zlib
+
+from bot.core.entities import Sleep, SleepReason
+
+ACTIONS = {
+    SleepReason.WAIT_SYNC: 'sync',
+    SleepReason.WAIT_UPGRADE_MONEY: 'upgrade (money)',
+    SleepReason.WAIT_UPGRADE_COOLDOWN: 'upgrade (cooldown)',
+    SleepReason.WAIT_ENERGY_RECOVER: 'taps',
+    SleepReason.WAIT_ENERGY_BOOST: 'energy boost',
+    SleepReason.WAIT_DAILY_RESET: 'daily reset',
+}
+
+
+def spread_offset(key: str, window: float) -> float:
+    # Stable per key, so a profile keeps its slot across restarts while the fleet is spread over the window
+    return zlib.crc32(key.encode()) % max(int(window), 1)
+
+
+class Agenda:
+    # Earliest pending deadline of every kind. Deadlines closer than merge_window to the earliest one
+    # are served by the same wake, which is delayed up to the latest of them
+    def __init__(self, merge_window: float):
+        self.merge_window = merge_window
+        self.deadlines: dict[SleepReason, Sleep] = {}
+
+    def add(self, reason: SleepReason, delay: float, now: float):
+        deadline = Sleep(delay=max(delay, 0), sleep_reason=reason, created_time=now)
+        current = self.deadlines.get(reason)
+        if current is None or deadline.wake_at < current.wake_at:
+            self.deadlines[reason] = deadline
+
+    def discard(self, reason: SleepReason):
+        self.deadlines.pop(reason, None)
+
+    def next_wake(self) -> float | None:
+        if not self.deadlines:
+            return None
+        earliest = min(deadline.wake_at for deadline in self.deadlines.values())
+        return max(deadline.wake_at for deadline in self.deadlines.values()
+                   if deadline.wake_at <= earliest + self.merge_window)
+
+    def pop_due(self, now: float) -> list[SleepReason]:
+        due = sorted((deadline for deadline in self.deadlines.values() if deadline.wake_at <= now),
+                     key=lambda deadline: deadline.wake_at)
+        for deadline in due:
+            del self.deadlines[deadline.sleep_reason]
+        return [deadline.sleep_reason for deadline in due]
+
+    def describe(self) -> dict[str, tuple[float, str]]:
+        return {ACTIONS[reason]: (deadline.wake_at, ACTIONS[reason]) for reason, deadline in self.deadlines.items()}
@@ -1,22 +1,22 @@
 from enum import StrEnum
 
 class Requests(StrEnum):
-    CONFIG = "https://api.hamsterkombat.io/clicker/config"
-    ME_TELEGRAM = "https://api.hamsterkombat.io/auth/me-telegram"
-    TAP = "https://api.hamsterkombat.io/clicker/tap"
-    BOOSTS_FOR_BUY = "https://api.hamsterkombat.io/clicker/boosts-for-buy"
-    BUY_UPGRADE = "https://api.hamsterkombat.io/clicker/buy-upgrade"
-    UPGRADES_FOR_BUY = "https://api.hamsterkombat.io/clicker/upgrades-for-buy"
-    BUY_BOOST = "https://api.hamsterkombat.io/clicker/buy-boost"
-    CHECK_TASK = "https://api.hamsterkombat.io/clicker/check-task"
-    SELECT_EXCHANGE = "https://api.hamsterkombat.io/clicker/select-exchange"
-    LIST_TASKS = "https://api.hamsterkombat.io/clicker/list-tasks"
-    SYNC = "https://api.hamsterkombat.io/clicker/sync"
-    CLAIM_DAILY_CIPHER = "https://api.hamsterkombat.io/clicker/claim-daily-cipher"
-    CLAIM_DAILY_COMBO = "https://api.hamsterkombat.io/clicker/claim-daily-combo"
-    REFERRAL_STAT = "https://api.hamsterkombat.io/clicker/referral-stat"
-    LIST_AIRDROP_TASKS = "https://api.hamsterkombat.io/clicker/list-airdrop-tasks"
-    CHECK_AIRDROP_TASK = "https://api.hamsterkombat.io/clicker/check-airdrop-task"
-    WEBAPP_AUTH = "https://api.hamsterkombat.io/auth/auth-by-telegram-webapp"
-    ADD_REFERAL = "https://api.hamsterkombat.io/clicker/add-referral"
-    DELETE_WALLET = "https://api.hamsterkombat.io/clicker/delete-wallet"
\ No newline at end of file
+    CONFIG = "/clicker/config"
+    ME_TELEGRAM = "/auth/me-telegram"
+    TAP = "/clicker/tap"
+    BOOSTS_FOR_BUY = "/clicker/boosts-for-buy"
+    BUY_UPGRADE = "/clicker/buy-upgrade"
+    UPGRADES_FOR_BUY = "/clicker/upgrades-for-buy"
+    BUY_BOOST = "/clicker/buy-boost"
+    CHECK_TASK = "/clicker/check-task"
+    SELECT_EXCHANGE = "/clicker/select-exchange"
+    LIST_TASKS = "/clicker/list-tasks"
+    SYNC = "/clicker/sync"
+    CLAIM_DAILY_CIPHER = "/clicker/claim-daily-cipher"
+    CLAIM_DAILY_COMBO = "/clicker/claim-daily-combo"
+    REFERRAL_STAT = "/clicker/referral-stat"
+    LIST_AIRDROP_TASKS = "/clicker/list-airdrop-tasks"
+    CHECK_AIRDROP_TASK = "/clicker/check-airdrop-task"
+    WEBAPP_AUTH = "/auth/auth-by-telegram-webapp"
+    ADD_REFERAL = "/clicker/add-referral"
+    DELETE_WALLET = "/clicker/delete-wallet"
\ No newline at end of file
@@ -0,0 +1,100 @@
+import asyncio
+from collections import OrderedDict, defaultdict
+
+from pyrogram import Client as TgClient
+from pyrogram.errors import Unauthorized, UserDeactivated, AuthKeyUnregistered
+
+from bot.config import settings
+from bot.core.registrator import auth
+from bot.exceptions import InvalidSession, AuthUnavailable
+from bot.utils import logger
+from bot.utils.fingerprint import getFingerprint
+from bot.utils.profile import Profile
+
+
+class AuthManager:
+    # Refreshes expired tokens from the stored Pyrogram sessions. Only the most recently used
+    # Telegram clients stay connected, so a large fleet does not keep every session online
+
+    def __init__(self, pool_size: int):
+        self.pool_size = pool_size
+        self.clients: OrderedDict[str, TgClient] = OrderedDict()
+        self.in_use: set[str] = set()
+        self.locks: dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    @staticmethod
+    def has_session(name: str) -> bool:
+        return settings.ROOT_PATH.joinpath('sessions', f"{name}.session").exists()
+
+    def configure(self, pool_size: int):
+        # Applies reloaded settings, extra clients are disconnected by the next acquire
+        self.pool_size = pool_size
+
+    async def acquire_client(self, name: str) -> TgClient:
+        client = self.clients.pop(name, None)
+        if client is None:
+            client = TgClient(
+                name=name,
+                api_id=settings.API_ID,
+                api_hash=settings.API_HASH,
+                workdir=settings.ROOT_PATH.joinpath('sessions'),
+                no_updates=True
+            )
+        self.clients[name] = client
+        self.in_use.add(name)
+
+        evicted = [old_name for old_name in self.clients if old_name not in self.in_use]
+        for old_name in evicted[:max(len(self.clients) - self.pool_size, 0)]:
+            old_client = self.clients.pop(old_name)
+            if old_client.is_connected:
+                await old_client.disconnect()
+
+        if not client.is_connected:
+            try:
+                await client.connect()
+            except (Unauthorized, UserDeactivated, AuthKeyUnregistered):
+                self.clients.pop(name, None)
+                raise InvalidSession(name)
+        return client
+
+    async def refresh_token(self, profile: Profile, proxy: str | None) -> str:
+        # proxy is the one the profile runs with, which may come from the proxy file instead of the profile
+        expired_token = profile.token
+        async with self.locks[profile.name]:
+            # Another request of the same profile may have refreshed the token already
+            if profile.token != expired_token:
+                return profile.token
+
+            if not self.has_session(profile.name):
+                raise InvalidSession(profile.name)
+
+            logger.info(f"[{profile.name}] Token expired, refreshing it from the Telegram session")
+            try:
+                client = await self.acquire_client(profile.name)
+                fingerprint = await getFingerprint()
+                token = await auth(tg_client=client, fingerprint=fingerprint.fingerprint,
+                                   useragent=profile.user_agent, proxy=proxy)
+            except AuthUnavailable:
+                raise
+            except Exception as error:
+                # Connection, proxy and auth endpoint errors pass, the profile retries later
+                raise AuthUnavailable(profile.name, str(error) or type(error).__name__) from error
+            finally:
+                self.in_use.discard(profile.name)
+
+            if not token:
+                raise AuthUnavailable(profile.name, "no token in the auth response")
+
+            # The assignment is validated and saves the profile, the file write runs in a worker thread
+            await asyncio.to_thread(setattr, profile, 'token', token)
+            logger.success(f"[{profile.name}] Token refreshed")
+            return token
+
+    async def close(self):
+        for client in self.clients.values():
+            if client.is_connected:
+                await client.disconnect()
+        self.clients.clear()
+
+
+auth_manager = AuthManager(pool_size=settings.TG_CLIENT_POOL_SIZE)
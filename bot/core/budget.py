@@ -0,0 +1,49 @@
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from bot.exceptions import CycleBudgetExceeded
+from bot.utils.clock import Clock, clock as system_clock
+
+current_budget: ContextVar['CycleBudget | None'] = ContextVar('current_budget', default=None)
+
+
+class CycleBudget:
+    # Deadline of one wake, available to everything the wake calls through current_budget.
+    # Deliberate sleeps push the deadline back, so only time spent on requests and processing counts.
+    # The deadline is kept on the tapper's clock, a watchdog sleeping on that clock cancels the wake
+    def __init__(self, seconds: float, clock: Clock = system_clock):
+        self.seconds = seconds
+        self.clock = clock
+        self.deadline = 0.0
+        self.expired = False
+
+    @asynccontextmanager
+    async def run(self):
+        token = current_budget.set(self)
+        self.deadline = self.clock.time() + self.seconds
+        task = asyncio.current_task()
+        watchdog = asyncio.create_task(self.watch(task))
+        try:
+            yield self
+        except asyncio.CancelledError as error:
+            # Only the cancel of the watchdog becomes CycleBudgetExceeded, a stop of the tapper stays a cancel
+            if self.expired and task.uncancel() == 0:
+                raise CycleBudgetExceeded(self.seconds) from error
+            raise
+        finally:
+            watchdog.cancel()
+            current_budget.reset(token)
+
+    async def watch(self, task: asyncio.Task):
+        # pause() may move the deadline while the watchdog sleeps, so it checks again when it wakes
+        while (delay := self.deadline - self.clock.time()) > 0:
+            await self.clock.sleep(delay)
+        self.expired = True
+        task.cancel()
+
+    def remaining(self) -> float:
+        return self.deadline - self.clock.time()
+
+    def pause(self, delay: float):
+        self.deadline += delay
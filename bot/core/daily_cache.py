@@ -0,0 +1,60 @@
+import base64
+import hashlib
+from dataclasses import dataclass
+from typing import Callable, TypeVar
+
+from bot.core.entities import Upgrade, upgrade_catalog
+from bot.core.upgrade_graph import UpgradeGraph, UnlockPlan
+
+T = TypeVar('T')
+
+
+@dataclass(frozen=True)
+class ComboPlan:
+    # Combo cards known to the catalog and the shared graph of their prerequisites
+    cards: tuple[str, ...]
+    graph: UpgradeGraph
+
+    def unlock_plan(self, card: str, upgrades: dict[str, Upgrade]) -> UnlockPlan | None:
+        # Chains are shared, levels and prices are the profile's own
+        return self.graph.unlock_plan(card, upgrades)
+
+
+class DailyCache:
+    # The daily cipher and combo are the same for every account, so whatever is derived from them is
+    # computed once per day and content, and shared by all profiles of the process
+    def __init__(self):
+        self.day: int | None = None
+        self.entries: dict[tuple[str, str], object] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind: str, content: str, now: float, compute: Callable[[], T]) -> T:
+        day = int(now // 86400)
+        if day != self.day:
+            self.day = day
+            self.entries.clear()
+        key = (kind, hashlib.sha1(content.encode()).hexdigest())
+        if key in self.entries:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.entries[key] = compute()
+        return self.entries[key]
+
+    def decoded_cipher(self, cipher: str, now: float) -> str:
+        return self.get('cipher', cipher, now,
+                        lambda: base64.b64decode(f"{cipher[:3]}{cipher[4:]}").decode("utf-8"))
+
+    def upgrade_graph(self, now: float) -> UpgradeGraph:
+        # Conditions only change with the catalog, so every profile shares one graph per catalog version
+        return self.get('graph', str(upgrade_catalog.version), now, lambda: UpgradeGraph(upgrade_catalog.metas))
+
+    def combo_plan(self, cards: list[str], now: float) -> ComboPlan:
+        # The catalog version is part of the content, a changed condition gives a new plan
+        graph = self.upgrade_graph(now)
+        return self.get('combo', f"{','.join(cards)}|{upgrade_catalog.version}", now,
+                        lambda: ComboPlan(cards=tuple(card for card in cards if card in graph.chains), graph=graph))
+
+
+daily_cache = DailyCache()
@@ -1,3 +1,4 @@
+import sys
 from dataclasses import dataclass
 from enum import Enum, StrEnum
 from bot.utils.profile import Profile
@@ -42,32 +43,72 @@ class User:
 
 
 
-@dataclass
-class Upgrade:
+@dataclass(frozen=True, slots=True)
+class UpgradeMeta:
     id: str
     name: str
+    condition: dict | None
+    max_level: int | None
+
+
+class UpgradeCatalog:
+    # Static upgrade fields are the same for every account, so they are shared by all profiles of the process
+
+    def __init__(self):
+        self.metas: dict[str, UpgradeMeta] = {}
+        # Bumped whenever a meta is added or changes, so results derived from the catalog can be cached
+        self.version = 0
+
+    def intern(self, data: dict) -> UpgradeMeta:
+        meta = self.metas.get(data["id"])
+        name, condition, max_level = data["name"], data.get("condition"), data.get("maxLevel")
+        if meta is None or meta.name != name or meta.max_level != max_level or meta.condition != condition:
+            meta = UpgradeMeta(id=sys.intern(data["id"]), name=sys.intern(name), condition=condition,
+                               max_level=max_level)
+            self.metas[meta.id] = meta
+            self.version += 1
+        return meta
+
+
+upgrade_catalog = UpgradeCatalog()
+
+
+@dataclass(slots=True)
+class Upgrade:
+    meta: UpgradeMeta
     level: int
     price: float
     earn_per_hour: float
     is_available: bool
     is_expired: bool
     cooldown_seconds: int
-    max_level: int
     welcome_coins: int
-    condition: str
 
     def __init__(self, data: dict):
-        self.id = data["id"]
-        self.name = data["name"]
+        self.meta = upgrade_catalog.intern(data)
         self.level = data["level"]
         self.price = data["price"]
         self.earn_per_hour = data["profitPerHourDelta"]
         self.is_available = data["isAvailable"]
         self.is_expired = data["isExpired"]
         self.cooldown_seconds = data.get("cooldownSeconds", 0)
-        self.max_level = data.get("maxLevel", data["level"])
         self.welcome_coins = data.get("welcomeCoins", 0)
-        self.condition = data.get("condition")
+
+    @property
+    def id(self) -> str:
+        return self.meta.id
+
+    @property
+    def name(self) -> str:
+        return self.meta.name
+
+    @property
+    def condition(self) -> dict | None:
+        return self.meta.condition
+
+    @property
+    def max_level(self) -> int:
+        return self.level if self.meta.max_level is None else self.meta.max_level
 
     def can_upgrade(self) -> bool:
         return self.is_available \
@@ -142,6 +183,9 @@ class SleepReason(Enum):
     WAIT_UPGRADE_COOLDOWN = 1
     WAIT_UPGRADE_MONEY = 2
     WAIT_ENERGY_RECOVER = 3
+    WAIT_SYNC = 4
+    WAIT_ENERGY_BOOST = 5
+    WAIT_DAILY_RESET = 6
 
 
 @dataclass
@@ -150,6 +194,10 @@ class Sleep:
     sleep_reason: SleepReason
     created_time: float
 
+    @property
+    def wake_at(self) -> float:
+        return self.created_time + self.delay
+
 
 @dataclass
 class AirDropTask:
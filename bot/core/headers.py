@@ -6,7 +6,6 @@ def Headers(additional = {}) -> dict:
         'Accept-Language': 'ru,ru-RU;q=0.9,en-US;q=0.8,en;q=0.7',
         'Accept-Encoding': 'gzip, deflate, br',
         'Connection': 'keep-alive',
-        'Host': 'api.hamsterkombat.io',
         'Origin': 'https://hamsterkombat.io',
         'Referer': 'https://hamsterkombat.io/',
         'X-Requested-With': 'org.telegram.messenger',
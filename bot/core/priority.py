@@ -0,0 +1,155 @@
+"""Fleet-wide request budget, spent on the most valuable actions first.
+
+Actions are tagged with the coins they are expected to bring and the time after which they are worth
+nothing, requests made inside an action inherit its tag through `current_action`. While the bucket
+has tokens requests go out right away. Once it runs dry they queue and are released highest value
+first, a request whose deadline passes or which waits longer than max_wait is deferred instead.
+Untagged requests only wait, they have neither a deadline nor a limit on their wait.
+"""
+import asyncio
+import heapq
+import itertools
+import math
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from bot.config import settings
+from bot.exceptions import RequestDeferred
+from bot.utils import logger
+from bot.utils.clock import Clock, clock as system_clock
+
+
+@dataclass(frozen=True)
+class ActionValue:
+    label: str
+    value: float
+    deadline: float = math.inf
+
+
+# Requests outside of a tagged action, like auth refreshes, go first and are never deferred
+UNTAGGED = ActionValue(label='untagged', value=math.inf)
+
+current_action: ContextVar[ActionValue] = ContextVar('current_action', default=UNTAGGED)
+
+
+@contextmanager
+def action_value(label: str, value: float, deadline: float = math.inf):
+    token = current_action.set(ActionValue(label=label, value=value, deadline=deadline))
+    try:
+        yield
+    finally:
+        current_action.reset(token)
+
+
+class RequestBudget:
+    # Token bucket of `rate` requests per second with room for `burst`, a rate of 0 disables it
+    def __init__(self, rate: float, burst: int, max_wait: float, clock: Clock = system_clock):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_wait = max_wait
+        self.clock = clock
+        self.tokens = float(self.burst)
+        self.updated_at = clock.time()
+        # (-value, deadline, order, queued_at, action, future), so the most valuable request pops first
+        self.queue: list[tuple[float, float, int, float, ActionValue, asyncio.Future]] = []
+        self.counter = itertools.count()
+        self.dispatcher: asyncio.Task | None = None
+        # Since the last report
+        self.granted = 0
+        self.waited = 0
+        self.deferred: dict[str, int] = defaultdict(int)
+        self.deferred_value: dict[str, float] = defaultdict(float)
+
+    def configure(self, rate: float, burst: int, max_wait: float):
+        # Applies reloaded settings, tokens gathered at the old rate are kept up to the new burst
+        self.refill()
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_wait = max_wait
+        self.tokens = min(self.tokens, self.burst)
+        if rate <= 0:
+            # The budget is off, whatever is queued goes out now
+            for *_, future in self.queue:
+                if not future.done():
+                    future.set_result(None)
+            self.queue.clear()
+
+    def refill(self):
+        now = self.clock.time()
+        self.tokens = min(self.tokens + (now - self.updated_at) * self.rate, self.burst)
+        self.updated_at = now
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        self.refill()
+        if not self.queue and self.tokens >= 1:
+            self.tokens -= 1
+            self.granted += 1
+            return
+
+        action = current_action.get()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.queue, (-action.value, action.deadline, next(self.counter), self.clock.time(),
+                                    action, future))
+        self.waited += 1
+        if self.dispatcher is None or self.dispatcher.done():
+            self.dispatcher = asyncio.create_task(self.dispatch())
+        await future
+
+    async def dispatch(self):
+        while self.queue:
+            self.expire()
+            if not self.queue:
+                break
+            self.refill()
+            if self.tokens < 1:
+                await self.clock.sleep((1 - self.tokens) / self.rate)
+                continue
+            *_, future = heapq.heappop(self.queue)
+            # Waiters cancelled by their cycle budget are dropped without spending a token
+            if future.done():
+                continue
+            self.tokens -= 1
+            self.granted += 1
+            future.set_result(None)
+
+    def expire(self):
+        now = self.clock.time()
+        kept = []
+        for entry in self.queue:
+            _, deadline, _, queued_at, action, future = entry
+            if future.done():
+                continue
+            if deadline <= now or (math.isfinite(action.value) and now - queued_at >= self.max_wait):
+                self.deferred[action.label] += 1
+                if math.isfinite(action.value):
+                    self.deferred_value[action.label] += action.value
+                future.set_exception(RequestDeferred(action.label, action.value))
+            else:
+                kept.append(entry)
+        if len(kept) != len(self.queue):
+            heapq.heapify(kept)
+            self.queue = kept
+
+    def report(self) -> str:
+        deferred = sorted(self.deferred, key=lambda label: self.deferred_value[label], reverse=True)
+        return (f"Request budget: {self.granted} sent, {self.waited} queued, {sum(self.deferred.values())} deferred "
+                f"worth {sum(self.deferred_value.values()):,.0f} coins"
+                + "".join(f" | {label}: {self.deferred[label]} ({self.deferred_value[label]:,.0f})"
+                          for label in deferred))
+
+    async def run(self, report_interval: float):
+        while True:
+            await self.clock.sleep(report_interval)
+            if self.waited:
+                (logger.warning if self.deferred else logger.info)(self.report())
+            self.granted = self.waited = 0
+            self.deferred.clear()
+            self.deferred_value.clear()
+
+
+request_budget = RequestBudget(rate=settings.REQUEST_RATE, burst=settings.REQUEST_BURST,
+                               max_wait=settings.REQUEST_MAX_WAIT)
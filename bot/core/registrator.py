@@ -1,29 +1,36 @@
 import asyncio
-from urllib.parse import unquote
+import json
+from pathlib import Path
+from urllib.parse import unquote, quote
 
-import requests
 from pyrogram import Client as TgClient
-from pyrogram.errors import Unauthorized, UserDeactivated, AuthKeyUnregistered, FloodWait
+from pyrogram.errors import Unauthorized, UserDeactivated, AuthKeyUnregistered, FloodWait, PeerIdInvalid, \
+    UserIdInvalid, BotInvalid
 from pyrogram.raw.functions.messages import RequestWebView
+from pyrogram.raw.types import InputPeerUser
 
 from bot.config import settings
 from bot.utils import logger
 from bot.utils.profile import Profile
 from bot.utils.fingerprint import getFingerprint
-from bot.exceptions import InvalidSession
-from bot.core.headers import Headers
+from bot.exceptions import InvalidSession, AuthUnavailable
 from bot.core.api import Requests
+from bot.core.transport import create_transport, RequestTimeout
+
+
+BOT_USERNAME = 'hamster_kombat_bot'
 
 
 async def register_client() -> None:
-    profile_name = input('\nEnter the profile name (press Enter to exit): ')
+    # input() blocks, so it runs in a thread to keep a running fleet alive
+    profile_name = await asyncio.to_thread(input, '\nEnter the profile name (press Enter to exit): ')
 
     if not profile_name:
         return None
     
-    proxy = input('\nEnter the proxy address(press Enter to skip): ')
+    proxy = await asyncio.to_thread(input, '\nEnter the proxy address(press Enter to skip): ')
 
-    token = input('\nEnter the token (Leave empty to start TG Auth): ')
+    token = await asyncio.to_thread(input, '\nEnter the token (Leave empty to start TG Auth): ')
 
     fingerprint = await getFingerprint()
 
@@ -34,7 +41,8 @@ async def register_client() -> None:
             logger.error(f"Failed to register client by TG Auth: {error}")
             raise
     
-    Profile(name=profile_name, token=token, user_agent = fingerprint.useragent)
+    # Profile saves itself to disk on validation
+    await asyncio.to_thread(Profile, name=profile_name, token=token, user_agent = fingerprint.useragent)
 
     logger.success(f'Profile `{profile_name}` added successfully')
 
@@ -51,8 +59,7 @@ async def register_client_by_tg_auth(profile_name, fingerprint, useragent, proxy
             workdir=settings.ROOT_PATH.joinpath('sessions')
         )
         async with tg_client:
-            me = await tg_client.get_me()
-        access_token = await auth(tg_client=tg_client, fingerprint=fingerprint, useragent=useragent, proxy=proxy )
+            access_token = await auth(tg_client=tg_client, fingerprint=fingerprint, useragent=useragent, proxy=proxy)
 
         return access_token
 
@@ -62,59 +69,101 @@ async def register_client_by_tg_auth(profile_name, fingerprint, useragent, proxy
 
 
 async def auth(tg_client: TgClient, fingerprint: str, useragent: str, proxy: str) -> str | None:
-    
-    headers = Headers({'authorization': 'authToken is empty, store token null', 'User-Agent': useragent, 'Content-Type': 'application/json'})
 
     tg_web_data = await get_tg_web_data(tg_client)
 
-    response = requests.post(url=Requests.WEBAPP_AUTH, headers=headers,
-                              data=f'{{"initDataRaw":"{requests.utils.quote(tg_web_data, safe='=&')}","fingerprint":{fingerprint}}}',
-                              proxies = {'https': proxy} if proxy else None) 
+    if isinstance(fingerprint, str):
+        fingerprint = json.loads(fingerprint)
+
+    headers = {'authorization': 'authToken is empty, store token null', 'User-Agent': useragent}
+    body = {'initDataRaw': quote(tg_web_data, safe="=&"), 'fingerprint': fingerprint}
+
+    # Same transport, timeouts and status handling as the requests of WebClient
+    async with create_transport(proxy=proxy or None) as transport:
+        response = await transport.post(url=f"{settings.API_BASE_URL}{Requests.WEBAPP_AUTH}", headers=headers,
+                                        json=body, timeout=RequestTimeout.for_request(Requests.WEBAPP_AUTH.name))
+    response.raise_for_status()
+
+    return json.loads(response.text).get('authToken')
 
-    return response.json().get('authToken')
 
+def get_peer_cache_path(tg_client: TgClient) -> Path:
+    return Path(tg_client.workdir).joinpath(f"{tg_client.name}.peers.json")
 
-async def get_tg_web_data(tg_client: TgClient) -> str | None:
+
+async def load_cached_peer(tg_client: TgClient) -> InputPeerUser | None:
+    path = get_peer_cache_path(tg_client)
     try:
-        if not tg_client.is_connected:
-            try:
-                await tg_client.connect()
-            except (Unauthorized, UserDeactivated, AuthKeyUnregistered):
-                raise InvalidSession("hamster_bot")
+        data = json.loads(await asyncio.to_thread(path.read_text))
+        return InputPeerUser(user_id=data[BOT_USERNAME]['user_id'], access_hash=data[BOT_USERNAME]['access_hash'])
+    except (OSError, ValueError, KeyError):
+        return None
+
 
-        dialogs = tg_client.get_dialogs()
-        async for dialog in dialogs:
-            if dialog.chat and dialog.chat.username and dialog.chat.username == 'hamster_kombat_bot':
-                break
+async def save_cached_peer(tg_client: TgClient, peer: InputPeerUser):
+    data = json.dumps({BOT_USERNAME: {'user_id': peer.user_id, 'access_hash': peer.access_hash}})
+    await asyncio.to_thread(get_peer_cache_path(tg_client).write_text, data)
 
-        while True:
+
+async def retry_on_flood_wait(call):
+    for attempt in range(settings.FLOOD_WAIT_RETRIES + 1):
+        try:
+            return await call()
+        except FloodWait as error:
+            if attempt == settings.FLOOD_WAIT_RETRIES:
+                raise
+            logger.warning(f"FloodWait for {error.value}s, retry {attempt + 1}/{settings.FLOOD_WAIT_RETRIES}")
+            await asyncio.sleep(delay=error.value)
+
+
+async def request_web_view(tg_client: TgClient, peer):
+    return await retry_on_flood_wait(lambda: tg_client.invoke(RequestWebView(
+        peer=peer,
+        bot=peer,
+        platform='android',
+        from_bot_menu=False,
+        url='https://hamsterkombat.io/'
+    )))
+
+
+async def get_tg_web_data(tg_client: TgClient) -> str:
+    # The caller owns the connection, it is only opened here when the client comes in disconnected.
+    # Only a revoked session raises InvalidSession, every other failure may pass and raises AuthUnavailable
+    connected_here = False
+    try:
+        if not tg_client.is_connected:
+            await tg_client.connect()
+            connected_here = True
+
+        peer = await load_cached_peer(tg_client)
+        web_view = None
+        if peer is not None:
             try:
-                peer = await tg_client.resolve_peer('hamster_kombat_bot')
-                break
-            except FloodWait:
-                return None
-
-        web_view = await tg_client.invoke(RequestWebView(
-            peer=peer,
-            bot=peer,
-            platform='android',
-            from_bot_menu=False,
-            url='https://hamsterkombat.io/'
-        ))
+                web_view = await request_web_view(tg_client, peer)
+            except (PeerIdInvalid, UserIdInvalid, BotInvalid):
+                logger.warning(f"Cached peer of {BOT_USERNAME} is outdated, resolving it again")
+
+        if web_view is None:
+            peer = await retry_on_flood_wait(lambda: tg_client.resolve_peer(BOT_USERNAME))
+            await save_cached_peer(tg_client, peer)
+            web_view = await request_web_view(tg_client, peer)
 
         auth_url = web_view.url
         tg_web_data = unquote(
             string=unquote(
                 string=auth_url.split('tgWebAppData=', maxsplit=1)[1].split('&tgWebAppVersion', maxsplit=1)[0]))
 
-        if tg_client.is_connected:
-            await tg_client.disconnect()
-
         return tg_web_data
 
-    except InvalidSession as error:
-        raise error
+    except (Unauthorized, UserDeactivated, AuthKeyUnregistered) as error:
+        raise InvalidSession(tg_client.name) from error
+
+    except FloodWait as error:
+        raise AuthUnavailable(tg_client.name, f"FloodWait for {error.value}s", retry_after=error.value) from error
 
     except Exception as error:
-        logger.error(f"Unknown error during Authorization: {error}")
-        await asyncio.sleep(delay=3)
+        raise AuthUnavailable(tg_client.name, str(error) or type(error).__name__) from error
+
+    finally:
+        if connected_here and tg_client.is_connected:
+            await tg_client.disconnect()
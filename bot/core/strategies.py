@@ -0,0 +1,127 @@
+import heapq
+from abc import ABC, abstractmethod
+
+from bot.config import settings
+from bot.core.entities import Upgrade, User, Sleep, SleepReason
+from bot.utils.profile import Profile
+
+
+STRATEGIES: dict[str, type['UpgradeStrategy']] = {}
+DEFAULT_STRATEGY = 'significance'
+
+
+def register_strategy(name: str):
+    def decorator(cls):
+        cls.name = name
+        STRATEGIES[name] = cls
+        return cls
+    return decorator
+
+
+def get_strategy(name: str) -> 'UpgradeStrategy':
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown upgrade strategy `{name}`, available: {', '.join(STRATEGIES)}")
+    return STRATEGIES[name]()
+
+
+def get_spending_balance(user: User, profile: Profile) -> float:
+    return user.balance - user.earn_per_hour * profile.balance_strategy
+
+
+class UpgradeStrategy(ABC):
+    name: str
+
+    @abstractmethod
+    def score(self, upgrade: Upgrade, user: User, profile: Profile, upgrades: list[Upgrade]) -> float:
+        # Lower is better
+        ...
+
+    def filter(self, upgrades: list[Upgrade], user: User, profile: Profile) -> list[Upgrade]:
+        available_upgrades = filter(lambda u: u.can_upgrade(), upgrades)
+
+        if not profile.wait_for_most_profit_upgrades:
+            available_upgrades = filter(
+                lambda u: get_spending_balance(user, profile) > u.price and u.cooldown_seconds == 0,
+                available_upgrades)
+
+        return list(available_upgrades)
+
+    def sleep_decision(self, upgrade: Upgrade, user: User, profile: Profile, now: float) -> Sleep | None:
+        # None means the upgrade can be bought right now
+        spending_balance = get_spending_balance(user, profile)
+        if upgrade.price > spending_balance:
+            delay = settings.MAX_SLEEP_TIME if user.earn_per_sec == 0 \
+                else min(int((upgrade.price - spending_balance) / user.earn_per_sec), settings.MAX_SLEEP_TIME)
+            return Sleep(delay=delay, sleep_reason=SleepReason.WAIT_UPGRADE_MONEY, created_time=now)
+
+        if upgrade.cooldown_seconds > 0:
+            return Sleep(delay=upgrade.cooldown_seconds, sleep_reason=SleepReason.WAIT_UPGRADE_COOLDOWN,
+                         created_time=now)
+
+        return None
+
+    def choose(self, upgrades: list[Upgrade], user: User, profile: Profile) -> Upgrade | None:
+        available_upgrades = self.filter(upgrades, user, profile)
+        if not available_upgrades:
+            return None
+        return min(available_upgrades, key=lambda u: self.score(u, user, profile, available_upgrades))
+
+
+@register_strategy('significance')
+class SignificanceStrategy(UpgradeStrategy):
+    # Payback time plus cooldown plus the time left to save money for the upgrade
+
+    def score(self, upgrade: Upgrade, user: User, profile: Profile, upgrades: list[Upgrade]) -> float:
+        if upgrade.price == 0:
+            return 0
+        if upgrade.earn_per_hour <= 0:
+            return float('inf')
+        if user.earn_per_hour == 0:
+            return upgrade.price / upgrade.earn_per_hour
+        return upgrade.price / upgrade.earn_per_hour \
+            + upgrade.cooldown_seconds / 3600 \
+            + max((upgrade.price - get_spending_balance(user, profile)) / user.earn_per_hour, 0)
+
+
+@register_strategy('payback')
+class PaybackStrategy(UpgradeStrategy):
+    # Pure payback time, ignores how long it takes to save money for the upgrade
+
+    def score(self, upgrade: Upgrade, user: User, profile: Profile, upgrades: list[Upgrade]) -> float:
+        if upgrade.earn_per_hour <= 0:
+            return float('inf')
+        return upgrade.price / upgrade.earn_per_hour + upgrade.cooldown_seconds / 3600
+
+
+@register_strategy('lookahead')
+class LookaheadStrategy(UpgradeStrategy):
+    # Scores two purchases ahead: the upgrade itself and the best payback upgrade bought after it,
+    # taking into account that the first purchase speeds up saving money for the second one
+    candidates = 5
+
+    def score(self, upgrade: Upgrade, user: User, profile: Profile, upgrades: list[Upgrade]) -> float:
+        if upgrade.earn_per_hour <= 0:
+            return float('inf')
+
+        earn_per_hour = max(user.earn_per_hour, 1)
+        spending_balance = get_spending_balance(user, profile)
+        first_wait = max((upgrade.price - spending_balance) / earn_per_hour, upgrade.cooldown_seconds / 3600, 0)
+        balance_after_first = max(spending_balance - upgrade.price, 0)
+
+        best = upgrade.price / upgrade.earn_per_hour + first_wait
+        for second in heapq.nsmallest(self.candidates, (u for u in upgrades if u is not upgrade and u.earn_per_hour > 0),
+                                      key=lambda u: u.price / u.earn_per_hour):
+            second_wait = max((second.price - balance_after_first) / (earn_per_hour + upgrade.earn_per_hour),
+                              second.cooldown_seconds / 3600, 0)
+            best = min(best, first_wait + second_wait
+                       + (upgrade.price + second.price) / (upgrade.earn_per_hour + second.earn_per_hour))
+        return best
+
+    def choose(self, upgrades: list[Upgrade], user: User, profile: Profile) -> Upgrade | None:
+        available_upgrades = self.filter(upgrades, user, profile)
+        if not available_upgrades:
+            return None
+        # Second purchases are only looked up among the best payback upgrades, so scoring stays linear
+        next_upgrades = heapq.nsmallest(self.candidates + 1, (u for u in available_upgrades if u.earn_per_hour > 0),
+                                        key=lambda u: u.price / u.earn_per_hour)
+        return min(available_upgrades, key=lambda u: self.score(u, user, profile, next_upgrades))
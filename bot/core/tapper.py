@@ -1,63 +1,176 @@
 # pylint: disable=W0718
 
-import asyncio
-import base64
 import datetime
+import math
 import traceback
+from contextlib import nullcontext
 from random import randint, choice
-from time import time
 
-import aiohttp
-from aiohttp_proxy import ProxyConnector
 
 from bot.config import settings
 from bot.utils.combo import combo
-from bot.core.entities import DailyCipher, Upgrade, User, Boost, Task, DailyCombo, Sleep, SleepReason
+from bot.core.agenda import Agenda, ACTIONS, spread_offset
+from bot.core.entities import DailyCipher, Upgrade, User, Boost, Task, DailyCombo, SleepReason
+from bot.core.strategies import UpgradeStrategy, get_strategy, get_spending_balance, DEFAULT_STRATEGY
+from bot.core.auth_manager import auth_manager
+from bot.core.budget import CycleBudget, current_budget
+from bot.core.priority import action_value, request_budget
+from bot.core.daily_cache import daily_cache, ComboPlan
+from bot.core.transport import create_transport
 from bot.core.web_client import WebClient
-from bot.exceptions import InvalidSession
+from bot.exceptions import InvalidSession, AuthUnavailable, ResponseError, TransportError, CycleBudgetExceeded, \
+    RequestDeferred
 from bot.utils import logger
+from bot.utils.clock import Clock, clock as system_clock
+from bot.utils.fleet import fleet
+from bot.utils.history import history, CycleRecord
+from bot.utils.profiling import profiler, CpuMeter
 from bot.utils.profile import Profile
-from .headers import Headers
+from bot.utils.ramp import RampController
+from bot.utils.tracing import tracer
+from bot.utils.reloader import reloader, get_mtime
 
 
 class Tapper:
-    def __init__(self, web_client: WebClient) -> None:
+    def __init__(self, web_client: WebClient, ramp: RampController | None = None,
+                 resume_at: float | None = None, clock: Clock = system_clock) -> None:
+        self.clock = clock
         self.web_client = web_client
+        self.ramp = ramp
+        self.resume_at = resume_at
         self.profile = web_client.profile
+        self.status = fleet.get(self.profile.name)
+        self.profile_mtime = get_mtime(settings.PROFILE_DIR.joinpath(f"{self.profile.name}.json"))
         self.user = User(data={})
-        self.upgrades: list[Upgrade] = []
+        self.upgrades = []
         self.boosts: list[Boost] = []
         self.tasks: list[Task] = []
+        self.agenda = Agenda(merge_window=settings.AGENDA_MERGE_WINDOW)
+        self.settings_version = fleet.settings_version
+        self.daily_reset_at = math.inf
+        self.cipher_bonus = 0
         self.daily_combo: DailyCombo | None = None
-        self.preferred_sleep: Sleep | None = None
-
-    def update_preferred_sleep(self, delay: float, sleep_reason: SleepReason):
-        if self.preferred_sleep is not None and delay >= self.preferred_sleep.delay:
+        # Counters since the last history record, they all cover the wakes since then
+        self.cpu = CpuMeter()
+        self.recorded_cpu = 0.0
+        self.recorded_requests = 0
+        self.purchases = 0
+        self.spent = 0.0
+        self.wakes = 0
+        self.awake = 0.0
+
+    @property
+    def user(self) -> User:
+        return self._user
+
+    @user.setter
+    def user(self, user: User):
+        # Actions between server responses use this state, so time based estimates are advanced from the last snapshot
+        self._user = user
+        self.user_updated_at = self.clock.time()
+        self.update_status()
+
+    def update_status(self):
+        self.status.update_user(balance=self._user.balance, earn_per_hour=self._user.earn_per_hour,
+                                energy=self._user.available_energy, max_energy=self._user.max_energy)
+        if fleet.columns is not None:
+            energy_target = self._user.max_energy * self.profile.min_taps_for_clicker_in_percent / 100 \
+                if self.profile.auto_clicker else 0
+            fleet.columns.update(self.profile.name, balance=self._user.balance, earn_per_sec=self._user.earn_per_sec,
+                                 energy=self._user.available_energy, recover_per_sec=self._user.energy_recover_per_sec,
+                                 max_energy=self._user.max_energy, energy_target=energy_target,
+                                 updated_at=self.user_updated_at)
+
+    def schedule_upgrade(self, reason: SleepReason, delay: float):
+        now = self.clock.time()
+        self.agenda.add(reason, delay=max(delay, 40), now=now)
+        if fleet.columns is None:
             return
-        self.preferred_sleep = Sleep(delay=delay, sleep_reason=sleep_reason, created_time=time())
+        if reason == SleepReason.WAIT_UPGRADE_MONEY:
+            fleet.columns.update(self.profile.name, money_target=self.user.balance + self.user.earn_per_sec * delay)
+        else:
+            fleet.columns.update(self.profile.name, cooldown_until=now + delay)
+
+    @property
+    def upgrades(self) -> list[Upgrade]:
+        return self._upgrades
+
+    @upgrades.setter
+    def upgrades(self, upgrades: list[Upgrade]):
+        self._upgrades = upgrades
+        self.upgrades_updated_at = self.clock.time()
+        self.upgrades_by_id = {upgrade.id: upgrade for upgrade in upgrades}
+
+    @property
+    def daily_combo(self) -> DailyCombo | None:
+        return self._daily_combo
+
+    @daily_combo.setter
+    def daily_combo(self, daily_combo: DailyCombo | None):
+        # Cipher, combo and streak reset together, remain_seconds tells when
+        self._daily_combo = daily_combo
+        if daily_combo is not None and daily_combo.remain_seconds > 0:
+            self.daily_reset_at = self.clock.time() + daily_combo.remain_seconds
+            delay = daily_combo.remain_seconds + spread_offset(self.profile.name, settings.DAILY_RESET_SPREAD)
+            self.agenda.add(SleepReason.WAIT_DAILY_RESET, delay=delay, now=self.clock.time())
+
+    def next_daily_reset(self) -> float:
+        # Unclaimed dailies are lost at the reset, once it has passed the next one is a day later
+        reset_at, now = self.daily_reset_at, self.clock.time()
+        while reset_at <= now:
+            reset_at += 86400
+        return reset_at
+
+    def advance_user_state(self):
+        now = self.clock.time()
+        elapsed = now - self.user_updated_at
+        self.user_updated_at = now
+        self._user.available_energy = min(self._user.available_energy + self._user.energy_recover_per_sec * elapsed,
+                                          self._user.max_energy)
+        self._user.balance += self._user.earn_per_sec * elapsed
+        self.update_status()
+
+    def apply_config_changes(self):
+        if reloader.reload_settings():
+            # Objects shared by the fleet are reconfigured once, by the profile that noticed the change
+            request_budget.configure(rate=settings.REQUEST_RATE, burst=settings.REQUEST_BURST,
+                                     max_wait=settings.REQUEST_MAX_WAIT)
+            history.configure(batch_size=settings.HISTORY_BATCH_SIZE, flush_interval=settings.HISTORY_FLUSH_INTERVAL)
+            auth_manager.configure(pool_size=settings.TG_CLIENT_POOL_SIZE)
+        profile = self.profile
+        if self.settings_version != fleet.settings_version:
+            # Every profile rereads the settings it took when it was built
+            self.settings_version = fleet.settings_version
+            self.agenda.merge_window = settings.AGENDA_MERGE_WINDOW
+            profile = reloader.resolve_defaults(profile)
+        profile, self.profile_mtime = reloader.reload_profile(profile, self.profile_mtime)
+        if profile is not self.profile:
+            self.profile = profile
+            self.web_client.set_profile(profile)
 
     def get_spending_balance(self):
-        return self.user.balance - self.user.earn_per_hour*self.profile.balance_strategy
+        return get_spending_balance(self.user, self.profile)
 
-    def upgrade_calculate_significance(self, upgarde: Upgrade) -> float:
-        if upgarde.price == 0:
-            return 0
-        if self.user.earn_per_hour == 0:
-            return upgarde.price / upgarde.earn_per_hour
-        return upgarde.price / upgarde.earn_per_hour \
-            + upgarde.cooldown_seconds / 3600 \
-            + max((upgarde.price - self.get_spending_balance()) / self.user.earn_per_hour, 0)
+    def get_upgrade_strategy(self) -> UpgradeStrategy:
+        try:
+            return get_strategy(self.profile.upgrade_strategy)
+        except ValueError as error:
+            logger.warning(f"[{self.profile.name}] {error}. Using `{DEFAULT_STRATEGY}`")
+            return get_strategy(DEFAULT_STRATEGY)
 
     async def earn_money(self):
         user = await self.web_client.get_user_data()
-
         self.user = user
 
         if not self.user.exchange_id or self.user.exchange_id == "hamster":
-            await self.web_client.select_exchange(exchange_id:=choice(["binance", "bybit", "okx", "bingx", "htx", "kucoin"]))
-            status = await self.web_client.check_task(task_id="select_exchange")
-            if status is True:
-                logger.success(f"[{self.profile.name}] Successfully selected exchange <y>{exchange_id}</y>")
+            try:
+                with action_value('select exchange', 0):
+                    await self.web_client.select_exchange(exchange_id:=choice(["binance", "bybit", "okx", "bingx", "htx", "kucoin"]))
+                    status = await self.web_client.check_task(task_id="select_exchange")
+                if status is True:
+                    logger.success(f"[{self.profile.name}] Successfully selected exchange <y>{exchange_id}</y>")
+            except RequestDeferred as error:
+                self.note_deferred(error)
 
         logger.info(f"[{self.profile.name}] Last passive earn: <g>+{self.user.last_passive_earn}</g> | "
                     f"Earn every hour: <y>{self.user.earn_per_hour}</y>")
@@ -67,9 +180,10 @@ class Tapper:
         if cipher.is_claimed:
             return
 
-        decoded_cipher = base64.b64decode(f"{cipher.cipher[:3]}{cipher.cipher[4:]}").decode(
-            "utf-8")
-        self.user = await self.web_client.claim_daily_cipher(cipher=decoded_cipher)
+        self.cipher_bonus = cipher.bonus_coins
+        decoded_cipher = daily_cache.decoded_cipher(cipher.cipher, now=self.clock.time())
+        with action_value('daily cipher', cipher.bonus_coins, self.next_daily_reset()):
+            self.user = await self.web_client.claim_daily_cipher(cipher=decoded_cipher)
         logger.success(f"[{self.profile.name}] Successfully get cipher reward | "
                        f"Cipher: <m>{decoded_cipher}</m> | Reward coins: <g>+{cipher.bonus_coins}</g>")
         await self.sleep(delay=5)
@@ -80,56 +194,57 @@ class Tapper:
             if reward_claimed:
                 return False
 
-            if combo.expired < int(time()):
+            if combo.is_expired(now=self.clock.time()):
                 logger.info(f"[{self.profile.name}] Cached combo file expired, let's try to update remotely...")
-                if not await combo.update():
+                if not await combo.update(now=self.clock.time()):
                     logger.warning(f"[{self.profile.name}] Remoute combo file expired. Combo update skiped.")
                     return False        
 
-            combo_upgrades: list[Upgrade] = list(
-                filter(lambda u: u.id in combo.combo and u.id not in self.daily_combo.upgrade_ids, self.upgrades))
-
-            for upgrade in combo_upgrades:
-                ready = await self.recursive_upgrade_to(upgrade)
+            # Cards and their prerequisite chains are shared by all profiles, only levels are checked here
+            plan = daily_cache.combo_plan(combo.combo, now=self.clock.time())
+            for card in plan.cards:
+                if card not in self.upgrades_by_id or card in self.daily_combo.upgrade_ids:
+                    continue
+                ready = await self.recursive_upgrade_to(self.upgrades_by_id[card], plan)
                 if not ready:
                     return False
 
             await self.try_claim_daily_combo()
         return False
     
-    async def recursive_upgrade_to(self, upgrade):
-        if upgrade.is_available:
-            if upgrade.price > self.profile.min_balance:
-                logger.info(f"[{self.profile.name}] Not enough money for upgrade <e>{upgrade.name}</e>")
-                self.update_preferred_sleep(
-                    delay=int((upgrade.price - self.profile.min_balance) / self.user.earn_per_sec),
-                    sleep_reason=SleepReason.WAIT_UPGRADE_MONEY
-                )
-                return True
-
-            if upgrade.cooldown_seconds > 0:
-                logger.info(f"[{self.profile.name}] Upgrade <e>{upgrade.name}</e> on cooldown for <y>{upgrade.cooldown_seconds}s</y>")
-                self.update_preferred_sleep(
-                    delay=upgrade.cooldown_seconds,
-                    sleep_reason=SleepReason.WAIT_UPGRADE_COOLDOWN
-                )
-                return True
+    async def recursive_upgrade_to(self, upgrade: Upgrade, plan: ComboPlan):
+        unlock = plan.unlock_plan(upgrade.id, self.upgrades_by_id)
+        if unlock is None or not unlock.reachable:
+            logger.info(f"[{self.profile.name}] Can't upgrade recursive <e>{upgrade.name}</e> for daily combo. Condition <e>{upgrade.condition}</e>. Skipped")
+            return False
 
-            await self.do_upgrade(upgrade=upgrade)
+        if len(unlock.chain) > 1:
+            logger.info(f"[{self.profile.name}] <e>{upgrade.name}</e> for daily combo needs "
+                        f"{len(unlock.chain)} upgrades for <y>{int(unlock.total_cost)}</y> coins")
+        upgrade = unlock.next_step
+        if upgrade.price > self.profile.min_balance:
+            logger.info(f"[{self.profile.name}] Not enough money for upgrade <e>{upgrade.name}</e>")
+            self.schedule_upgrade(SleepReason.WAIT_UPGRADE_MONEY,
+                                  delay=int((upgrade.price - self.profile.min_balance) / self.user.earn_per_sec))
+            return True
 
-            logger.info(f"[{self.profile.name}] Upgrade <e>{upgrade.name}</e> for daily combo is done.")
+        if upgrade.cooldown_seconds > 0:
+            logger.info(f"[{self.profile.name}] Upgrade <e>{upgrade.name}</e> on cooldown for <y>{upgrade.cooldown_seconds}s</y>")
+            self.schedule_upgrade(SleepReason.WAIT_UPGRADE_COOLDOWN, delay=upgrade.cooldown_seconds)
             return True
 
-        elif upgrade.condition['_type'] == 'ByUpgrade' and not upgrade.is_expired and upgrade.max_level >= upgrade.level:
-            return await self.recursive_upgrade_to( next((x for x in self.upgrades if x.id == upgrade.condition['upgradeId']), None))
+        # Combo prerequisites are worth the combo reward, not their own income
+        with action_value('daily combo', self.daily_combo.bonus_coins, self.next_daily_reset()):
+            await self.do_upgrade(upgrade=upgrade)
 
-        logger.info(f"[{self.profile.name}] Can't upgrade recursive <e>{upgrade.name}</e> for daily combo. Condition <e>{upgrade.condition}</e>. Skipped")
-        return False
+        logger.info(f"[{self.profile.name}] Upgrade <e>{upgrade.name}</e> for daily combo is done.")
+        return True
 
     async def try_claim_daily_combo(self) -> bool:
         if len(self.daily_combo.upgrade_ids) != 3:
             return False
-        self.user = await self.web_client.claim_daily_combo()
+        with action_value('daily combo', self.daily_combo.bonus_coins, self.next_daily_reset()):
+            self.user = await self.web_client.claim_daily_combo()
         logger.success(f"[{self.profile.name}] Successfully get daily combo reward | "
                        f"Reward coins: <g>+{self.daily_combo.bonus_coins}</g>")
         await self.sleep(delay=5)
@@ -140,41 +255,26 @@ class Tapper:
         if wait_for_combo_upgrades:
             return
 
+        strategy = self.get_upgrade_strategy()
         while True:
-            available_upgrades = filter(lambda u: u.can_upgrade(), self.upgrades)
+            most_profit_upgrade = strategy.choose(self.upgrades, self.user, self.profile)
 
-            if not self.profile.wait_for_most_profit_upgrades:
-                available_upgrades = filter(
-                    lambda u: self.get_spending_balance() > u.price and u.cooldown_seconds == 0,
-                    available_upgrades)
-
-            available_upgrades = sorted(available_upgrades, key=lambda u: self.upgrade_calculate_significance(u),
-                                        reverse=False)
-
-            if len(available_upgrades) == 0:
+            if most_profit_upgrade is None:
                 logger.info(f"[{self.profile.name}] No available upgrades")
                 break
 
-            most_profit_upgrade: Upgrade = available_upgrades[0]
-
-            if most_profit_upgrade.price > self.get_spending_balance():
-                logger.info(f"[{self.profile.name}] Not enough money for upgrade <e>{most_profit_upgrade.name}</e>")
-                self.update_preferred_sleep(
-                    delay=min(int(
-                        (most_profit_upgrade.price - self.get_spending_balance()) / self.user.earn_per_sec), settings.MAX_SLEEP_TIME),
-                    sleep_reason=SleepReason.WAIT_UPGRADE_MONEY
-                )
-                break
-
-            if most_profit_upgrade.cooldown_seconds > 0:
-                logger.info(f"[{self.profile.name}] Upgrade <e>{most_profit_upgrade.name}</e> on cooldown for <y>{most_profit_upgrade.cooldown_seconds}s</y>")
-                self.update_preferred_sleep(
-                    delay=most_profit_upgrade.cooldown_seconds,
-                    sleep_reason=SleepReason.WAIT_UPGRADE_COOLDOWN
-                )
+            sleep = strategy.sleep_decision(most_profit_upgrade, self.user, self.profile,
+                                           now=self.clock.time())
+            if sleep is not None:
+                if sleep.sleep_reason == SleepReason.WAIT_UPGRADE_MONEY:
+                    logger.info(f"[{self.profile.name}] Not enough money for upgrade <e>{most_profit_upgrade.name}</e>")
+                elif sleep.sleep_reason == SleepReason.WAIT_UPGRADE_COOLDOWN:
+                    logger.info(f"[{self.profile.name}] Upgrade <e>{most_profit_upgrade.name}</e> on cooldown for <y>{most_profit_upgrade.cooldown_seconds}s</y>")
+                self.schedule_upgrade(sleep.sleep_reason, delay=sleep.delay)
                 break
 
-            await self.do_upgrade(upgrade=most_profit_upgrade)
+            with action_value('upgrade', most_profit_upgrade.earn_per_hour * settings.UPGRADE_VALUE_HOURS):
+                await self.do_upgrade(upgrade=most_profit_upgrade)
 
     async def do_upgrade(self, upgrade: Upgrade):
         sleep_time = randint(self.profile.sleep_interval_before_upgrade[0], self.profile.sleep_interval_before_upgrade[1])
@@ -182,6 +282,8 @@ class Tapper:
         await self.sleep(delay=sleep_time)
 
         self.user, self.upgrades, self.daily_combo = await self.web_client.buy_upgrade(upgrade_id=upgrade.id)
+        self.purchases += 1
+        self.spent += upgrade.price
 
         logger.success(
             f"[{self.profile.name}] "
@@ -189,38 +291,31 @@ class Tapper:
             f"Earn every hour: <y>{self.user.earn_per_hour}</y> (<g>+{upgrade.earn_per_hour}</g>)")
 
     async def apply_energy_boost(self) -> bool:
-        energy_boost = next((boost for boost in self.boosts if boost.id == 'BoostFullAvailableTaps'), {})
-        if energy_boost.cooldown_seconds != 0 or energy_boost.level > energy_boost.max_level:
+        energy_boost = next((boost for boost in self.boosts if boost.id == 'BoostFullAvailableTaps'), None)
+        if energy_boost is None or energy_boost.cooldown_seconds != 0 or energy_boost.level > energy_boost.max_level:
             return False
 
-        user = await self.web_client.apply_boost(boost_id="BoostFullAvailableTaps")
-
-        self.user = user
+        self.user = await self.web_client.apply_boost(boost_id="BoostFullAvailableTaps")
         logger.success(f"[{self.profile.name}] Successfully apply energy boost")
         return True
 
-    async def make_taps(self) -> bool:
+    async def make_taps(self) -> int:
         available_taps = int(float(self.user.available_energy) / self.user.earn_per_tap)
         if available_taps < self.user.earn_per_tap:
             logger.info(f"[{self.profile.name}] Not enough taps: {available_taps}/{self.user.earn_per_tap}")
-            return True
+            return 0
 
         max_taps = int(float(self.user.max_energy) / self.user.earn_per_tap)
         taps_to_start = max_taps * self.profile.min_taps_for_clicker_in_percent / 100
         if available_taps < taps_to_start:
             logger.info(f"[{self.profile.name}] Not enough taps for launch clicker: {available_taps}/{taps_to_start}")
-            return True
+            return 0
 
         current_energy = min(self.user.available_energy, self.user.max_energy)
         random_simulated_taps_percent = randint(1, 4) / 100
         # add 1-4% taps like official app when you're clicking by yourself
         simulated_taps = available_taps + int(available_taps * random_simulated_taps_percent)
 
-        # sleep before taps like you do it in real like 6 taps per second
-        sleep_time = int(available_taps / 6)
-        logger.info(f"[{self.profile.name}] Sleep {sleep_time}s before taps")
-        await self.sleep(delay=sleep_time)
-
         user = await self.web_client.send_taps(available_energy=current_energy, taps=simulated_taps)
 
         new_balance = int(user.balance)
@@ -230,118 +325,334 @@ class Tapper:
 
         logger.success(f"[{self.profile.name}] Successful tapped <c>{simulated_taps}</c> times! | "
                        f"Balance: <c>{self.user.balance}</c> (<g>+{calc_taps}</g>)")
-        return True
+        return simulated_taps
+
+    def get_energy_recover_delay(self) -> float:
+        if self.user.energy_recover_per_sec == 0:
+            return settings.MAX_SLEEP_TIME
+        energy_to_start = self.user.max_energy * self.profile.min_taps_for_clicker_in_percent / 100
+        return max(energy_to_start - self.user.available_energy, 0) / self.user.energy_recover_per_sec
 
     async def sleep(self, delay: int):
-        await asyncio.sleep(delay=float(delay))
-        self.user.available_energy = min(self.user.available_energy + self.user.energy_recover_per_sec * delay,
-                                            self.user.max_energy)
-        self.user.balance += self.user.earn_per_sec * delay
+        if (budget := current_budget.get()) is not None:
+            budget.pause(float(delay))
+        tracer.add_sleep(float(delay))
+        with profiler.sleeping():
+            await self.clock.sleep(float(delay))
+        self.advance_user_state()
+
+    async def sync(self):
+        # Sequence of requests in the client
+        #     - me-telegram
+        #     - config
+        #     - sync
+        #     - upgrades-for-buy
+        #     - boosts-for-buy
+        #     - list-tasks
+        with profiler.phase('sync'):
+            await self.web_client.get_me_telegram()
+            cipher = await self.web_client.get_cipher()
+
+            user = await self.earn_money()
+
+        #Fill and update some profile info
+        if self.profile.id is None: self.profile.id = user.id
+
+        #Print info
+        logger.info(f"[<r>{self.profile.name}</r>] [id: <c>{user.id}</c>] [balance: <c>{int(user.balance)}</c>] [pph: <c>{int(user.earn_per_hour)}</c>] [referrals: <c>{user.referrals_count}</c>]")
+
+        with profiler.phase('catalog'):
+            self.upgrades, self.daily_combo = await self.web_client.get_upgrades()
+            self.boosts = await self.web_client.get_boosts()
+            self.tasks = await self.web_client.get_tasks()
+
+        # DAILY CIPHER
+        if cipher:
+            with profiler.phase('cipher'):
+                await self.check_daily_cipher(cipher)
+
+        # TASKS COMPLETING
+        with profiler.phase('tasks'):
+            for task in self.tasks:
+                if task.is_completed is False:
+                    if task.id == "invite_friends":
+                        continue
+                    try:
+                        with action_value('tasks', task.reward_coins):
+                            status = await self.web_client.check_task(task_id=task.id)
+                    except RequestDeferred as error:
+                        # The remaining tasks are checked by the next sync
+                        self.note_deferred(error)
+                        break
+                    if status is False:
+                        continue
+
+                    self.user.balance += task.reward_coins
+                    if task.id == "streak_days":
+                        logger.success(f"[{self.profile.name}] Successfully get daily reward | "
+                                       f"Days: <m>{task.days}</m> | "
+                                       f"Balance: <c>{self.user.balance}</c> (<g>+{task.reward_coins}</g>)")
+                    else:
+                        logger.success(f"[{self.profile.name}] Successfully get reward for task <m>{task.id}</m> | "
+                                       f"Balance: <c>{self.user.balance}</c> (<g>+{task.reward_coins}</g>)")
+
+        # Everything else is checked right after a sync, later wakes only run the actions that are due
+        now = self.clock.time()
+        self.agenda.add(SleepReason.WAIT_SYNC, delay=3600, now=now)
+        if self.profile.auto_upgrade is True:
+            self.agenda.add(SleepReason.WAIT_UPGRADE_MONEY, delay=0, now=now)
+        if self.profile.auto_clicker is True:
+            self.agenda.add(SleepReason.WAIT_ENERGY_RECOVER, delay=0, now=now)
+            if self.profile.apply_daily_energy is True:
+                self.agenda.add(SleepReason.WAIT_ENERGY_BOOST, delay=0, now=now)
+
+    async def upgrade(self):
+        # Cooldowns and prices of the catalog are only valid right after it was fetched
+        if self.upgrades_updated_at < self.woke_at:
+            with profiler.phase('catalog'):
+                self.upgrades, self.daily_combo = await self.web_client.get_upgrades()
+        with profiler.phase('upgrades'):
+            await self.make_upgrades()
+
+    def schedule_energy_recover(self, taps: int = 0):
+        # Taps are sent in the wake that finds the energy for them. Like tapping in the app at 6 taps per second,
+        # the next ones aren't sent before the ones just sent could have been tapped
+        sleep_time = max(min(math.ceil(self.get_energy_recover_delay()), settings.MAX_SLEEP_TIME), int(taps / 6), 40)
+        self.agenda.add(SleepReason.WAIT_ENERGY_RECOVER, delay=sleep_time, now=self.clock.time())
+
+    async def tap(self):
+        with profiler.phase('taps'):
+            taps = await self.make_taps()
+        self.schedule_energy_recover(taps)
+
+    async def boost(self):
+        with profiler.phase('boost'):
+            if await self.apply_energy_boost():
+                # The refilled energy is tapped right away, recovery is counted from these taps
+                self.agenda.discard(SleepReason.WAIT_ENERGY_RECOVER)
+                self.schedule_energy_recover(await self.make_taps())
+
+        energy_boost = next((boost for boost in self.boosts if boost.id == 'BoostFullAvailableTaps'), None)
+        if energy_boost is not None and energy_boost.level <= energy_boost.max_level:
+            delay = max(3600 - (self.clock.time() - self.user.last_energy_boost_time),
+                        energy_boost.cooldown_seconds, 40)
+            self.agenda.add(SleepReason.WAIT_ENERGY_BOOST, delay=delay, now=self.clock.time())
+
+    async def claim_dailies(self):
+        # Targeted post-reset wake: config and cipher claim, streak check, the combo is left to the upgrade action
+        with profiler.phase('daily'):
+            cipher = await self.web_client.get_cipher()
+            if cipher:
+                await self.check_daily_cipher(cipher)
+
+            if await self.web_client.check_task(task_id="streak_days"):
+                logger.success(f"[{self.profile.name}] Successfully get daily reward")
+
+        if self.profile.auto_upgrade is True:
+            self.agenda.add(SleepReason.WAIT_UPGRADE_MONEY, delay=0, now=self.clock.time())
+
+    def estimate_value(self, reason: SleepReason) -> tuple[float, float]:
+        # Coins the action is expected to bring and the time after which it brings nothing,
+        # requests of the action are queued by them when the request budget runs dry
+        if reason == SleepReason.WAIT_SYNC:
+            # Every other action works on the state fetched by a sync
+            return math.inf, math.inf
+        if reason in (SleepReason.WAIT_UPGRADE_MONEY, SleepReason.WAIT_UPGRADE_COOLDOWN):
+            best = max((upgrade.earn_per_hour for upgrade in self.upgrades if upgrade.can_upgrade()), default=0)
+            return best * settings.UPGRADE_VALUE_HOURS, math.inf
+        if reason == SleepReason.WAIT_ENERGY_RECOVER:
+            # A tap costs as much energy as the coins it earns
+            return self.user.available_energy, math.inf
+        if reason == SleepReason.WAIT_ENERGY_BOOST:
+            return self.user.max_energy, math.inf
+        streak = next((task.reward_coins for task in self.tasks if task.id == "streak_days"), 0)
+        return self.cipher_bonus + streak, self.next_daily_reset()
+
+    def note_deferred(self, error: RequestDeferred):
+        logger.info(f"[{self.profile.name}] {error}")
+        if math.isfinite(error.value):
+            self.status.deferred_value += error.value
+
+    async def run_action(self, reason: SleepReason):
+        value, deadline = self.estimate_value(reason)
+        with action_value(ACTIONS[reason], value, deadline):
+            if reason == SleepReason.WAIT_SYNC:
+                await self.sync()
+            elif reason in (SleepReason.WAIT_UPGRADE_MONEY, SleepReason.WAIT_UPGRADE_COOLDOWN):
+                # Both kinds share one action, the other deadline is recomputed by make_upgrades
+                self.agenda.discard(SleepReason.WAIT_UPGRADE_MONEY)
+                self.agenda.discard(SleepReason.WAIT_UPGRADE_COOLDOWN)
+                if fleet.columns is not None:
+                    fleet.columns.update(self.profile.name, money_target=float('nan'), cooldown_until=0)
+                if self.profile.auto_upgrade is True:
+                    await self.upgrade()
+            elif reason == SleepReason.WAIT_ENERGY_RECOVER:
+                if self.profile.auto_clicker is True:
+                    await self.tap()
+            elif reason == SleepReason.WAIT_ENERGY_BOOST:
+                if self.profile.auto_clicker is True and self.profile.apply_daily_energy is True:
+                    await self.boost()
+            elif reason == SleepReason.WAIT_DAILY_RESET:
+                await self.claim_dailies()
 
     async def run(self) -> None:
-        while True:
+        await self.cpu.measure(self.run_agenda())
+
+    async def run_once(self) -> list[str]:
+        # A single wake for batch runs, the next wake is saved for the next run instead of slept through.
+        # The agenda isn't kept between runs, the sync that starts every run schedules all actions again.
+        # Returns the errors of the wake, status.error only keeps the outcome of the last action
+        self.woke_at = self.clock.time()
+        self.agenda.add(SleepReason.WAIT_SYNC, delay=0, now=self.woke_at)
+        errors = await self.cpu.measure(self.run_due_actions())
+
+        self.status.wakes = self.agenda.describe()
+        if (next_wake := self.agenda.next_wake()) is not None:
+            logger.info(f"[{self.profile.name}] Next wake in {int(next_wake - self.clock.time())}s")
+            history.save_wake(self.profile.name, next_wake)
+        return errors
+
+    def record_cycle(self):
+        # A record closes the wake of a sync, every field covers the wakes since the previous record
+        if not settings.HISTORY_ENABLED:
+            return
+        now = self.clock.time()
+        history.record(CycleRecord(profile=self.profile.name, strategy=self.profile.upgrade_strategy,
+                                   finished_at=now, duration=self.awake, cpu_time=self.cpu.total - self.recorded_cpu,
+                                   balance=self.user.balance, earn_per_hour=self.user.earn_per_hour,
+                                   energy=self.user.available_energy, purchases=self.purchases, spent=self.spent,
+                                   requests=self.web_client.requests_made - self.recorded_requests,
+                                   wakes=self.wakes))
+        self.recorded_cpu = self.cpu.total
+        self.recorded_requests = self.web_client.requests_made
+        self.purchases, self.spent, self.wakes, self.awake = 0, 0.0, 0, 0.0
+
+    async def run_due_actions(self) -> list[str]:
+        started = self.clock.time()
+        self.wakes += 1
+        pending: list[SleepReason] = []
+        ran: list[str] = []
+        errors: list[str] = []
+        with tracer.cycle(self.profile.name, wake=self.wakes) as span:
             try:
-                # Sequence of requests in the client
-                #     - me-telegram
-                #     - config
-                #     - sync
-                #     - upgrades-for-buy
-                #     - boosts-for-buy
-                #     - list-tasks
-                await self.web_client.get_me_telegram()
-                cipher = await self.web_client.get_cipher()
-
-                user = await self.earn_money()
-
-                #Fill and update some profile info
-                if self.profile.id is None: self.profile.id = user.id
-
-                #Print info
-                logger.info(f"[<r>{self.profile.name}</r>] [id: <c>{user.id}</c>] [balance: <c>{int(user.balance)}</c>] [pph: <c>{int(user.earn_per_hour)}</c>] [referrals: <c>{user.referrals_count}</c>]")
-
-                self.upgrades, self.daily_combo = await self.web_client.get_upgrades()
-                self.boosts = await self.web_client.get_boosts()
-                self.tasks = await self.web_client.get_tasks()
-
-                # DAILY CIPHER
-                if cipher:
-                    await self.check_daily_cipher(cipher)
-
-                # TASKS COMPLETING
-                for task in self.tasks:
-                    if task.is_completed is False:
-                        if task.id == "invite_friends":
-                            continue
-                        status = await self.web_client.check_task(task_id=task.id)
-                        if status is False:
-                            continue
-
-                        self.user.balance += task.reward_coins
-                        if task.id == "streak_days":
-                            logger.success(f"[{self.profile.name}] Successfully get daily reward | "
-                                           f"Days: <m>{task.days}</m> | "
-                                           f"Balance: <c>{self.user.balance}</c> (<g>+{task.reward_coins}</g>)")
-                        else:
-                            logger.success(f"[{self.profile.name}] Successfully get reward for task <m>{task.id}</m> | "
-                                           f"Balance: <c>{self.user.balance}</c> (<g>+{task.reward_coins}</g>)")
-
-                # TAPPING
-                if self.profile.auto_clicker is True:
-                    await self.make_taps()
-
-                    # APPLY ENERGY BOOST
-                    if self.profile.apply_daily_energy is True and time() - self.user.last_energy_boost_time >= 3600:
-                        logger.info(f"[{self.profile.name}] Sleep 5s before checking energy boost")
-                        await self.sleep(delay=5)
-                        if await self.apply_energy_boost():
-                            await self.make_taps()
-
-                    self.update_preferred_sleep(
-                        delay=(
-                                          self.user.max_energy - self.user.available_energy) / self.user.energy_recover_per_sec,
-                        sleep_reason=SleepReason.WAIT_ENERGY_RECOVER
-                    )
-
-                # UPGRADES
-                if self.profile.auto_upgrade is True:
-                    await self.make_upgrades()
-
-                # SLEEP
-                if self.preferred_sleep is not None:
-                    sleep_time = max(self.preferred_sleep.delay - (time() - self.preferred_sleep.created_time), 40)
-                    if self.preferred_sleep.sleep_reason == SleepReason.WAIT_UPGRADE_MONEY:
-                        logger.info(f"[{self.profile.name}] Sleep {sleep_time}s for earn money for upgrades")
-                    elif self.preferred_sleep.sleep_reason == SleepReason.WAIT_UPGRADE_COOLDOWN:
-                        logger.info(f"[{self.profile.name}] Sleep {sleep_time}s for waiting cooldown for upgrades")
-                    elif self.preferred_sleep.sleep_reason == SleepReason.WAIT_ENERGY_RECOVER:
-                        logger.info(f"[{self.profile.name}] Sleep {sleep_time}s for recover full energy")
-
-                    self.preferred_sleep = None
-                    await self.sleep(delay=sleep_time)
-                else:
-                    logger.info(f"[{self.profile.name}] Sleep 3600s before next iteration")
-                    await self.sleep(delay=3600)
-
-            except InvalidSession as error:
-                raise error
-            except aiohttp.ClientResponseError as error:
-                logger.error(f"[{self.profile.name}] Client response error: {error}")
-                logger.info(f"[{self.profile.name}] Sleep 3600s before next iteration because of error")
-                await self.sleep(delay=3600)
-            except Exception as error:
-                logger.error(f"[{self.profile.name}] Unknown error: {error}")
-                traceback.print_exc()
-                await self.sleep(delay=3)
-
-async def run_tapper(profile: Profile, proxy: str | None):
+                async with CycleBudget(settings.CYCLE_BUDGET, clock=self.clock).run():
+                    while due := self.agenda.pop_due(now=self.clock.time()):
+                        pending = list(due)
+                        while pending:
+                            ran.append(ACTIONS[pending[0]])
+                            if (error := await self.run_action_safely(pending[0])) is not None:
+                                errors.append(f"{ACTIONS[pending[0]]}: {error}")
+                            pending.pop(0)
+            except CycleBudgetExceeded as error:
+                logger.warning(f"[{self.profile.name}] {error}, retry "
+                               f"{', '.join(ACTIONS[reason] for reason in pending)} in {settings.CYCLE_RETRY_DELAY}s")
+                self.status.error = "cycle timeout"
+                errors.append(self.status.error)
+                for reason in pending:
+                    self.agenda.add(reason, delay=settings.CYCLE_RETRY_DELAY, now=self.clock.time())
+                if span is not None:
+                    span.fail(str(error))
+            if span is not None:
+                span.set(actions=", ".join(ran))
+        self.awake += self.clock.time() - started
+        if ACTIONS[SleepReason.WAIT_SYNC] in ran:
+            self.record_cycle()
+        return errors
+
+    async def run_action_safely(self, reason: SleepReason) -> str | None:
+        # The error of the action, None when it succeeded or was deferred
+        try:
+            await self.run_action(reason)
+            self.status.error = None
+        except InvalidSession as error:
+            self.status.error = "invalid session"
+            raise error
+        except AuthUnavailable as error:
+            # The token couldn't be refreshed this time, the session is still there to try again
+            delay = max(settings.CYCLE_RETRY_DELAY, error.retry_after)
+            logger.warning(f"[{self.profile.name}] {error}, retry {ACTIONS[reason]} in {int(delay)}s")
+            self.status.error = "auth unavailable"
+            self.agenda.add(reason, delay=delay, now=self.clock.time())
+        except ResponseError as error:
+            logger.error(f"[{self.profile.name}] Client response error: {error}")
+            logger.info(f"[{self.profile.name}] Sync again in 3600s because of error")
+            self.status.error = f"http {error.status}"
+            self.agenda.add(SleepReason.WAIT_SYNC, delay=3600, now=self.clock.time())
+        except RequestDeferred as error:
+            self.note_deferred(error)
+            logger.info(f"[{self.profile.name}] Retry {ACTIONS[reason]} in {settings.CYCLE_RETRY_DELAY}s")
+            self.agenda.add(reason, delay=settings.CYCLE_RETRY_DELAY, now=self.clock.time())
+            return None
+        except TimeoutError:
+            logger.error(f"[{self.profile.name}] Request timed out while running {ACTIONS[reason]}")
+            self.status.error = "request timeout"
+            self.agenda.add(reason, delay=settings.CYCLE_RETRY_DELAY, now=self.clock.time())
+        except TransportError as error:
+            logger.error(f"[{self.profile.name}] Request failed while running {ACTIONS[reason]}: {error}")
+            self.status.error = "connection error"
+            self.agenda.add(reason, delay=settings.CYCLE_RETRY_DELAY, now=self.clock.time())
+        except Exception as error:
+            logger.error(f"[{self.profile.name}] Unknown error: {error}")
+            traceback.print_exc()
+            self.status.error = type(error).__name__
+            self.agenda.add(SleepReason.WAIT_SYNC, delay=3, now=self.clock.time())
+        return self.status.error
+
+    async def run_agenda(self) -> None:
+        self.woke_at = self.clock.time()
+        # After a restart the profile sleeps until its saved wake instead of syncing right away
+        resume_delay = self.resume_at - self.woke_at if self.resume_at is not None else 0
+        self.agenda.add(SleepReason.WAIT_SYNC, delay=resume_delay, now=self.woke_at)
+        activated = self.ramp is None
+        while True:
+            self.apply_config_changes()
+
+            if activated:
+                await self.run_due_actions()
+            elif self.agenda.next_wake() <= self.clock.time():
+                async with self.ramp.activation(self.profile.name):
+                    await self.run_due_actions()
+                activated = True
+
+            # SLEEP
+            sleep_time = max(self.agenda.next_wake() - self.clock.time(), 0)
+            actions = ", ".join(ACTIONS[reason] for reason in self.agenda.deadlines
+                                if self.agenda.deadlines[reason].wake_at <= self.clock.time() + sleep_time)
+            logger.info(f"[{self.profile.name}] Sleep {int(sleep_time)}s before {actions}")
+            self.status.wakes = self.agenda.describe()
+            if settings.HISTORY_ENABLED:
+                history.save_wake(self.profile.name, self.agenda.next_wake())
+            await self.sleep(delay=sleep_time)
+            self.woke_at = self.clock.time()
+
+async def run_tapper(profile: Profile, proxy: str | None, ramp: RampController | None = None,
+                     resume_at: float | None = None):
     
     logger.info(f"[{profile.name}] [{'<g>proxy</g>' if proxy else '<r>no proxy</r>' }] successfully added to task list")
     
     try:
-        proxy_conn = ProxyConnector().from_url(proxy) if proxy else None
+        async with create_transport(proxy=proxy) as transport:
+            web_client = WebClient(transport=transport, profile=profile, auth_manager=auth_manager, proxy=proxy)
+            await Tapper(web_client=web_client, ramp=ramp, resume_at=resume_at).run()
+    except InvalidSession:
+        logger.error(f"[{profile.name}] Invalid Session")
+    finally:
+        # The profile may end before its first wake, a crash or a stop then takes it out of the boot set
+        if ramp is not None:
+            ramp.release(profile.name)
 
-        async with aiohttp.ClientSession(headers=Headers(), connector=proxy_conn) as http_client:
-            web_client = WebClient(http_client=http_client, profile=profile)
-            await Tapper(web_client=web_client).run()
+
+async def run_tapper_once(profile: Profile, proxy: str | None, ramp: RampController | None = None) -> list[str]:
+    # The transport is only opened once the ramp lets the profile in, so a batch doesn't hold a session
+    # for every due profile while they wait for their turn
+    try:
+        async with ramp.activation(profile.name) if ramp is not None else nullcontext():
+            async with create_transport(proxy=proxy) as transport:
+                web_client = WebClient(transport=transport, profile=profile, auth_manager=auth_manager, proxy=proxy)
+                return await Tapper(web_client=web_client).run_once()
     except InvalidSession:
         logger.error(f"[{profile.name}] Invalid Session")
+        return ["invalid session"]
+    finally:
+        if ramp is not None:
+            ramp.release(profile.name)
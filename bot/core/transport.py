@@ -0,0 +1,179 @@
+import asyncio
+import json as json_parser
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Callable
+
+import aiohttp
+from aiohttp_proxy import ProxyConnector
+
+from bot.config import settings
+from bot.core.headers import Headers
+from bot.exceptions import ResponseError, TransportError
+
+
+@dataclass
+class TransportResponse:
+    url: str
+    status: int
+    text: str
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise ResponseError(status=self.status, url=self.url, text=self.text)
+
+
+@dataclass
+class RequestTimeout:
+    connect: float
+    read: float
+    total: float
+
+    @staticmethod
+    def for_request(name: str) -> 'RequestTimeout':
+        overrides = settings.REQUEST_TIMEOUTS.get(name, {})
+        return RequestTimeout(connect=overrides.get('connect', settings.REQUEST_CONNECT_TIMEOUT),
+                              read=overrides.get('read', settings.REQUEST_READ_TIMEOUT),
+                              total=overrides.get('total', settings.REQUEST_TIMEOUT))
+
+
+def create_http_client(proxy: str | None = None, headers: dict | None = None,
+                       trace_configs: list[aiohttp.TraceConfig] | None = None) -> aiohttp.ClientSession:
+    # Session of AiohttpTransport, with the default timeouts for requests that don't pass their own
+    connector = ProxyConnector.from_url(proxy) if proxy else None
+    return aiohttp.ClientSession(headers=Headers(headers or {}), connector=connector, trace_configs=trace_configs,
+                                 timeout=aiohttp.ClientTimeout(total=settings.REQUEST_TIMEOUT,
+                                                               sock_connect=settings.REQUEST_CONNECT_TIMEOUT,
+                                                               sock_read=settings.REQUEST_READ_TIMEOUT))
+
+
+class Transport(ABC):
+    name: str
+
+    @abstractmethod
+    async def post(self, url: str, headers: dict, json: dict | None, timeout: RequestTimeout) -> TransportResponse:
+        # Raises TimeoutError when the request times out and TransportError when it fails without a response
+        ...
+
+    @property
+    def connections(self) -> int:
+        return 0
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+
+class AiohttpTransport(Transport):
+    # One session per profile, the connector keeps the profile's proxy
+    name = 'aiohttp'
+
+    def __init__(self, proxy: str | None = None):
+        self.connections_opened = 0
+
+        async def on_connection_create_end(*_):
+            self.connections_opened += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        self.http_client = create_http_client(proxy=proxy, trace_configs=[trace_config])
+
+    async def post(self, url: str, headers: dict, json: dict | None, timeout: RequestTimeout) -> TransportResponse:
+        try:
+            async with self.http_client.post(url=url, headers=headers, json=json,
+                                             timeout=aiohttp.ClientTimeout(total=timeout.total,
+                                                                           sock_connect=timeout.connect,
+                                                                           sock_read=timeout.read)) as response:
+                return TransportResponse(url=url, status=response.status, text=await response.text())
+        except TimeoutError:
+            # aiohttp timeouts are TimeoutError already, some of them are a ClientError too
+            raise
+        except aiohttp.ClientError as error:
+            raise TransportError(url=url, reason=str(error) or type(error).__name__) from error
+
+    @property
+    def connections(self) -> int:
+        return self.connections_opened
+
+    async def close(self):
+        await self.http_client.close()
+
+
+class Http2Transport(Transport):
+    # Profiles with the same proxy share one client, their requests are multiplexed as HTTP/2 streams
+    # over a few connections. Needs the optional httpx[http2] package
+    name = 'http2'
+    shared: dict[str | None, 'Http2Transport'] = {}
+
+    def __init__(self, proxy: str | None = None):
+        try:
+            import httpx  # pylint: disable=C0415
+        except ImportError as error:
+            raise RuntimeError("HTTP/2 transport requires httpx: pip install 'httpx[http2]'") from error
+
+        self.httpx = httpx
+        self.proxy = proxy
+        self.users = 0
+        self.connections_opened = 0
+        self.client = httpx.AsyncClient(http2=True, proxy=proxy, headers=Headers(),
+                                        limits=httpx.Limits(max_connections=settings.HTTP2_MAX_CONNECTIONS))
+
+    @classmethod
+    def acquire(cls, proxy: str | None = None) -> 'Http2Transport':
+        transport = cls.shared.get(proxy)
+        if transport is None:
+            transport = cls.shared[proxy] = cls(proxy=proxy)
+        transport.users += 1
+        return transport
+
+    async def trace(self, event: str, _):
+        # httpcore reports every new connection of the pool, like on_connection_create_end of aiohttp
+        if event == 'connection.connect_tcp.complete':
+            self.connections_opened += 1
+
+    async def post(self, url: str, headers: dict, json: dict | None, timeout: RequestTimeout) -> TransportResponse:
+        # httpx has no total timeout of its own, and its own timeouts are not TimeoutError
+        try:
+            async with asyncio.timeout(timeout.total):
+                response = await self.client.post(url=url, headers=headers, json=json,
+                                                  timeout=self.httpx.Timeout(timeout.read, connect=timeout.connect),
+                                                  extensions={'trace': self.trace})
+        except self.httpx.TimeoutException as error:
+            raise TimeoutError(f"{type(error).__name__} for {url}") from error
+        except self.httpx.TransportError as error:
+            raise TransportError(url=url, reason=str(error) or type(error).__name__) from error
+        return TransportResponse(url=url, status=response.status_code, text=response.text)
+
+    @property
+    def connections(self) -> int:
+        return self.connections_opened
+
+    async def close(self):
+        self.users -= 1
+        if self.users <= 0:
+            self.shared.pop(self.proxy, None)
+            await self.client.aclose()
+
+
+@dataclass
+class StubTransport(Transport):
+    # In-memory transport for tests and benchmarks, handler returns (status, json body) for (url, json)
+    handler: Callable[[str, dict | None], tuple[int, dict]]
+    calls: list[tuple[str, dict | None]] = field(default_factory=list)
+    name = 'stub'
+
+    async def post(self, url: str, headers: dict, json: dict | None, timeout: RequestTimeout) -> TransportResponse:
+        self.calls.append((url, json))
+        status, body = self.handler(url, json)
+        return TransportResponse(url=url, status=status, text=json_parser.dumps(body))
+
+
+def create_transport(proxy: str | None = None) -> Transport:
+    if settings.TRANSPORT == Http2Transport.name:
+        return Http2Transport.acquire(proxy=proxy)
+    return AiohttpTransport(proxy=proxy)
@@ -0,0 +1,93 @@
+from collections import defaultdict, deque
+from dataclasses import dataclass
+
+from bot.core.entities import Upgrade, UpgradeMeta
+
+
+@dataclass
+class UnlockPlan:
+    upgrade: Upgrade
+    # upgrades to buy from the first purchasable prerequisite up to the upgrade itself
+    chain: list[Upgrade]
+    total_cost: float
+    reachable: bool
+
+    @property
+    def next_step(self) -> Upgrade | None:
+        return self.chain[0] if self.reachable else None
+
+
+class UpgradeGraph:
+    # ByUpgrade conditions are static, so the graph is built from the shared catalog metas once per catalog
+    # version and serves every profile. Levels, prices and availability come from the profile when a plan is made
+    def __init__(self, metas: dict[str, UpgradeMeta]):
+        self.prerequisites: dict[str, str] = {}
+        self.dependents: dict[str, list[str]] = defaultdict(list)
+
+        for meta in metas.values():
+            prerequisite_id = self.get_prerequisite_id(meta)
+            if prerequisite_id is not None:
+                self.prerequisites[meta.id] = prerequisite_id
+                self.dependents[prerequisite_id].append(meta.id)
+
+        self.order, self.cyclic = self._sort(metas)
+        self.chains = self._build_chains()
+
+    @staticmethod
+    def get_prerequisite_id(upgrade: Upgrade | UpgradeMeta) -> str | None:
+        condition = upgrade.condition
+        if not isinstance(condition, dict) or condition.get('_type') != 'ByUpgrade':
+            return None
+        return condition.get('upgradeId')
+
+    def unlock_plan(self, upgrade_id: str, upgrades: dict[str, Upgrade]) -> UnlockPlan | None:
+        # One walk up the precomputed chain, against the profile's own upgrades
+        chain = self.chains.get(upgrade_id)
+        upgrade = upgrades.get(upgrade_id)
+        if chain is None or upgrade is None:
+            return None
+
+        path = []
+        for step_id in chain:
+            step = upgrades.get(step_id)
+            if step is None or step.is_expired or step.max_level < step.level:
+                break
+            path.append(step)
+            if step.is_available:
+                path.reverse()
+                return UnlockPlan(upgrade=upgrade, chain=path, total_cost=sum(step.price for step in path),
+                                  reachable=True)
+        return UnlockPlan(upgrade=upgrade, chain=[], total_cost=0, reachable=False)
+
+    def _sort(self, metas: dict[str, UpgradeMeta]) -> tuple[list[str], set[str]]:
+        # Every upgrade has at most one ByUpgrade prerequisite, so in-degree is either 0 or 1
+        in_degree = {upgrade_id: 1 if self.prerequisites.get(upgrade_id) in metas else 0 for upgrade_id in metas}
+        queue = deque(upgrade_id for upgrade_id, degree in in_degree.items() if degree == 0)
+
+        order = []
+        while queue:
+            upgrade_id = queue.popleft()
+            order.append(upgrade_id)
+            for dependent_id in self.dependents.get(upgrade_id, []):
+                in_degree[dependent_id] -= 1
+                if in_degree[dependent_id] == 0:
+                    queue.append(dependent_id)
+
+        return order, set(metas) - set(order)
+
+    def _build_chains(self) -> dict[str, tuple[str, ...]]:
+        # The upgrade followed by its prerequisites, nearest first. A prerequisite missing from the catalog
+        # ends the chain, and the profile can't find it either
+        chains = {}
+        for upgrade_id in self.order:
+            prerequisite_id = self.prerequisites.get(upgrade_id)
+            if prerequisite_id is None:
+                chains[upgrade_id] = (upgrade_id,)
+            else:
+                chains[upgrade_id] = (upgrade_id,) + chains.get(prerequisite_id, (prerequisite_id,))
+
+        # A cycle never unlocks, only the upgrade itself can be bought if it is available
+        for upgrade_id in self.cyclic:
+            chains[upgrade_id] = (upgrade_id,)
+
+        return chains
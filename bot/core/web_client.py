@@ -1,23 +1,34 @@
 import json as json_parser
 from time import time
 
-import aiohttp
-
+from bot.config import settings
+from bot.core.headers import Headers
+from bot.core.transport import Transport, RequestTimeout
+from bot.core.priority import request_budget
 from bot.core.entities import AirDropTask, Boost, Upgrade, User, Task, DailyCombo, AirDropTaskId, DailyCipher
 from bot.core.api import Requests
 from bot.utils.profile import Profile
+from bot.utils.tracing import tracer, SPAN_KIND_CLIENT
 
 
 class WebClient:
     profile: Profile
-    http_client: aiohttp.ClientSession
+    transport: Transport
+    # Requests of all clients, sampled by the startup ramp
+    requests_total = 0
+
+    def __init__(self, transport: Transport, profile: Profile, auth_manager=None, proxy: str | None = None):
 
-    def __init__(self, http_client: aiohttp.ClientSession, profile: Profile):
+        self.transport = transport
+        self.auth_manager = auth_manager
+        # Proxy assigned to the profile by the launcher, token refreshes go through it too
+        self.proxy = proxy
+        self.requests_made = 0
+        self.set_profile(profile)
 
+    def set_profile(self, profile: Profile):
         self.profile = profile
-        self.http_client = http_client
-        self.http_client.headers["User-Agent"] = profile.user_agent
-        self.http_client.headers["Authorization"] = f"Bearer {profile.token}"
+        self.headers = {"User-Agent": profile.user_agent, "Authorization": f"Bearer {profile.token}"}
 
     async def get_user_data(self) -> User:
         response = await self.make_request(Requests.SYNC)
@@ -111,19 +122,25 @@ class WebClient:
         response = await self.make_request(Requests.LIST_AIRDROP_TASKS)
         return list(map(lambda d: AirDropTask(data=d), response['airdropTasks']))
 
-    async def make_request(self, request: Requests, json: dict | None = None) -> dict:
-        # print(request)        
-        # print(json)
-
-
-        response = await self.http_client.post(url=request, json=json)        
-        response_text = await response.text()
-
-        # print(response_text)
-        # print(response.headers)
-        # print(response.url)
+    async def make_request(self, request: Requests, json: dict | None = None, refresh_auth: bool = True) -> dict:
+        with tracer.span(request.name, kind=SPAN_KIND_CLIENT, **{'url.path': str(request)}) as span:
+            await request_budget.acquire()
+            self.requests_made += 1
+            WebClient.requests_total += 1
+            response = await self.transport.post(url=f"{settings.API_BASE_URL}{request}", headers=self.headers,
+                                                 json=json, timeout=RequestTimeout.for_request(request.name))
+            if span is not None:
+                span.set(**{'http.response.status_code': response.status,
+                            'http.response.body.size': len(response.text)})
+                if response.status >= 400:
+                    span.fail(f"http {response.status}")
+
+        if response.status == 401 and refresh_auth and self.auth_manager is not None:
+            token = await self.auth_manager.refresh_token(self.profile, proxy=self.proxy)
+            self.headers["Authorization"] = f"Bearer {token}"
+            return await self.make_request(request, json=json, refresh_auth=False)
 
         if response.status != 422:
             response.raise_for_status()
         
-        return json_parser.loads(response_text)
+        return json_parser.loads(response.text)
@@ -1,2 +1,41 @@
 class InvalidSession(BaseException):
     ...
+
+
+class AuthUnavailable(Exception):
+    # Telegram or the auth endpoint failed for now, unlike InvalidSession the session itself is still valid
+    def __init__(self, name: str, reason: str, retry_after: float = 0):
+        super().__init__(f"Auth of {name} failed: {reason}")
+        self.name = name
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ResponseError(Exception):
+    def __init__(self, status: int, url: str, text: str = ''):
+        super().__init__(f"{status} for {url}")
+        self.status = status
+        self.url = url
+        self.text = text
+
+
+class TransportError(Exception):
+    # The request never got a response: refused or dropped connection, proxy or TLS failure.
+    # Timeouts are raised as TimeoutError by every transport instead
+    def __init__(self, url: str, reason: str):
+        super().__init__(f"{reason} for {url}")
+        self.url = url
+        self.reason = reason
+
+
+class CycleBudgetExceeded(Exception):
+    def __init__(self, budget: float):
+        super().__init__(f"Cycle ran out of its {budget:g}s budget")
+        self.budget = budget
+
+
+class RequestDeferred(Exception):
+    def __init__(self, action: str, value: float):
+        super().__init__(f"Request of {action} (worth {value:,.0f}) deferred by the request budget")
+        self.action = action
+        self.value = value
@@ -0,0 +1,75 @@
+import asyncio
+import heapq
+import itertools
+import time as system_time
+from abc import ABC, abstractmethod
+from contextlib import suppress
+from typing import Coroutine
+
+
+class Clock(ABC):
+    @abstractmethod
+    def time(self) -> float:
+        ...
+
+    @abstractmethod
+    async def sleep(self, delay: float):
+        ...
+
+
+class SystemClock(Clock):
+    def time(self) -> float:
+        return system_time.time()
+
+    async def sleep(self, delay: float):
+        await asyncio.sleep(delay)
+
+
+class VirtualClock(Clock):
+    # Time only moves when every task is parked on the clock, so hour long sleeps take no real time
+    def __init__(self, start: float = 0):
+        self.now = start
+        self.sleepers: list[tuple[float, int, asyncio.Future]] = []
+        self.counter = itertools.count()
+
+    def time(self) -> float:
+        return self.now
+
+    async def sleep(self, delay: float):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.sleepers, (self.now + max(delay, 0), next(self.counter), future))
+        await future
+
+    async def settle(self):
+        # Yields to the loop until no other callback is ready to run. Tasks are then either parked on the
+        # clock or waiting for I/O, which the in-memory transports used with this clock never do
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(0)
+        while loop._ready:  # pylint: disable=W0212
+            await asyncio.sleep(0)
+
+    async def run_until(self, until: float):
+        await self.settle()
+        while self.sleepers and self.sleepers[0][0] <= until:
+            wake_at, _, future = heapq.heappop(self.sleepers)
+            self.now = max(self.now, wake_at)
+            if not future.done():
+                future.set_result(None)
+            await self.settle()
+        self.now = max(self.now, until)
+
+    async def run(self, coroutine: Coroutine, duration: float):
+        # Runs the coroutine for `duration` virtual seconds, errors raised by it are propagated
+        task = asyncio.create_task(coroutine)
+        try:
+            await self.run_until(self.now + duration)
+        finally:
+            if not task.done():
+                task.cancel()
+                with suppress(asyncio.CancelledError):
+                    await task
+        if not task.cancelled() and task.exception() is not None:
+            raise task.exception()
+
+
+clock = SystemClock()
@@ -22,13 +22,17 @@ class Combo(BaseModel, validate_assignment=True):
 
         return self 
 
-    async def update(self):      
+    def is_expired(self, now: float) -> bool:
+        return self.expired < int(now)
+
+    async def update(self, now: float | None = None):
+        now = time() if now is None else now
         try:
             async with aiohttp.ClientSession() as http_client:
                 response = await http_client.get(settings.DAILY_JSON_URL)
                 response_json = await response.json()
                 
-                if (expired := response_json.get('expired')) < int(time()):
+                if (expired := response_json.get('expired')) < int(now):
                     return False
 
                 self.combo = response_json.get('combo')
@@ -0,0 +1,66 @@
+import asyncio
+import heapq
+import sys
+from datetime import datetime
+from time import time
+
+from bot.utils.fleet import FleetState, ProfileStatus
+from bot.utils.fleet_columns import FleetColumns
+
+CLEAR_SCREEN = "\x1b[H\x1b[2J"
+
+HEADER = f"{'PROFILE':<20} {'BALANCE':>16} {'EARN/H':>12} {'ENERGY':>13} {'RELOADS':>7} {'NEXT ACTION':<24} {'NEXT WAKE':>9}  ERROR"
+
+
+def format_row(status: ProfileStatus, now: float, columns: FleetColumns | None = None) -> str:
+    wake_in = max(int(status.next_wake - now), 0) if status.next_wake else 0
+    # Live estimates when the fleet keeps columns, the last server snapshot otherwise
+    balance, energy = columns.predicted(status.name) if columns and status.name in columns.rows \
+        else (status.balance, status.energy)
+    energy = f"{int(energy)}/{status.max_energy}"
+    return (f"{status.name[:20]:<20} {int(balance):>16,} {int(status.earn_per_hour):>12,} {energy:>13} "
+            f"{status.config_reloads:>7} {status.next_action[:24]:<24} {wake_in:>8}s  {status.error or ''}")
+
+
+def render(fleet: FleetState, max_rows: int) -> str:
+    now = time()
+    statuses = fleet.profiles.values()
+
+    # Only the rows that will be shown are sorted, so a refresh stays O(n log max_rows)
+    failed = heapq.nsmallest(max_rows, (s for s in statuses if s.error), key=lambda s: s.name)
+    upcoming = heapq.nsmallest(max_rows - len(failed), (s for s in statuses if not s.error),
+                               key=lambda s: s.next_wake or float('inf'))
+
+    columns = fleet.columns
+    if columns is not None:
+        columns.tick(now)
+        total_balance = float(columns.balance.sum())
+        total_earn = columns.earn_per_hour
+    else:
+        total_balance = sum(s.balance for s in statuses)
+        total_earn = sum(s.earn_per_hour for s in statuses)
+    errors = sum(1 for s in statuses if s.error)
+    quarantined = sum(1 for s in statuses if s.supervisor_state == 'quarantined')
+    crashes = sum(s.crashes for s in statuses)
+    deferred = sum(s.deferred_value for s in statuses)
+
+    lines = [
+        f"{datetime.now():%Y-%m-%d %H:%M:%S} | profiles: {len(fleet.profiles)} | errors: {errors} | "
+        f"crashes: {crashes} | quarantined: {quarantined} | deferred: {int(deferred):,} | "
+        f"balance: {int(total_balance):,} | earn/h: {int(total_earn):,} | settings v{fleet.settings_version}"
+        + (f" | ready within a minute (est.): {columns.due_within(60, now)}" if columns is not None else ""),
+        "",
+        HEADER,
+        *(format_row(status, now, columns) for status in failed + upcoming),
+    ]
+    hidden = len(fleet.profiles) - len(failed) - len(upcoming)
+    if hidden > 0:
+        lines.append(f"... {hidden} more")
+    return "\n".join(lines)
+
+
+async def run_dashboard(fleet: FleetState, refresh_interval: float, max_rows: int):
+    while True:
+        sys.stdout.write(CLEAR_SCREEN + render(fleet, max_rows) + "\n")
+        sys.stdout.flush()
+        await asyncio.sleep(refresh_interval)
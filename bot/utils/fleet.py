@@ -0,0 +1,52 @@
+from dataclasses import dataclass, field
+from time import time
+
+
+@dataclass
+class ProfileStatus:
+    name: str
+    balance: float = 0
+    earn_per_hour: float = 0
+    energy: float = 0
+    max_energy: int = 0
+    error: str | None = None
+    config_reloads: int = 0
+    crashes: int = 0
+    supervisor_state: str = 'running'
+    # coins worth of actions the request budget deferred
+    deferred_value: float = 0
+    updated_at: float = 0
+    # pending agenda deadlines of the profile, keyed by action
+    wakes: dict[str, tuple[float, str]] = field(default_factory=dict)
+
+    def update_user(self, balance: float, earn_per_hour: float, energy: float, max_energy: int):
+        self.balance = balance
+        self.earn_per_hour = earn_per_hour
+        self.energy = energy
+        self.max_energy = max_energy
+        self.updated_at = time()
+
+    @property
+    def next_wake(self) -> float:
+        return min((wake for wake, _ in self.wakes.values()), default=0)
+
+    @property
+    def next_action(self) -> str:
+        return min(self.wakes.values(), default=(0, ''))[1]
+
+
+class FleetState:
+    def __init__(self):
+        self.profiles: dict[str, ProfileStatus] = {}
+        self.settings_version = 0
+        # FleetColumns while the dashboard runs, the scheduler never reads them
+        self.columns = None
+
+    def get(self, name: str) -> ProfileStatus:
+        status = self.profiles.get(name)
+        if status is None:
+            status = self.profiles[name] = ProfileStatus(name=name)
+        return status
+
+
+fleet = FleetState()
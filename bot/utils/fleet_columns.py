@@ -0,0 +1,145 @@
+"""Numbers of every profile in NumPy columns, with predictions for the whole fleet in one pass.
+
+The columns only exist while the dashboard runs and its totals are their only reader. Tappers are woken
+by their own agendas, which also hold syncs, dailies and the merge window, so next_due is when a profile
+is expected to have taps or an upgrade ready, not when it wakes.
+
+    python -m bot.utils.fleet_columns --profiles 100000 --ticks 50
+"""
+import argparse
+from time import perf_counter, time
+
+import numpy as np
+
+FIELDS = ('balance', 'earn_per_sec', 'energy', 'recover_per_sec', 'max_energy', 'energy_target',
+          'money_target', 'cooldown_until', 'updated_at')
+
+# money_target is NaN while no upgrade is waited for, energy_target is 0 when the clicker is off
+DEFAULTS = {'money_target': np.nan}
+
+
+class FleetColumns:
+    # One row per profile. Tappers write their last server snapshot and upgrade deadlines,
+    # tick() advances all of them to `now` and estimates when each profile has taps or an upgrade ready
+    def __init__(self, capacity: int = 1024):
+        self.rows: dict[str, int] = {}
+        self.names: list[str] = []
+        self.columns = {field: np.full(capacity, DEFAULTS.get(field, 0.0)) for field in FIELDS}
+        self.balance = self.energy = self.energy_due = self.upgrade_due = self.next_due = np.empty(0)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def row(self, name: str) -> int:
+        row = self.rows.get(name)
+        if row is None:
+            row = self.rows[name] = len(self.names)
+            self.names.append(name)
+            capacity = len(self.columns['balance'])
+            if row >= capacity:
+                for field, column in self.columns.items():
+                    grown = np.full(capacity * 2, DEFAULTS.get(field, 0.0))
+                    grown[:capacity] = column
+                    self.columns[field] = grown
+        return row
+
+    def update(self, name: str, **values: float):
+        row = self.row(name)
+        for field, value in values.items():
+            self.columns[field][row] = value
+
+    def tick(self, now: float):
+        size = len(self.names)
+        c = {field: column[:size] for field, column in self.columns.items()}
+
+        elapsed = np.maximum(now - c['updated_at'], 0)
+        self.balance = c['balance'] + c['earn_per_sec'] * elapsed
+        self.energy = np.minimum(c['energy'] + c['recover_per_sec'] * elapsed, c['max_energy'])
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            energy_wait = np.maximum(c['energy_target'] - self.energy, 0) / c['recover_per_sec']
+            money_wait = np.maximum(c['money_target'] - self.balance, 0) / c['earn_per_sec']
+        self.energy_due = np.where((c['energy_target'] > 0) & (c['recover_per_sec'] > 0), now + energy_wait, np.inf)
+
+        # An upgrade is due once it is both affordable and off cooldown
+        waiting_money = ~np.isnan(c['money_target'])
+        money_due = np.where(waiting_money, np.where(c['earn_per_sec'] > 0, now + money_wait, np.inf), now)
+        self.upgrade_due = np.where(waiting_money | (c['cooldown_until'] > 0),
+                                    np.maximum(money_due, c['cooldown_until']), np.inf)
+        self.next_due = np.minimum(self.energy_due, self.upgrade_due)
+
+    def predicted(self, name: str) -> tuple[float, float]:
+        row = self.rows[name]
+        return float(self.balance[row]), float(self.energy[row])
+
+    def due_within(self, seconds: float, now: float) -> int:
+        return int(np.count_nonzero(self.next_due <= now + seconds))
+
+    @property
+    def earn_per_hour(self) -> float:
+        return float(self.columns['earn_per_sec'][:len(self.names)].sum() * 3600)
+
+
+def fill_random(columns: FleetColumns, profiles: int, now: float, rng: np.random.Generator):
+    for index in range(profiles):
+        max_energy = float(rng.integers(1000, 10000))
+        columns.update(f"profile-{index}", balance=rng.uniform(0, 1e9), earn_per_sec=rng.uniform(0, 1000),
+                       energy=rng.uniform(0, max_energy), recover_per_sec=float(rng.integers(3, 10)),
+                       max_energy=max_energy, energy_target=max_energy * 0.8 if rng.random() < 0.8 else 0,
+                       money_target=rng.uniform(0, 2e9) if rng.random() < 0.7 else np.nan,
+                       cooldown_until=now + rng.uniform(0, 3600) if rng.random() < 0.2 else 0,
+                       updated_at=now - rng.uniform(0, 3600))
+
+
+def python_tick(columns: FleetColumns, now: float) -> list[float]:
+    # The same predictions one profile at a time, as every Tapper makes them
+    result = []
+    c = columns.columns
+    for row in range(len(columns)):
+        elapsed = max(now - c['updated_at'][row], 0)
+        balance = c['balance'][row] + c['earn_per_sec'][row] * elapsed
+        energy = min(c['energy'][row] + c['recover_per_sec'][row] * elapsed, c['max_energy'][row])
+        energy_due = float('inf')
+        if c['energy_target'][row] > 0 and c['recover_per_sec'][row] > 0:
+            energy_due = now + max(c['energy_target'][row] - energy, 0) / c['recover_per_sec'][row]
+        upgrade_due = float('inf')
+        if not np.isnan(c['money_target'][row]):
+            money_due = now + max(c['money_target'][row] - balance, 0) / c['earn_per_sec'][row] \
+                if c['earn_per_sec'][row] > 0 else float('inf')
+            upgrade_due = max(money_due, c['cooldown_until'][row])
+        elif c['cooldown_until'][row] > 0:
+            upgrade_due = c['cooldown_until'][row]
+        result.append(min(energy_due, upgrade_due))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time fleet-wide predictions over NumPy columns')
+    parser.add_argument('--profiles', type=int, default=100_000)
+    parser.add_argument('--ticks', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    now = time()
+    columns = FleetColumns()
+    started = perf_counter()
+    fill_random(columns, args.profiles, now, np.random.default_rng(args.seed))
+    fill_time = perf_counter() - started
+
+    started = perf_counter()
+    for tick in range(args.ticks):
+        columns.tick(now + tick)
+    tick_time = (perf_counter() - started) / args.ticks
+
+    started = perf_counter()
+    expected = python_tick(columns, now + args.ticks - 1)
+    python_time = perf_counter() - started
+    assert np.allclose(columns.next_due, expected)
+
+    print(f"profiles: {args.profiles:,} | fill: {fill_time:.2f}s")
+    print(f"vectorized tick: {tick_time * 1000:.2f}ms | per-profile loop: {python_time * 1000:.0f}ms | "
+          f"ready within a minute: {columns.due_within(60, now + args.ticks - 1):,}")
+
+
+if __name__ == '__main__':
+    main()
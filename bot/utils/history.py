@@ -0,0 +1,201 @@
+"""Per-cycle history of every profile's economy and request cost, kept in a local SQLite file.
+
+    python -m bot.utils.history --since 24 --by profile
+    python -m bot.utils.history --since 168 --by strategy
+"""
+import argparse
+import asyncio
+import sqlite3
+from dataclasses import dataclass, astuple, fields
+from pathlib import Path
+from time import time
+
+from bot.config import settings
+from bot.utils import logger
+
+
+@dataclass
+class CycleRecord:
+    # Written after every sync. duration is the time spent awake and the counters are summed over
+    # the same wakes, all of them since the previous record
+    profile: str
+    strategy: str
+    finished_at: float
+    duration: float
+    cpu_time: float
+    balance: float
+    earn_per_hour: float
+    energy: float
+    purchases: int
+    spent: float
+    requests: int
+    wakes: int
+
+
+@dataclass
+class Efficiency:
+    key: str
+    cycles: int
+    gained: float
+    requests: int
+    wakes: int
+    cpu_time: float
+
+    @property
+    def per_request(self) -> float:
+        return self.gained / self.requests if self.requests else 0
+
+    @property
+    def per_wake(self) -> float:
+        return self.gained / self.wakes if self.wakes else 0
+
+    @property
+    def per_cpu_second(self) -> float:
+        return self.gained / self.cpu_time if self.cpu_time else 0
+
+
+COLUMNS = [field.name for field in fields(CycleRecord)]
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS cycles ({', '.join(COLUMNS)});
+CREATE INDEX IF NOT EXISTS cycles_profile_time ON cycles (profile, finished_at);
+CREATE TABLE IF NOT EXISTS schedule (profile PRIMARY KEY, wake_at);
+"""
+
+# Coins gained by a cycle are its balance growth since the previous cycle of the same profile
+# plus whatever was spent on upgrades in between, so purchases don't look like losses
+GAINED_QUERY = """
+SELECT {key} AS key, COUNT(*), SUM(gained), SUM(requests), SUM(wakes), SUM(cpu_time)
+FROM (
+    SELECT profile, strategy, requests, wakes, cpu_time,
+           balance + spent - LAG(balance) OVER (PARTITION BY profile ORDER BY finished_at) AS gained
+    FROM cycles WHERE finished_at >= ?
+)
+WHERE gained IS NOT NULL
+GROUP BY key
+"""
+
+
+class HistoryStore:
+    def __init__(self, path: Path, batch_size: int = 100, flush_interval: float = 30):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending: list[CycleRecord] = []
+        # Next wake of every profile, kept for warm restarts
+        self.pending_wakes: dict[str, float] = {}
+        self.lock = asyncio.Lock()
+        # The loop only keeps weak references to tasks, a flush in flight is kept here until it is done
+        self.flushes: set[asyncio.Task] = set()
+        self.connection: sqlite3.Connection | None = None
+
+    def configure(self, batch_size: int, flush_interval: float):
+        # Applies reloaded settings, the file itself stays the one opened at start
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+    def connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            # Writes run in a worker thread, the lock keeps them one at a time
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.executescript(SCHEMA)
+        return self.connection
+
+    def record(self, record: CycleRecord):
+        self.pending.append(record)
+        if len(self.pending) >= self.batch_size:
+            task = asyncio.create_task(self.flush())
+            self.flushes.add(task)
+            task.add_done_callback(self.flushes.discard)
+
+    def save_wake(self, profile: str, wake_at: float):
+        self.pending_wakes[profile] = wake_at
+
+    def write(self, records: list[CycleRecord], wakes: dict[str, float]):
+        connection = self.connect()
+        with connection:
+            connection.executemany(f"INSERT INTO cycles VALUES ({', '.join('?' * len(COLUMNS))})",
+                                   map(astuple, records))
+            connection.executemany("INSERT OR REPLACE INTO schedule VALUES (?, ?)", wakes.items())
+
+    async def flush(self):
+        async with self.lock:
+            records, self.pending = self.pending, []
+            wakes, self.pending_wakes = self.pending_wakes, {}
+            if not records and not wakes:
+                return
+            try:
+                await asyncio.to_thread(self.write, records, wakes)
+            except sqlite3.Error as error:
+                logger.error(f"Failed to write {len(records)} history records: {error}")
+
+    def read_schedule(self) -> dict[str, float]:
+        return dict(self.connect().execute("SELECT profile, wake_at FROM schedule").fetchall())
+
+    async def load_schedule(self) -> dict[str, float]:
+        try:
+            return await asyncio.to_thread(self.read_schedule)
+        except sqlite3.Error as error:
+            logger.warning(f"Failed to read the saved schedule, all profiles start now: {error}")
+            return {}
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def close(self):
+        await self.flush()
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def efficiency(self, since: float, by: str = 'profile') -> list[Efficiency]:
+        key = {'profile': 'profile', 'strategy': 'strategy', 'fleet': "'fleet'"}[by]
+        rows = self.connect().execute(GAINED_QUERY.format(key=key), (since,)).fetchall()
+        return [Efficiency(*row) for row in rows]
+
+    def profile_history(self, profile: str, since: float) -> list[CycleRecord]:
+        rows = self.connect().execute(f"SELECT {', '.join(COLUMNS)} FROM cycles "
+                                      f"WHERE profile = ? AND finished_at >= ? ORDER BY finished_at",
+                                      (profile, since)).fetchall()
+        return [CycleRecord(*row) for row in rows]
+
+
+history = HistoryStore(path=settings.HISTORY_FILE, batch_size=settings.HISTORY_BATCH_SIZE,
+                       flush_interval=settings.HISTORY_FLUSH_INTERVAL)
+
+
+def format_efficiency(rows: list[Efficiency], title: str) -> str:
+    lines = [f"{title.upper():<20} {'CYCLES':>7} {'GAINED':>14} {'REQUESTS':>9} {'WAKES':>7} {'CPU':>8} "
+             f"{'COINS/REQ':>10} {'COINS/WAKE':>11} {'COINS/CPU-S':>12}"]
+    for row in rows:
+        lines.append(f"{row.key:<20} {row.cycles:>7} {row.gained:>14,.0f} {row.requests:>9} {row.wakes:>7} "
+                     f"{row.cpu_time:>7.2f}s {row.per_request:>10,.0f} {row.per_wake:>11,.0f} "
+                     f"{row.per_cpu_second:>12,.0f}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report coins gained per request, wake and CPU second')
+    parser.add_argument('--since', type=float, default=24, help='Hours of history to include')
+    parser.add_argument('--by', choices=['profile', 'strategy'], default='profile')
+    parser.add_argument('--sort', choices=['per_request', 'per_wake', 'per_cpu_second', 'gained'],
+                        default='per_request', help='Least efficient rows are printed first')
+    parser.add_argument('--file', type=Path, default=settings.HISTORY_FILE)
+    args = parser.parse_args()
+
+    if not args.file.exists():
+        print(f"No history at {args.file}")
+        return
+
+    store = HistoryStore(path=args.file)
+    since = time() - args.since * 3600
+    rows = sorted(store.efficiency(since, by=args.by), key=lambda row: getattr(row, args.sort))
+    print(format_efficiency(rows, title=args.by))
+    print()
+    print(format_efficiency(store.efficiency(since, by='fleet'), title='fleet'))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,15 +2,33 @@ import argparse
 import asyncio
 
 from itertools import cycle
+from pathlib import Path
+from time import time
+from typing import AsyncIterator, Awaitable, Callable
 
 from better_proxy import Proxy
+from pydantic import ValidationError
 
 from bot.config import settings
 from bot.core.registrator import register_client
-from bot.core.tapper import run_tapper
+from bot.core.tapper import run_tapper, run_tapper_once
+from bot.core.auth_manager import auth_manager
 from bot.core.helpers import attach_wallet_to_client, add_referral
+from bot.core.priority import request_budget
+from bot.core.web_client import WebClient
 from bot.utils.profile import Profile
-from bot.utils.logger import logger
+from bot.utils.logger import logger, redirect_logger
+from bot.utils.fleet import fleet
+from bot.utils.fleet_columns import FleetColumns
+from bot.utils.history import history
+from bot.utils.leases import LeaseCoordinator, create_lease_store, default_node_id
+from bot.utils.dashboard import run_dashboard
+from bot.utils.profiling import profiler
+from bot.utils.tracing import tracer
+from bot.utils.ramp import RampController
+from bot.utils.supervisor import Supervisor, RestartPolicy
+
+LEASE_LOAD_BATCH = 100
 
 start_text = """
 
@@ -45,20 +63,23 @@ def get_proxies() -> list[Proxy]:
     return proxies
 
 
-async def get_profiles() -> list[Profile]:
+def read_profile(profile_file: Path) -> Profile:
+    data = settings.PROFILE_DIR.joinpath(profile_file).read_text()
+    return Profile.model_validate_json(json_data = data, context = {'rewrite': False})
+
+
+async def iter_profiles() -> AsyncIterator[Profile]:
+    # Every profile is yielded as soon as it is parsed, so the first ones start while the rest are still loading
     profile_files = get_profile_files()
 
     if not profile_files:
         raise FileNotFoundError("Not found profile files")
 
-    profiles = []
     for profile_file in profile_files:
-        data = settings.PROFILE_DIR.joinpath(profile_file).read_text()
-        profile = Profile.model_validate_json(json_data = data, context = {'rewrite': False})
-
-        profiles.append(profile)
-
-    return profiles
+        try:
+            yield await asyncio.to_thread(read_profile, profile_file)
+        except (OSError, ValidationError) as error:
+            logger.error(f"Skipped profile {profile_file.name}: {error}")
 
 async def attach_wallet() -> None:
     profile_name = input('\nEnter the profile name (press Enter to exit): ')
@@ -91,11 +112,17 @@ async def add_ref() -> None:
     await add_referral(profile, referrer)
 
 
-async def process() -> None:
+async def process() -> int | None:
     parser = argparse.ArgumentParser()
     parser.add_argument('-a', '--action', type=int, help='Action to perform')
+    parser.add_argument('--dashboard', action='store_true', help='Show live table instead of logs (action 2)')
+    parser.add_argument('--profile', action='store_true', help='Profile the process and watch event loop lag')
+    parser.add_argument('--trace', action='store_true', help='Write tracing spans of the cycles (action 2)')
+    parser.add_argument('--once', action='store_true',
+                        help='Run one wake of every due profile and exit, for cron or systemd timers (action 2)')
 
-    action = parser.parse_args().action
+    args = parser.parse_args()
+    action = args.action
 
     if not action:
         print(start_text)
@@ -113,10 +140,19 @@ async def process() -> None:
 
     if action == 1:
         await register_client()
-    elif action == 2:        
-        profiles = await get_profiles()
-
-        await run_tasks(profiles=profiles)
+    elif action == 2:
+        if args.profile or settings.PROFILING:
+            profiler.start(output=settings.PROFILING_OUTPUT, lag_threshold_ms=settings.LOOP_LAG_THRESHOLD_MS)
+        if args.trace or settings.TRACING:
+            tracer.start(output=settings.TRACING_OUTPUT, sample_rate=settings.TRACING_SAMPLE_RATE,
+                         slow_cycle=settings.TRACING_SLOW_CYCLE)
+        try:
+            if args.once:
+                return await run_once(profiles=iter_profiles())
+            await run_tasks(profiles=iter_profiles(), dashboard=args.dashboard)
+        finally:
+            profiler.stop()
+            await tracer.close()
     elif action == 3:
         await attach_wallet()
     elif action == 4:
@@ -125,12 +161,141 @@ async def process() -> None:
         exit()   
 
 #RUN all tasks
-async def run_tasks(profiles: list[Profile]):
+async def run_tasks(profiles: AsyncIterator[Profile], dashboard: bool = False):
     logger.info(f"Detected {len(get_profile_files())} clients | {len(get_proxies())} proxies")
 
+    if dashboard:
+        logger.info(f"Dashboard mode, logs are written to {settings.DASHBOARD_LOG_FILE}")
+        redirect_logger(settings.DASHBOARD_LOG_FILE, level=settings.DASHBOARD_LOG_LEVEL)
+        # The dashboard estimates balances and energy from the columns, nothing else reads them
+        fleet.columns = FleetColumns()
+        dashboard_task = asyncio.create_task(run_dashboard(fleet, refresh_interval=settings.DASHBOARD_REFRESH_INTERVAL,
+                                                           max_rows=settings.DASHBOARD_MAX_ROWS))
+
+    history_task = asyncio.create_task(history.run()) if settings.HISTORY_ENABLED else None
+    # Reports run even while the budget is off, REQUEST_RATE can be turned on by a settings reload
+    budget_task = asyncio.create_task(request_budget.run(report_interval=settings.REQUEST_BUDGET_REPORT_INTERVAL))
+
+    schedule = await history.load_schedule() if settings.HISTORY_ENABLED else {}
+    ramp = RampController(concurrency=settings.STARTUP_CONCURRENCY, rate=settings.STARTUP_RATE)
+    ramp.start(request_counter=lambda: WebClient.requests_total)
+
     proxies = get_proxies()
     proxies_cycle = cycle(proxies) if proxies else None
-    tasks = [asyncio.create_task(run_tapper(profile=profile, proxy=profile.proxy if profile.proxy else next(proxies_cycle) if proxies_cycle else None))
-             for profile in profiles]
+    supervisor = Supervisor(fleet, policy=RestartPolicy(backoff_base=settings.RESTART_BACKOFF_BASE,
+                                                        backoff_max=settings.RESTART_BACKOFF_MAX,
+                                                        max_crashes=settings.RESTART_MAX_CRASHES,
+                                                        quarantine=settings.RESTART_QUARANTINE))
+
+    def start_profile(profile: Profile):
+        resume_at = schedule.get(profile.name)
+        ramp.expect(profile.name, due=resume_at is None or resume_at <= time())
+        proxy = profile.proxy if profile.proxy else next(proxies_cycle) if proxies_cycle else None
+        supervisor.start(profile.name, lambda: run_tapper(profile=profile, proxy=proxy, ramp=ramp,
+                                                          resume_at=resume_at))
+
+    try:
+        if settings.LEASE_STORE:
+            await run_leased(profiles, start_profile, supervisor.stop, ramp)
+        else:
+            async for profile in profiles:
+                start_profile(profile)
+            ramp.finish_loading()
+
+            await supervisor.wait()
+    finally:
+        await supervisor.close()
+        await auth_manager.close()
+        if budget_task is not None:
+            budget_task.cancel()
+        if history_task is not None:
+            history_task.cancel()
+            await history.close()
+
+    if dashboard:
+        dashboard_task.cancel()
+
+
+async def run_once(profiles: AsyncIterator[Profile]) -> int:
+    # Runs the profiles whose saved wake has come and exits, nothing stays in memory between runs.
+    # Next wakes are saved to the history file, the exit code is 1 when any profile failed
+    started = time()
+    schedule = await history.load_schedule()
+    ramp = RampController(concurrency=settings.STARTUP_CONCURRENCY, rate=settings.STARTUP_RATE)
+    ramp.start(request_counter=lambda: WebClient.requests_total)
 
-    await asyncio.gather(*tasks)
+    proxies = get_proxies()
+    proxies_cycle = cycle(proxies) if proxies else None
+    ran: list[str] = []
+    not_due: list[str] = []
+    # Every error of a profile's wake, the status only keeps the last action's
+    failed: dict[str, list[str]] = {}
+    # Only as many profile tasks exist as the ramp runs at once, the rest wait here before they are created
+    slots = asyncio.Semaphore(ramp.concurrency)
+
+    async def run_profile(profile: Profile, proxy: str | None):
+        try:
+            if errors := await run_tapper_once(profile=profile, proxy=proxy, ramp=ramp):
+                failed[profile.name] = errors
+        except Exception as error:  # pylint: disable=W0718
+            logger.opt(exception=error).error(f"[{profile.name}] Crashed: {error}")
+            fleet.get(profile.name).error = f"crashed: {type(error).__name__}"
+            failed[profile.name] = [fleet.get(profile.name).error]
+        finally:
+            slots.release()
+
+    tasks: set[asyncio.Task] = set()
+    try:
+        async for profile in profiles:
+            resume_at = schedule.get(profile.name)
+            due = resume_at is None or resume_at <= started
+            ramp.expect(profile.name, due=due)
+            if not due:
+                not_due.append(profile.name)
+                continue
+            ran.append(profile.name)
+            proxy = profile.proxy if profile.proxy else next(proxies_cycle) if proxies_cycle else None
+            await slots.acquire()
+            task = asyncio.create_task(run_profile(profile, proxy))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        ramp.finish_loading()
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await auth_manager.close()
+        await history.close()
+
+    next_wakes = [fleet.get(name).next_wake for name in ran if fleet.get(name).next_wake] + \
+                 [schedule[name] for name in not_due]
+    next_due = f"{max(int(min(next_wakes) - time()), 0)}s" if next_wakes else "unknown"
+    logger.info(f"Batch run finished in {time() - started:.1f}s | ran: {len(ran)} | ok: {len(ran) - len(failed)} | "
+                f"failed: {len(failed)} | not due: {len(not_due)} | next profile due in {next_due}")
+    for name, errors in sorted(failed.items()):
+        logger.error(f"[{name}] {'; '.join(errors)}")
+    return 1 if failed else 0
+
+
+async def run_leased(profiles: AsyncIterator[Profile], start_profile: Callable[[Profile], None],
+                     stop_profile: Callable[[str], Awaitable[None]], ramp: RampController):
+    # Only the profiles leased by this node are run, the rest belong to other nodes. Leases are taken
+    # while the profiles are loading, every LEASE_LOAD_BATCH profiles or when the held ones need renewing
+    profiles_by_name: dict[str, Profile] = {}
+
+    node = settings.NODE_ID or default_node_id()
+    logger.info(f"Running as node {node} with leases from {settings.LEASE_STORE}")
+    coordinator = LeaseCoordinator(store=create_lease_store(settings.LEASE_STORE), node=node,
+                                   ttl=settings.LEASE_TTL, start=lambda name: start_profile(profiles_by_name[name]),
+                                   stop=stop_profile)
+    try:
+        async for profile in profiles:
+            profiles_by_name[profile.name] = profile
+            coordinator.add(profile.name)
+            if len(coordinator.profiles) % LEASE_LOAD_BATCH == 0 or coordinator.renew_due:
+                await coordinator.tick()
+        await coordinator.tick()
+        ramp.finish_loading()
+        await coordinator.run()
+    finally:
+        await coordinator.close()
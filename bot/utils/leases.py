@@ -0,0 +1,318 @@
+"""Profile leases shared by several bot instances.
+
+Every profile is run by the node holding its lease. Leases are renewed every third of LEASE_TTL.
+A watchdog stops a node's profiles half a TTL after the last renewal, even while a renewal is still
+hanging on the store, and waits for the stops at most half of the time left on the leases. So another
+node can only pick a profile up after the previous one has stopped it. Nodes announce themselves with
+a heartbeat and keep about an equal share of the profiles, preferring the ones that hash to them.
+"""
+import asyncio
+import math
+import os
+import socket
+import sqlite3
+import zlib
+from abc import ABC, abstractmethod
+from pathlib import Path
+from time import time
+from typing import Awaitable, Callable
+
+from bot.utils import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (profile PRIMARY KEY, node, expires_at);
+CREATE TABLE IF NOT EXISTS nodes (node PRIMARY KEY, expires_at);
+"""
+
+# Takes the lease if it is free, expired or already ours
+ACQUIRE_SQL = """
+INSERT INTO leases VALUES (:profile, :node, :expires_at)
+ON CONFLICT (profile) DO UPDATE SET node = excluded.node, expires_at = excluded.expires_at
+WHERE leases.node = excluded.node OR leases.expires_at <= :now
+"""
+
+REDIS_ACQUIRE = """
+local owner = redis.call('GET', KEYS[1])
+if owner == false or owner == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+REDIS_RENEW = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+REDIS_RELEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def default_node_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class LeaseStore(ABC):
+    @abstractmethod
+    async def heartbeat(self, node: str, ttl: float, now: float):
+        ...
+
+    @abstractmethod
+    async def live_nodes(self, now: float) -> list[str]:
+        ...
+
+    @abstractmethod
+    async def owners(self, profiles: list[str], now: float) -> dict[str, str]:
+        ...
+
+    @abstractmethod
+    async def acquire(self, profiles: list[str], node: str, ttl: float, now: float) -> set[str]:
+        ...
+
+    @abstractmethod
+    async def renew(self, profiles: set[str], node: str, ttl: float, now: float) -> set[str]:
+        ...
+
+    @abstractmethod
+    async def release(self, profiles: set[str], node: str):
+        ...
+
+    async def close(self):
+        pass
+
+
+class SqliteLeaseStore(LeaseStore):
+    # For nodes sharing a volume. Expiry times come from the nodes' clocks, so they must be in sync
+    def __init__(self, path: Path):
+        self.path = path
+        self.connection: sqlite3.Connection | None = None
+
+    def transaction(self, callback: Callable[[sqlite3.Connection], object]):
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self.connection.executescript(SCHEMA)
+        # BEGIN IMMEDIATE takes the write lock up front, so checks and updates of different nodes don't interleave
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            result = callback(self.connection)
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+        return result
+
+    async def run(self, callback: Callable[[sqlite3.Connection], object]):
+        return await asyncio.to_thread(self.transaction, callback)
+
+    async def heartbeat(self, node: str, ttl: float, now: float):
+        def callback(connection: sqlite3.Connection):
+            connection.execute("INSERT OR REPLACE INTO nodes VALUES (?, ?)", (node, now + ttl))
+            connection.execute("DELETE FROM nodes WHERE expires_at <= ?", (now,))
+        await self.run(callback)
+
+    async def live_nodes(self, now: float) -> list[str]:
+        return await self.run(lambda connection: [row[0] for row in connection.execute(
+            "SELECT node FROM nodes WHERE expires_at > ?", (now,))])
+
+    async def owners(self, profiles: list[str], now: float) -> dict[str, str]:
+        rows = await self.run(lambda connection: connection.execute(
+            "SELECT profile, node FROM leases WHERE expires_at > ?", (now,)).fetchall())
+        wanted = set(profiles)
+        return {profile: node for profile, node in rows if profile in wanted}
+
+    async def acquire(self, profiles: list[str], node: str, ttl: float, now: float) -> set[str]:
+        def callback(connection: sqlite3.Connection):
+            acquired = set()
+            for profile in profiles:
+                cursor = connection.execute(ACQUIRE_SQL, {'profile': profile, 'node': node,
+                                                          'expires_at': now + ttl, 'now': now})
+                if cursor.rowcount > 0:
+                    acquired.add(profile)
+            return acquired
+        return await self.run(callback)
+
+    async def renew(self, profiles: set[str], node: str, ttl: float, now: float) -> set[str]:
+        def callback(connection: sqlite3.Connection):
+            renewed = set()
+            for profile in profiles:
+                cursor = connection.execute(
+                    "UPDATE leases SET expires_at = ? WHERE profile = ? AND node = ? AND expires_at > ?",
+                    (now + ttl, profile, node, now))
+                if cursor.rowcount > 0:
+                    renewed.add(profile)
+            return renewed
+        return await self.run(callback)
+
+    async def release(self, profiles: set[str], node: str):
+        await self.run(lambda connection: connection.executemany(
+            "DELETE FROM leases WHERE profile = ? AND node = ?", [(profile, node) for profile in profiles]))
+
+    async def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class RedisLeaseStore(LeaseStore):
+    # Any Redis compatible server, expiry is done by the server. Needs the optional redis package
+    def __init__(self, url: str, prefix: str = 'hamster'):
+        try:
+            import redis.asyncio as redis  # pylint: disable=C0415
+        except ImportError as error:
+            raise RuntimeError("Redis lease store requires redis: pip install redis") from error
+
+        self.redis = redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.acquire_script = self.redis.register_script(REDIS_ACQUIRE)
+        self.renew_script = self.redis.register_script(REDIS_RENEW)
+        self.release_script = self.redis.register_script(REDIS_RELEASE)
+
+    def key(self, profile: str) -> str:
+        return f"{self.prefix}:lease:{profile}"
+
+    async def heartbeat(self, node: str, ttl: float, now: float):
+        nodes_key = f"{self.prefix}:nodes"
+        await self.redis.zadd(nodes_key, {node: now + ttl})
+        await self.redis.zremrangebyscore(nodes_key, '-inf', now)
+
+    async def live_nodes(self, now: float) -> list[str]:
+        return await self.redis.zrangebyscore(f"{self.prefix}:nodes", f"({now}", '+inf')
+
+    async def owners(self, profiles: list[str], now: float) -> dict[str, str]:
+        if not profiles:
+            return {}
+        nodes = await self.redis.mget([self.key(profile) for profile in profiles])
+        return {profile: node for profile, node in zip(profiles, nodes) if node is not None}
+
+    async def acquire(self, profiles: list[str], node: str, ttl: float, now: float) -> set[str]:
+        return {profile for profile in profiles
+                if await self.acquire_script(keys=[self.key(profile)], args=[node, int(ttl * 1000)])}
+
+    async def renew(self, profiles: set[str], node: str, ttl: float, now: float) -> set[str]:
+        return {profile for profile in profiles
+                if await self.renew_script(keys=[self.key(profile)], args=[node, int(ttl * 1000)])}
+
+    async def release(self, profiles: set[str], node: str):
+        for profile in profiles:
+            await self.release_script(keys=[self.key(profile)], args=[node])
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+def create_lease_store(url: str) -> LeaseStore:
+    if url.startswith(('redis://', 'rediss://')):
+        return RedisLeaseStore(url)
+    return SqliteLeaseStore(Path(url.removeprefix('sqlite:///')))
+
+
+def preferred_node(profile: str, nodes: list[str]) -> str:
+    # Rendezvous hashing, only the profiles of a node that joins or leaves change their preferred node
+    return max(nodes, key=lambda node: zlib.crc32(f"{node}:{profile}".encode()))
+
+
+class LeaseCoordinator:
+    def __init__(self, store: LeaseStore, node: str, ttl: float, start: Callable[[str], None],
+                 stop: Callable[[str], Awaitable[None]]):
+        self.store = store
+        self.node = node
+        self.ttl = ttl
+        # Profiles known so far, they are added while the profile files are still loading
+        self.profiles: list[str] = []
+        self.start = start
+        self.stop = stop
+        self.held: set[str] = set()
+        self.renewed_at = 0.0
+        self.fence_task: asyncio.Task | None = None
+
+    def add(self, profile: str):
+        self.profiles.append(profile)
+
+    @property
+    def renew_due(self) -> bool:
+        return time() - self.renewed_at >= self.ttl / 3
+
+    async def stop_profiles(self, profiles: set[str], bounded: bool = True) -> set[str]:
+        # All at once, so one slow profile doesn't hold up the others. Bounded stops are waited for half of
+        # the time left on the leases, profiles still stopping after that stay held and are tried again
+        if not profiles:
+            return set()
+        stops = {asyncio.create_task(self.stop(profile)): profile for profile in profiles}
+        timeout = max(self.renewed_at + self.ttl - time(), 0) / 2 if bounded else None
+        done, pending = await asyncio.wait(stops, timeout=timeout)
+        if pending:
+            logger.error(f"{len(pending)} profiles didn't stop within {timeout:.0f}s: "
+                         f"{', '.join(sorted(stops[stop] for stop in pending))}")
+        stopped = {stops[stop] for stop in done}
+        self.held -= stopped
+        return stopped
+
+    async def tick(self):
+        if self.fence_task is None:
+            self.fence_task = asyncio.create_task(self.fence())
+        now = time()
+        await self.store.heartbeat(self.node, self.ttl, now)
+        nodes = sorted(set(await self.store.live_nodes(now)) | {self.node})
+        share = math.ceil(len(self.profiles) / len(nodes))
+
+        renewed = await self.store.renew(self.held, self.node, self.ttl, now)
+        if lost := self.held - renewed:
+            logger.warning(f"Lost leases of {len(lost)} profiles: {', '.join(sorted(lost))}")
+            await self.stop_profiles(lost)
+        self.renewed_at = now
+
+        if len(self.held) > share:
+            # Rebalance when nodes join, profiles preferred by other nodes are given back first.
+            # A profile is stopped before its lease is released, so it never runs on two nodes
+            extra = set(sorted(self.held, key=lambda p: preferred_node(p, nodes) == self.node)[:len(self.held) - share])
+            logger.info(f"Handing over {len(extra)} profiles to {len(nodes) - 1} other nodes")
+            await self.store.release(await self.stop_profiles(extra), self.node)
+        elif len(self.held) < share:
+            owners = await self.store.owners(self.profiles, now)
+            free = sorted((p for p in self.profiles if p not in owners),
+                          key=lambda p: preferred_node(p, nodes) != self.node)
+            acquired = await self.store.acquire(free[:share - len(self.held)], self.node, self.ttl, now)
+            for profile in sorted(acquired):
+                self.start(profile)
+            self.held |= acquired
+            if acquired:
+                logger.info(f"Node {self.node} took {len(acquired)} profiles | holds {len(self.held)}/{share} "
+                            f"of {len(self.profiles)} | nodes: {len(nodes)}")
+
+    async def fence(self):
+        # Stops everything half a TTL after the last renewal, before the leases can expire and be taken by
+        # another node. It runs apart from the ticks, so a tick hanging on the store can't delay it
+        while True:
+            remaining = self.renewed_at + self.ttl / 2 - time()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+                continue
+            if self.held:
+                logger.warning(f"Leases not renewed for {time() - self.renewed_at:.0f}s, "
+                               f"stopping {len(self.held)} profiles")
+                await self.stop_profiles(set(self.held))
+            await asyncio.sleep(self.ttl / 6)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                await asyncio.wait_for(self.tick(), timeout=self.ttl / 3)
+            except Exception as error:  # pylint: disable=W0718
+                logger.error(f"Lease store error: {error}")
+
+    async def close(self):
+        if self.fence_task is not None:
+            self.fence_task.cancel()
+        held = await self.stop_profiles(set(self.held), bounded=False)
+        try:
+            await self.store.release(held, self.node)
+        finally:
+            await self.store.close()
@@ -2,16 +2,22 @@ import sys
 from loguru import logger as base_logger
 
 
+LOG_FORMAT = "<white>{time:YYYY-MM-DD HH:mm:ss}</white>" \
+             " | <level>{level: <8}</level>" \
+             " | <cyan><b>{line}</b></cyan>" \
+             " - <white><b>{message}</b></white>"
+
+
 def setup_logger():
     base_logger.remove()
-    base_logger.add(
-        sink=sys.stdout,
-        format="<white>{time:YYYY-MM-DD HH:mm:ss}</white>"
-               " | <level>{level: <8}</level>"
-               " | <cyan><b>{line}</b></cyan>"
-               " - <white><b>{message}</b></white>"
-    )
+    base_logger.add(sink=sys.stdout, format=LOG_FORMAT)
     return base_logger.opt(colors=True)
 
 
+def redirect_logger(path, level: str):
+    # Used by the dashboard mode, which owns the terminal
+    base_logger.remove()
+    base_logger.add(sink=path, format=LOG_FORMAT, level=level, enqueue=True)
+
+
 logger = setup_logger()
@@ -1,5 +1,5 @@
 from typing_extensions import Optional
-from pydantic import BaseModel, model_validator
+from pydantic import BaseModel, Field, model_validator
 from json import dump
 from pathlib import Path
 
@@ -11,16 +11,19 @@ class Profile(BaseModel, validate_assignment=True):
     id: Optional[int] = None
     token: Optional[str] = None
 
-    wait_for_most_profit_upgrades : bool = settings.WAIT_FOR_MOST_PROFIT_UPGRADES 
-    auto_upgrade: bool = settings.AUTO_UPGRADE 
-    auto_clicker: bool = settings.AUTO_CLICKER 
-    apply_daily_energy: bool = settings.APPLY_DAILY_ENERGY 
+    # Defaults are read from settings whenever a profile is built. Only the fields a profile sets are saved,
+    # so the others keep following the settings, reloaded ones included
+    wait_for_most_profit_upgrades : bool = Field(default_factory=lambda: settings.WAIT_FOR_MOST_PROFIT_UPGRADES)
+    auto_upgrade: bool = Field(default_factory=lambda: settings.AUTO_UPGRADE)
+    auto_clicker: bool = Field(default_factory=lambda: settings.AUTO_CLICKER)
+    apply_daily_energy: bool = Field(default_factory=lambda: settings.APPLY_DAILY_ENERGY)
 
-    min_balance: int = settings.MIN_BALANCE 
-    min_taps_for_clicker_in_percent: int = settings.MIN_TAPS_FOR_CLICKER_IN_PERCENT 
-    sleep_interval_before_upgrade: list[int] = settings.SLEEP_INTERVAL_BEFORE_UPGRADE 
+    min_balance: int = Field(default_factory=lambda: settings.MIN_BALANCE)
+    min_taps_for_clicker_in_percent: int = Field(default_factory=lambda: settings.MIN_TAPS_FOR_CLICKER_IN_PERCENT)
+    sleep_interval_before_upgrade: list[int] = Field(default_factory=lambda: list(settings.SLEEP_INTERVAL_BEFORE_UPGRADE))
 
-    balance_strategy: int = settings.BALANCE_STRATEGY
+    balance_strategy: int = Field(default_factory=lambda: settings.BALANCE_STRATEGY)
+    upgrade_strategy: str = Field(default_factory=lambda: settings.UPGRADE_STRATEGY)
 
     user_agent: str = 'Mozilla/5.0 (Linux; Android 13; SM-A135N Build/TP1A.220624.014; wv) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/125.0.6422.165 Mobile Safari/537.36'
     sec_ch_ua: str = '"Android WebView";v="125", "Chromium";v="125", "Not?A_Brand";v="33"'
@@ -33,10 +36,14 @@ class Profile(BaseModel, validate_assignment=True):
         if info.context and ('rewrite', False) in info.context.items():
             return self
         
-        with open(Path.joinpath(settings.PROFILE_DIR, f"{self.name}.json"), 'w', encoding='utf-8') as file:
-            dump(self.model_dump(), file, ensure_ascii=False, indent=4)
+        self.write(self.model_dump(exclude_unset=True))
 
         return self
+
+    def write(self, data: dict):
+        # Blocking file write, the data is dumped by the caller so it can run in a worker thread
+        with open(Path.joinpath(settings.PROFILE_DIR, f"{self.name}.json"), 'w', encoding='utf-8') as file:
+            dump(data, file, ensure_ascii=False, indent=4)
     
     @staticmethod
     def load(name: str):
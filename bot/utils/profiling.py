@@ -0,0 +1,186 @@
+import asyncio
+import cProfile
+import signal
+import sys
+import threading
+import traceback
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from pathlib import Path
+from time import perf_counter, thread_time
+
+from bot.utils import logger
+from bot.utils.tracing import tracer
+
+
+@dataclass
+class PhaseStats:
+    count: int = 0
+    total: float = 0
+    max: float = 0
+
+    def add(self, duration: float):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+
+@dataclass
+class PhaseTimer:
+    parent: 'PhaseTimer | None'
+    # Deliberate sleeps inside the phase, they are not part of its duration
+    slept: float = 0
+
+
+current_phase: ContextVar[PhaseTimer | None] = ContextVar('current_phase', default=None)
+
+
+class CpuMeter:
+    # Counts CPU time spent inside the measured coroutines only: every step between two awaits
+    # runs on the loop thread without interruption, so thread time around each step belongs to it
+    def __init__(self):
+        self.total = 0.0
+
+    async def measure(self, coroutine):
+        return await _MeasuredCoroutine(coroutine, self)
+
+
+class _MeasuredCoroutine:
+    def __init__(self, coroutine, meter: CpuMeter):
+        self.coroutine = coroutine
+        self.meter = meter
+
+    def __await__(self):
+        iterator = self.coroutine.__await__()
+        value, error = None, None
+        while True:
+            started = thread_time()
+            try:
+                future = iterator.throw(error) if error is not None else iterator.send(value)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                self.meter.total += thread_time() - started
+
+            try:
+                value, error = (yield future), None
+            except BaseException as raised:  # pylint: disable=W0718
+                value, error = None, raised
+
+
+class LoopLagMonitor:
+    # A heartbeat coroutine marks the loop as alive, a watchdog thread dumps the loop thread stack
+    # when the heartbeat is late, i.e. while a callback is still blocking the loop
+
+    def __init__(self, threshold_ms: int):
+        self.threshold = threshold_ms / 1000
+        self.beat = perf_counter()
+        self.loop_thread_id = threading.get_ident()
+        self.reported_beat = None
+        self.stopped = threading.Event()
+
+    async def heartbeat(self):
+        while not self.stopped.is_set():
+            self.beat = perf_counter()
+            await asyncio.sleep(self.threshold / 2)
+
+    def watchdog(self):
+        while not self.stopped.wait(self.threshold / 2):
+            beat = self.beat
+            lag = perf_counter() - beat
+            if lag < self.threshold or self.reported_beat == beat:
+                continue
+            self.reported_beat = beat
+            frame = sys._current_frames().get(self.loop_thread_id)  # pylint: disable=W0212
+            stack = "".join(traceback.format_stack(frame)) if frame else "unknown"
+            logger.opt(raw=True).warning(f"Event loop blocked for more than {int(lag * 1000)}ms:\n{stack}\n")
+
+    def start(self) -> asyncio.Task:
+        threading.Thread(target=self.watchdog, name='loop-lag-watchdog', daemon=True).start()
+        return asyncio.create_task(self.heartbeat())
+
+    def stop(self):
+        self.stopped.set()
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.output: Path | None = None
+        self.profile: cProfile.Profile | None = None
+        self.lag_monitor: LoopLagMonitor | None = None
+        self.lag_task: asyncio.Task | None = None
+        self.phases: dict[str, PhaseStats] = defaultdict(PhaseStats)
+
+    def start(self, output: Path, lag_threshold_ms: int):
+        self.enabled = True
+        self.output = output
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+        self.lag_monitor = LoopLagMonitor(threshold_ms=lag_threshold_ms)
+        self.lag_task = self.lag_monitor.start()
+
+        if hasattr(signal, 'SIGUSR1'):
+            asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, self.dump)
+        logger.info(f"Profiling enabled, stats are written to {output} at exit"
+                    + (" or on SIGUSR1" if hasattr(signal, 'SIGUSR1') else ""))
+
+    @contextmanager
+    def phase(self, name: str):
+        # Phases are also spans of the traced cycle
+        with tracer.span(name):
+            if not self.enabled:
+                yield
+                return
+            timer = PhaseTimer(parent=current_phase.get())
+            token = current_phase.set(timer)
+            started = perf_counter()
+            try:
+                yield
+            finally:
+                current_phase.reset(token)
+                self.phases[name].add(perf_counter() - started - timer.slept)
+
+    @contextmanager
+    def sleeping(self):
+        # Wraps a deliberate sleep, its time is taken out of the current phase and all of its parents
+        timer = current_phase.get()
+        if not self.enabled or timer is None:
+            yield
+            return
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            slept = perf_counter() - started
+            while timer is not None:
+                timer.slept += slept
+                timer = timer.parent
+
+    def dump(self):
+        if self.profile is None:
+            return
+        self.profile.dump_stats(self.output)
+        # dump_stats disables the profiler
+        self.profile.enable()
+
+        lines = [f"{'PHASE':<12} {'COUNT':>8} {'TOTAL':>10} {'AVG':>8} {'MAX':>8}"]
+        for name, stats in sorted(self.phases.items(), key=lambda item: -item[1].total):
+            lines.append(f"{name:<12} {stats.count:>8} {stats.total:>9.1f}s {stats.total / stats.count:>7.2f}s "
+                         f"{stats.max:>7.2f}s")
+        logger.info(f"Profile written to {self.output}, phase times exclude sleeps\n" + "\n".join(lines))
+
+    def stop(self):
+        if not self.enabled:
+            return
+        self.dump()
+        self.profile.disable()
+        self.lag_monitor.stop()
+        self.lag_task.cancel()
+        self.enabled = False
+
+
+profiler = Profiler()
@@ -0,0 +1,92 @@
+import asyncio
+from contextlib import asynccontextmanager
+from statistics import median
+from typing import Callable
+
+from bot.utils import logger
+from bot.utils.clock import Clock, clock as system_clock
+
+
+class RampController:
+    # Profiles are activated at most `rate` per second with at most `concurrency` first wakes in flight,
+    # so a restart doesn't send every profile's sync within the same second
+    def __init__(self, concurrency: int, rate: float, clock: Clock = system_clock):
+        self.clock = clock
+        self.concurrency = max(concurrency, 1)
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_start = 0.0
+        self.started_at = self.clock.time()
+        # Profiles due at boot which haven't finished their first wake yet
+        self.booting: set[str] = set()
+        self.deferred = 0
+        # Profiles that left the boot set without a first wake: crashed before it or stopped while waiting
+        self.failed = 0
+        self.loaded = False
+        self.first_actions: list[float] = []
+        self.peak_rate = 0
+        self.monitor_task: asyncio.Task | None = None
+
+    def start(self, request_counter: Callable[[], int]):
+        self.started_at = self.clock.time()
+        self.monitor_task = asyncio.create_task(self.monitor(request_counter))
+
+    def expect(self, name: str, due: bool):
+        if due:
+            self.booting.add(name)
+        else:
+            self.deferred += 1
+
+    def finish_loading(self):
+        self.loaded = True
+        self.check_boot_finished()
+
+    @asynccontextmanager
+    async def activation(self, name: str):
+        try:
+            async with self.semaphore:
+                now = self.clock.time()
+                start = max(now, self.next_start)
+                self.next_start = start + self.interval
+                if start > now:
+                    await self.clock.sleep(start - now)
+                yield
+        finally:
+            # A failed first wake still counts as one
+            self.release(name, activated=True)
+
+    def release(self, name: str, activated: bool = False):
+        # Takes the profile out of the boot set, the boot report shouldn't wait for it forever.
+        # Only the first call for a profile counts, later ones do nothing
+        if name not in self.booting:
+            return
+        self.booting.discard(name)
+        if activated:
+            self.first_actions.append(self.clock.time() - self.started_at)
+        else:
+            self.failed += 1
+        self.check_boot_finished()
+
+    async def monitor(self, request_counter: Callable[[], int]):
+        last = request_counter()
+        while True:
+            await self.clock.sleep(1)
+            current = request_counter()
+            self.peak_rate = max(self.peak_rate, current - last)
+            last = current
+
+    def check_boot_finished(self):
+        if not self.loaded or self.booting or self.monitor_task is None:
+            return
+        self.monitor_task.cancel()
+        self.monitor_task = None
+
+        elapsed = self.clock.time() - self.started_at
+        if self.first_actions:
+            logger.info(f"Boot finished in {elapsed:.1f}s | activated: {len(self.first_actions)} | "
+                        f"deferred by saved schedule: {self.deferred} | failed before activation: {self.failed} | "
+                        f"time to first action: median {median(self.first_actions):.1f}s, max {max(self.first_actions):.1f}s | "
+                        f"peak request rate: {self.peak_rate}/s")
+        else:
+            logger.info(f"Boot finished in {elapsed:.1f}s | deferred by saved schedule: {self.deferred} | "
+                        f"failed before activation: {self.failed}")
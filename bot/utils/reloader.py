@@ -0,0 +1,88 @@
+from pathlib import Path
+from time import time
+
+from pydantic import ValidationError
+
+from bot.config import settings
+from bot.config.config import Settings
+from bot.utils import logger
+from bot.utils.fleet import fleet
+from bot.utils.profile import Profile
+
+
+def get_mtime(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return 0
+
+
+class ConfigReloader:
+    def __init__(self, env_file: Path):
+        self.env_file = env_file
+        self.env_mtime = get_mtime(env_file)
+        self.checked_at = time()
+
+    def reload_settings(self) -> bool:
+        # Shared by every profile, so the file is checked at most once per interval
+        if time() - self.checked_at < settings.CONFIG_RELOAD_INTERVAL:
+            return False
+        self.checked_at = time()
+
+        mtime = get_mtime(self.env_file)
+        if mtime == self.env_mtime:
+            return False
+
+        try:
+            new_settings = Settings()
+        except (ValidationError, FileNotFoundError) as error:
+            # The file is read again next interval, so a fix made while it was broken is picked up
+            logger.warning(f"Settings from {self.env_file} are invalid, keep current ones: {error}")
+            return False
+        self.env_mtime = mtime
+
+        changes = {name: getattr(new_settings, name) for name in Settings.model_fields
+                   if getattr(new_settings, name) != getattr(settings, name)}
+        for name, value in changes.items():
+            setattr(settings, name, value)
+
+        if changes:
+            fleet.settings_version += 1
+            logger.info(f"Settings reloaded (version {fleet.settings_version}): "
+                        + ", ".join(f"{name}={value}" for name, value in changes.items()))
+        return bool(changes)
+
+    @staticmethod
+    def reload_profile(profile: Profile, known_mtime: float) -> tuple[Profile, float]:
+        mtime = get_mtime(settings.PROFILE_DIR.joinpath(f"{profile.name}.json"))
+        if mtime == known_mtime:
+            return profile, known_mtime
+
+        try:
+            new_profile = Profile.load(name=profile.name)
+        except (ValidationError, FileNotFoundError) as error:
+            logger.warning(f"[{profile.name}] Profile file is invalid, keep current settings: {error}")
+            return profile, mtime
+
+        return ConfigReloader.apply(profile, new_profile, source='file'), mtime
+
+    @staticmethod
+    def resolve_defaults(profile: Profile) -> Profile:
+        # Fields the profile doesn't set come from the settings, they are read again after a settings reload
+        new_profile = Profile.model_validate(profile.model_dump(exclude_unset=True), context={'rewrite': False})
+        return ConfigReloader.apply(profile, new_profile, source='settings')
+
+    @staticmethod
+    def apply(profile: Profile, new_profile: Profile, source: str) -> Profile:
+        old_values, new_values = profile.model_dump(), new_profile.model_dump()
+        changes = {name: value for name, value in new_values.items() if old_values.get(name) != value}
+        if not changes:
+            return profile
+
+        fleet.get(profile.name).config_reloads += 1
+        logger.info(f"[{profile.name}] Profile reloaded from {source}: "
+                    + ", ".join(name if name == 'token' else f"{name}={value}" for name, value in changes.items()))
+        return new_profile
+
+
+reloader = ConfigReloader(env_file=Path(Settings.model_config['env_file']))
@@ -0,0 +1,220 @@
+"""Offline model of the game economy used to tune Tapper settings.
+
+Every strategy configuration is one row of the state arrays, so thousands of
+parameter combinations are simulated together in a single pass:
+
+    python -m bot.utils.simulator --days 3 --balance-strategy 0 5 10 20 --min-taps 20 50 80
+"""
+import argparse
+import itertools
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+# me-telegram, config, sync, upgrades-for-buy, boosts-for-buy, list-tasks
+REQUESTS_PER_CYCLE = 6
+MIN_SLEEP = 40
+
+
+@dataclass
+class Catalog:
+    price: np.ndarray
+    profit: np.ndarray
+    cooldown: np.ndarray
+    max_level: np.ndarray
+    price_growth: float
+    profit_growth: float
+
+    @staticmethod
+    def synthetic(size: int, rng: np.random.Generator, price_growth: float = 1.18, profit_growth: float = 1.07):
+        price = rng.lognormal(mean=9, sigma=1.5, size=size)
+        payback_hours = rng.uniform(low=5, high=60, size=size)
+        cooldown = np.where(rng.random(size) < 0.2, rng.choice([600, 3600, 14400], size=size), 0)
+        return Catalog(price=price, profit=price / payback_hours, cooldown=cooldown.astype(float),
+                       max_level=np.full(size, 50), price_growth=price_growth, profit_growth=profit_growth)
+
+    @staticmethod
+    def from_file(path: Path, price_growth: float = 1.18, profit_growth: float = 1.07):
+        # Recorded 'upgrades-for-buy' response
+        data = json.loads(path.read_text())
+        upgrades = [u for u in data.get('upgradesForBuy', data)
+                    if u.get('isAvailable') and not u.get('isExpired') and u.get('profitPerHourDelta', 0) > 0]
+        return Catalog(price=np.array([u['price'] for u in upgrades], dtype=float),
+                       profit=np.array([u['profitPerHourDelta'] for u in upgrades], dtype=float),
+                       cooldown=np.array([u.get('cooldownSeconds', 0) for u in upgrades], dtype=float),
+                       max_level=np.array([u.get('maxLevel', 1000) - u['level'] + 1 for u in upgrades]),
+                       price_growth=price_growth, profit_growth=profit_growth)
+
+
+@dataclass
+class Player:
+    balance: float = 1_000_000
+    earn_per_hour: float = 10_000
+    max_energy: float = 5_000
+    energy_recover_per_sec: float = 3
+    max_sleep_time: float = 10_800
+
+
+@dataclass
+class Parameters:
+    balance_strategy: np.ndarray
+    wait_for_most_profit_upgrades: np.ndarray
+    min_taps_for_clicker_in_percent: np.ndarray
+    min_balance: np.ndarray
+
+    @staticmethod
+    def grid(balance_strategy, wait_for_most_profit_upgrades, min_taps_for_clicker_in_percent, min_balance):
+        rows = np.array(list(itertools.product(balance_strategy, wait_for_most_profit_upgrades,
+                                               min_taps_for_clicker_in_percent, min_balance)), dtype=float)
+        return Parameters(balance_strategy=rows[:, 0], wait_for_most_profit_upgrades=rows[:, 1].astype(bool),
+                          min_taps_for_clicker_in_percent=rows[:, 2], min_balance=rows[:, 3])
+
+    def __len__(self):
+        return len(self.balance_strategy)
+
+
+@dataclass
+class Result:
+    parameters: Parameters
+    coins_per_hour: np.ndarray
+    requests_per_hour: np.ndarray
+    wakes_per_hour: np.ndarray
+    earn_per_hour: np.ndarray
+    purchases: np.ndarray
+
+
+def simulate(catalog: Catalog, player: Player, parameters: Parameters, days: float = 1, tick: float = 60,
+             max_purchases_per_wake: int = 20) -> Result:
+    n, m = len(parameters), len(catalog.price)
+
+    balance = np.full(n, player.balance, dtype=float)
+    earn_per_hour = np.full(n, player.earn_per_hour, dtype=float)
+    energy = np.full(n, player.max_energy, dtype=float)
+    price = np.tile(catalog.price, (n, 1))
+    profit = np.tile(catalog.profit, (n, 1))
+    levels_left = np.tile(catalog.max_level, (n, 1)).astype(float)
+    cooldown_until = np.zeros((n, m))
+
+    next_wake = np.zeros(n)
+    income = np.zeros(n)
+    requests = np.zeros(n)
+    wakes = np.zeros(n)
+    purchases = np.zeros(n)
+
+    # Balance kept back by Tapper.get_spending_balance, min_balance is modelled as an extra reserve
+    reserve_hours = parameters.balance_strategy
+    taps_threshold = player.max_energy * parameters.min_taps_for_clicker_in_percent / 100
+
+    duration = days * 86400
+    for now in np.arange(0, duration, tick):
+        passive = earn_per_hour / 3600 * tick
+        balance += passive
+        income += passive
+        energy = np.minimum(energy + player.energy_recover_per_sec * tick, player.max_energy)
+
+        # Tap lane wakes as soon as the energy threshold is reached and spends all of it
+        tapping = energy >= taps_threshold
+        balance[tapping] += energy[tapping]
+        income[tapping] += energy[tapping]
+        energy[tapping] = 0
+        requests[tapping] += 1
+        wakes[tapping] += 1
+
+        awake = np.nonzero(next_wake <= now)[0]
+        if len(awake) == 0:
+            continue
+        requests[awake] += REQUESTS_PER_CYCLE
+        wakes[awake] += 1
+        sleep = np.full(len(awake), player.max_sleep_time)
+
+        active = awake
+        for _ in range(max_purchases_per_wake):
+            spending = balance[active] - earn_per_hour[active] * reserve_hours[active] - parameters.min_balance[active]
+            cooldown = np.maximum(cooldown_until[active] - now, 0)
+            eph = np.maximum(earn_per_hour[active], 1)[:, None]
+
+            # Same score as SignificanceStrategy, lower is better
+            score = price[active] / profit[active] + cooldown / 3600 \
+                + np.maximum((price[active] - spending[:, None]) / eph, 0)
+            score[levels_left[active] <= 0] = np.inf
+            filtered = ~parameters.wait_for_most_profit_upgrades[active]
+            score[filtered] = np.where((spending[filtered, None] > price[active][filtered]) & (cooldown[filtered] == 0),
+                                       score[filtered], np.inf)
+
+            best = np.argmin(score, axis=1)
+            best_price = price[active, best]
+            valid = np.isfinite(score[np.arange(len(active)), best])
+            affordable = best_price <= spending
+            ready = cooldown[np.arange(len(active)), best] == 0
+            buy = valid & affordable & ready
+
+            # Remember why the rest of the profiles go to sleep
+            waiting = valid & ~buy
+            money_wait = np.where(affordable, 0, (best_price - spending) / (eph[:, 0] / 3600))
+            cooldown_wait = cooldown[np.arange(len(active)), best]
+            position = np.searchsorted(awake, active[waiting])
+            sleep[position] = np.minimum(sleep[position], np.maximum(money_wait, cooldown_wait)[waiting])
+
+            if not buy.any():
+                break
+
+            buyers, items = active[buy], best[buy]
+            balance[buyers] -= price[buyers, items]
+            earn_per_hour[buyers] += profit[buyers, items]
+            price[buyers, items] *= catalog.price_growth
+            profit[buyers, items] *= catalog.profit_growth
+            levels_left[buyers, items] -= 1
+            cooldown_until[buyers, items] = now + catalog.cooldown[items]
+            requests[buyers] += 1
+            purchases[buyers] += 1
+            active = buyers
+
+        next_wake[awake] = now + np.clip(sleep, MIN_SLEEP, player.max_sleep_time)
+
+    hours = duration / 3600
+    return Result(parameters=parameters, coins_per_hour=income / hours, requests_per_hour=requests / hours,
+                  wakes_per_hour=wakes / hours, earn_per_hour=earn_per_hour, purchases=purchases)
+
+
+def format_result(result: Result, top: int) -> str:
+    p = result.parameters
+    lines = [f"{'#':>5} {'STRATEGY':>8} {'WAIT':>5} {'TAPS%':>5} {'MIN_BALANCE':>12} "
+             f"{'COINS/H':>14} {'REQ/H':>7} {'WAKES/H':>7} {'EARN/H':>12} {'BUYS':>6}"]
+    for i in np.argsort(-result.coins_per_hour)[:top]:
+        lines.append(f"{i:>5} {p.balance_strategy[i]:>8.0f} {p.wait_for_most_profit_upgrades[i]!s:>5} "
+                     f"{p.min_taps_for_clicker_in_percent[i]:>5.0f} {p.min_balance[i]:>12,.0f} "
+                     f"{result.coins_per_hour[i]:>14,.0f} {result.requests_per_hour[i]:>7.1f} "
+                     f"{result.wakes_per_hour[i]:>7.2f} {result.earn_per_hour[i]:>12,.0f} {result.purchases[i]:>6.0f}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate Tapper settings over the game economy')
+    parser.add_argument('--days', type=float, default=1)
+    parser.add_argument('--tick', type=float, default=60, help='Simulation step in seconds')
+    parser.add_argument('--catalog', type=Path, help='Recorded upgrades-for-buy response, synthetic if omitted')
+    parser.add_argument('--upgrades', type=int, default=100, help='Size of the synthetic catalog')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--balance-strategy', type=int, nargs='+', default=[0, 2, 5, 10, 20])
+    parser.add_argument('--wait', type=int, nargs='+', default=[0, 1], help='wait_for_most_profit_upgrades')
+    parser.add_argument('--min-taps', type=int, nargs='+', default=[20, 50, 80, 100])
+    parser.add_argument('--min-balance', type=int, nargs='+', default=[0, 1_000_000])
+    parser.add_argument('--balance', type=float, default=1_000_000)
+    parser.add_argument('--earn-per-hour', type=float, default=10_000)
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    catalog = Catalog.from_file(args.catalog) if args.catalog else Catalog.synthetic(args.upgrades, rng)
+    parameters = Parameters.grid(args.balance_strategy, args.wait, args.min_taps, args.min_balance)
+    result = simulate(catalog, Player(balance=args.balance, earn_per_hour=args.earn_per_hour), parameters,
+                      days=args.days, tick=args.tick)
+
+    print(f"{len(parameters)} configurations, {len(catalog.price)} upgrades, {args.days} days")
+    print(format_result(result, top=args.top))
+
+
+if __name__ == '__main__':
+    main()
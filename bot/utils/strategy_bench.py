@@ -0,0 +1,202 @@
+"""Compares upgrade strategies on the same catalog.
+
+    python -m bot.utils.strategy_bench --hours 72
+    python -m bot.utils.strategy_bench --catalog upgrades-for-buy.json --strategies significance lookahead
+    python -m bot.utils.strategy_bench --schedulers lanes agenda --merge-window 300
+"""
+import argparse
+import copy
+import json
+import random
+from dataclasses import dataclass
+from pathlib import Path
+from time import thread_time
+
+from bot.config import settings
+from bot.core.agenda import Agenda
+from bot.core.entities import Upgrade, User, Sleep, SleepReason
+from bot.core.strategies import STRATEGIES, get_strategy
+from bot.utils.profile import Profile
+
+MIN_SLEEP = 40
+REQUESTS_PER_SYNC = 6
+MAX_ENERGY = 5000
+ENERGY_RECOVER_PER_SEC = 3
+TAPS_THRESHOLD = 0.8
+PRICE_GROWTH = 1.18
+PROFIT_GROWTH = 1.07
+
+
+@dataclass
+class BenchResult:
+    strategy: str
+    scheduler: str
+    coins_gained: float
+    earn_per_hour: float
+    purchases: int
+    wakeups: int
+    requests: int
+    decisions: int
+    decision_seconds: float
+
+
+def synthetic_catalog(size: int, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+    catalog = []
+    for index in range(size):
+        price = rng.lognormvariate(9, 1.5)
+        catalog.append({
+            'id': f"upgrade_{index}", 'name': f"Upgrade {index}", 'level': 1, 'price': price,
+            'profitPerHourDelta': price / rng.uniform(5, 60), 'isAvailable': True, 'isExpired': False,
+            'cooldownSeconds': 0, 'maxLevel': 50,
+            'totalCooldownSeconds': rng.choice([600, 3600, 14400]) if rng.random() < 0.2 else 0,
+        })
+    return catalog
+
+
+def load_catalog(path: Path) -> list[dict]:
+    data = json.loads(path.read_text())
+    return data.get('upgradesForBuy', data) if isinstance(data, dict) else data
+
+
+def buy_upgrades(strategy, upgrades: list[Upgrade], user: User, profile: Profile, total_cooldowns: dict,
+                 result: 'BenchResult', now: float) -> Sleep | None:
+    while True:
+        # CPU time of the thread, so a preempted or descheduled process doesn't inflate the decision cost
+        started = thread_time()
+        upgrade = strategy.choose(upgrades, user, profile)
+        sleep = strategy.sleep_decision(upgrade, user, profile, now=now) if upgrade else None
+        result.decision_seconds += thread_time() - started
+        result.decisions += 1
+
+        if upgrade is None or sleep is not None:
+            return sleep
+
+        user.balance -= upgrade.price
+        user.earn_per_hour += upgrade.earn_per_hour
+        user.earn_per_sec = user.earn_per_hour / 3600
+        upgrade.level += 1
+        upgrade.price *= PRICE_GROWTH
+        upgrade.earn_per_hour *= PROFIT_GROWTH
+        upgrade.cooldown_seconds = total_cooldowns[upgrade.id]
+        result.purchases += 1
+        result.requests += 1
+
+
+def tap(user: User, result: 'BenchResult') -> float:
+    # The whole energy is spent once it reaches the threshold, one coin per tap
+    result.requests += 1
+    taps = 0
+    if user.available_energy >= user.max_energy * TAPS_THRESHOLD:
+        taps = user.available_energy
+        user.balance += taps
+        result.coins_gained += taps
+        user.available_energy = 0
+    return taps
+
+
+def taps_delay(user: User, taps: float) -> float:
+    # As Tapper.schedule_energy_recover, the next taps also wait until the sent ones could have been tapped
+    return max(min(max(user.max_energy * TAPS_THRESHOLD - user.available_energy, 0) / user.energy_recover_per_sec,
+                   settings.MAX_SLEEP_TIME), taps / 6, MIN_SLEEP)
+
+
+def run_strategy(name: str, catalog: list[dict], hours: float, balance: float, earn_per_hour: float,
+                 scheduler: str = 'agenda', merge_window: float = 120) -> BenchResult:
+    strategy = get_strategy(name)
+    profile = Profile.model_validate({'name': 'bench', 'upgrade_strategy': name}, context={'rewrite': False})
+    upgrades = [Upgrade(data=data) for data in copy.deepcopy(catalog)]
+    total_cooldowns = {data['id']: data.get('totalCooldownSeconds', 0) for data in catalog}
+    user = User(data={'balanceCoins': balance, 'earnPassivePerHour': earn_per_hour,
+                      'earnPassivePerSec': earn_per_hour / 3600, 'availableTaps': MAX_ENERGY, 'maxTaps': MAX_ENERGY,
+                      'tapsRecoverPerSec': ENERGY_RECOVER_PER_SEC})
+
+    result = BenchResult(strategy=name, scheduler=scheduler, coins_gained=0, earn_per_hour=0, purchases=0,
+                         wakeups=0, requests=0, decisions=0, decision_seconds=0)
+    now, horizon = 0.0, hours * 3600
+
+    def advance(until: float):
+        elapsed = until - now
+        user.balance += user.earn_per_sec * elapsed
+        result.coins_gained += user.earn_per_sec * elapsed
+        user.available_energy = min(user.available_energy + user.energy_recover_per_sec * elapsed, user.max_energy)
+        for upgrade in upgrades:
+            upgrade.cooldown_seconds = max(upgrade.cooldown_seconds - elapsed, 0)
+
+    if scheduler == 'lanes':
+        # Previous behaviour: a main lane waking into a full cycle at the smallest upgrade delay
+        # and a separate tap lane
+        main_wake, tap_wake = 0.0, 0.0
+        while now < horizon:
+            wake = min(main_wake, tap_wake, horizon)
+            advance(wake)
+            now = wake
+            if now >= horizon:
+                break
+            result.wakeups += 1
+            if main_wake <= now:
+                result.requests += REQUESTS_PER_SYNC
+                sleep = buy_upgrades(strategy, upgrades, user, profile, total_cooldowns, result, now)
+                main_wake = now + min(max(sleep.delay if sleep else 3600, MIN_SLEEP), settings.MAX_SLEEP_TIME)
+            if tap_wake <= now:
+                tap_wake = now + taps_delay(user, tap(user, result))
+    else:
+        agenda = Agenda(merge_window=merge_window)
+        agenda.add(SleepReason.WAIT_SYNC, delay=0, now=now)
+        while now < horizon:
+            wake = min(agenda.next_wake(), horizon)
+            advance(wake)
+            now = wake
+            if now >= horizon:
+                break
+            result.wakeups += 1
+            due = agenda.pop_due(now)
+            synced = SleepReason.WAIT_SYNC in due
+            if synced:
+                result.requests += REQUESTS_PER_SYNC
+                agenda.add(SleepReason.WAIT_SYNC, delay=3600, now=now)
+            if synced or SleepReason.WAIT_UPGRADE_MONEY in due or SleepReason.WAIT_UPGRADE_COOLDOWN in due:
+                # Catalog refresh unless it was just fetched by the sync
+                result.requests += 0 if synced else 1
+                agenda.discard(SleepReason.WAIT_UPGRADE_MONEY)
+                agenda.discard(SleepReason.WAIT_UPGRADE_COOLDOWN)
+                sleep = buy_upgrades(strategy, upgrades, user, profile, total_cooldowns, result, now)
+                if sleep is not None:
+                    agenda.add(sleep.sleep_reason, delay=max(sleep.delay, MIN_SLEEP), now=now)
+            if synced or SleepReason.WAIT_ENERGY_RECOVER in due:
+                # Sent in the same wake, as Tapper.tap does
+                agenda.add(SleepReason.WAIT_ENERGY_RECOVER, delay=taps_delay(user, tap(user, result)), now=now)
+
+    result.earn_per_hour = user.earn_per_hour
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare upgrade strategies on the same catalog')
+    parser.add_argument('--strategies', nargs='+', default=list(STRATEGIES), choices=list(STRATEGIES))
+    parser.add_argument('--catalog', type=Path, help='Recorded upgrades-for-buy response, synthetic if omitted')
+    parser.add_argument('--upgrades', type=int, default=100, help='Size of the synthetic catalog')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--hours', type=float, default=72)
+    parser.add_argument('--balance', type=float, default=1_000_000)
+    parser.add_argument('--earn-per-hour', type=float, default=10_000)
+    parser.add_argument('--schedulers', nargs='+', default=['agenda'], choices=['lanes', 'agenda'])
+    parser.add_argument('--merge-window', type=float, default=settings.AGENDA_MERGE_WINDOW)
+    args = parser.parse_args()
+
+    catalog = load_catalog(args.catalog) if args.catalog else synthetic_catalog(args.upgrades, args.seed)
+
+    print(f"{'STRATEGY':<14} {'SCHEDULER':<9} {'COINS GAINED':>16} {'EARN/H':>12} {'BUYS':>6} {'WAKES/H':>8} "
+          f"{'REQ/H':>7} {'US/DECISION':>12}")
+    for name in args.strategies:
+        for scheduler in args.schedulers:
+            result = run_strategy(name, catalog, hours=args.hours, balance=args.balance,
+                                  earn_per_hour=args.earn_per_hour, scheduler=scheduler, merge_window=args.merge_window)
+            print(f"{result.strategy:<14} {result.scheduler:<9} {result.coins_gained:>16,.0f} "
+                  f"{result.earn_per_hour:>12,.0f} {result.purchases:>6} {result.wakeups / args.hours:>8.2f} "
+                  f"{result.requests / args.hours:>7.1f} "
+                  f"{result.decision_seconds / max(result.decisions, 1) * 1e6:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
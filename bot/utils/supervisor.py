@@ -0,0 +1,84 @@
+import asyncio
+import random
+from contextlib import suppress
+from dataclasses import dataclass
+from typing import Callable, Coroutine
+
+from bot.utils import logger
+from bot.utils.clock import Clock, clock as system_clock
+from bot.utils.fleet import FleetState
+
+
+@dataclass
+class RestartPolicy:
+    backoff_base: float = 10
+    backoff_max: float = 900
+    # Crashes in a row before the profile is quarantined
+    max_crashes: int = 5
+    quarantine: float = 21600
+    # A run lasting this long resets the crashes in a row
+    stable_after: float = 3600
+
+    def backoff(self, crashes_in_row: int) -> float:
+        delay = min(self.backoff_base * 2 ** (crashes_in_row - 1), self.backoff_max)
+        return delay * random.uniform(0.8, 1.2)
+
+
+class Supervisor:
+    # Owns the profile tasks. A profile that crashes is restarted with backoff and quarantined after
+    # too many crashes in a row, so one bad profile can't take the rest of the fleet down with it
+    def __init__(self, fleet: FleetState, policy: RestartPolicy, clock: Clock = system_clock):
+        self.fleet = fleet
+        self.policy = policy
+        self.clock = clock
+        self.tasks: dict[str, asyncio.Task] = {}
+
+    def start(self, name: str, factory: Callable[[], Coroutine]):
+        self.tasks[name] = asyncio.create_task(self.supervise(name, factory), name=f"profile-{name}")
+
+    async def stop(self, name: str):
+        task = self.tasks.pop(name, None)
+        if task is None:
+            return
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+        self.fleet.get(name).supervisor_state = 'stopped'
+
+    async def close(self):
+        for name in list(self.tasks):
+            await self.stop(name)
+
+    async def wait(self):
+        await asyncio.gather(*self.tasks.values())
+
+    async def supervise(self, name: str, factory: Callable[[], Coroutine]):
+        status = self.fleet.get(name)
+        crashes_in_row = 0
+        while True:
+            status.supervisor_state = 'running'
+            started = self.clock.time()
+            try:
+                await factory()
+                status.supervisor_state = 'finished'
+                return
+            except Exception as error:  # pylint: disable=W0718
+                status.crashes += 1
+                crashes_in_row = 1 if self.clock.time() - started >= self.policy.stable_after else crashes_in_row + 1
+                status.error = f"crashed: {type(error).__name__}"
+                logger.opt(exception=error).error(f"[{name}] Crashed ({crashes_in_row} in a row, "
+                                                  f"{status.crashes} total): {error}")
+
+            if crashes_in_row >= self.policy.max_crashes:
+                status.supervisor_state = 'quarantined'
+                status.error = f"quarantined after {crashes_in_row} crashes"
+                logger.error(f"[{name}] Quarantined for {int(self.policy.quarantine)}s after "
+                             f"{crashes_in_row} crashes in a row")
+                await self.clock.sleep(self.policy.quarantine)
+                crashes_in_row = 0
+                continue
+
+            delay = self.policy.backoff(crashes_in_row)
+            status.supervisor_state = 'backoff'
+            logger.info(f"[{name}] Restarting in {int(delay)}s")
+            await self.clock.sleep(delay)
@@ -0,0 +1,188 @@
+"""Tracing spans of every wake, written as OTLP JSON lines.
+
+A wake of a profile is one trace: a cycle span, a span per phase and a span per request. Spans are
+kept in memory until the cycle ends, then the trace is written if it was sampled, failed or was
+slower than slow_cycle. Every line is an ExportTraceServiceRequest, the format of the OpenTelemetry
+file exporter, so the collector's otlpjsonfile receiver can load the file into Jaeger or Tempo.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from bot.utils import logger
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_ERROR = 2
+
+
+@dataclass
+class Trace:
+    profile: str
+    trace_id: str = field(default_factory=lambda: os.urandom(16).hex())
+    spans: list['Span'] = field(default_factory=list)
+    failed: bool = False
+
+
+@dataclass
+class Span:
+    trace: Trace
+    name: str
+    parent: 'Span | None' = None
+    kind: int = SPAN_KIND_INTERNAL
+    attributes: dict = field(default_factory=dict)
+    span_id: str = field(default_factory=lambda: os.urandom(8).hex())
+    start: int = field(default_factory=time.time_ns)
+    end: int = 0
+    error: str | None = None
+
+    def __post_init__(self):
+        self.attributes['profile'] = self.trace.profile
+        self.trace.spans.append(self)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def fail(self, message: str):
+        self.error = message
+        self.trace.failed = True
+
+    def to_otlp(self) -> dict:
+        span = {'traceId': self.trace.trace_id, 'spanId': self.span_id, 'name': self.name, 'kind': self.kind,
+                'startTimeUnixNano': str(self.start), 'endTimeUnixNano': str(self.end),
+                'attributes': [{'key': key, 'value': otlp_value(value)} for key, value in self.attributes.items()]}
+        if self.parent is not None:
+            span['parentSpanId'] = self.parent.span_id
+        if self.error is not None:
+            span['status'] = {'code': STATUS_ERROR, 'message': self.error}
+        return span
+
+
+def otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+current_span: ContextVar[Span | None] = ContextVar('current_span', default=None)
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.output: Path | None = None
+        self.sample_rate = 0.0
+        self.slow_cycle = 0.0
+        self.pending: list[str] = []
+        self.batch_size = 50
+        self.lock = asyncio.Lock()
+        self.flush_task: asyncio.Task | None = None
+        # Batch flushes in flight, referenced until they finish so they can't be garbage collected
+        self.flushes: set[asyncio.Task] = set()
+
+    def start(self, output: Path, sample_rate: float, slow_cycle: float, flush_interval: float = 30):
+        self.enabled = True
+        self.output = output
+        self.sample_rate = sample_rate
+        self.slow_cycle = slow_cycle
+        self.flush_task = asyncio.create_task(self.run(flush_interval))
+        logger.info(f"Tracing {sample_rate:.0%} of the cycles"
+                    + (f" and every cycle slower than {slow_cycle:g}s" if slow_cycle > 0 else "")
+                    + f" to {output}")
+
+    @contextmanager
+    def activate(self, span: Span):
+        token = current_span.set(span)
+        try:
+            yield span
+        except BaseException as error:
+            span.fail(f"{type(error).__name__}: {error}")
+            raise
+        finally:
+            span.end = time.time_ns()
+            current_span.reset(token)
+
+    @contextmanager
+    def cycle(self, profile: str, **attributes):
+        # Root span of a wake, yields None when tracing is off
+        if not self.enabled:
+            yield None
+            return
+        span = Span(trace=Trace(profile=profile), name='cycle', attributes=attributes)
+        try:
+            with self.activate(span):
+                yield span
+        finally:
+            self.finish(span.trace, root=span)
+
+    @contextmanager
+    def span(self, name: str, kind: int = SPAN_KIND_INTERNAL, **attributes):
+        # Child of the current span, nothing is recorded outside of a traced cycle
+        parent = current_span.get()
+        if parent is None:
+            yield None
+            return
+        with self.activate(Span(trace=parent.trace, name=name, parent=parent, kind=kind,
+                                attributes=attributes)) as span:
+            yield span
+
+    def add_sleep(self, delay: float):
+        # Deliberate sleeps are added to the current span and all of its parents
+        span = current_span.get()
+        while span is not None:
+            span.attributes['sleep.seconds'] = span.attributes.get('sleep.seconds', 0.0) + delay
+            span = span.parent
+
+    def finish(self, trace: Trace, root: Span):
+        duration = (root.end - root.start) / 1e9
+        if not (trace.failed or random.random() < self.sample_rate
+                or (self.slow_cycle > 0 and duration >= self.slow_cycle)):
+            return
+        request = {'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': 'hamster-kombat-bot'}}]},
+            'scopeSpans': [{'scope': {'name': 'bot.utils.tracing'}, 'spans': [span.to_otlp() for span in trace.spans]}],
+        }]}
+        self.pending.append(json.dumps(request, separators=(',', ':')))
+        if len(self.pending) >= self.batch_size:
+            task = asyncio.create_task(self.flush())
+            self.flushes.add(task)
+            task.add_done_callback(self.flushes.discard)
+
+    def write(self, lines: list[str]):
+        with self.output.open('a', encoding='utf-8') as file:
+            file.write("\n".join(lines) + "\n")
+
+    async def flush(self):
+        async with self.lock:
+            lines, self.pending = self.pending, []
+            if not lines:
+                return
+            try:
+                await asyncio.to_thread(self.write, lines)
+            except OSError as error:
+                logger.error(f"Failed to write {len(lines)} traces: {error}")
+
+    async def run(self, flush_interval: float):
+        while True:
+            await asyncio.sleep(flush_interval)
+            await self.flush()
+
+    async def close(self):
+        if not self.enabled:
+            return
+        self.flush_task.cancel()
+        await self.flush()
+        self.enabled = False
+
+
+tracer = Tracer()
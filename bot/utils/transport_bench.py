@@ -0,0 +1,67 @@
+"""Compares WebClient transports by throughput and number of opened connections.
+
+    python -m bot.utils.transport_bench --url https://localhost:8443/clicker/sync --profiles 200 --requests 5
+
+Every simulated profile gets its transport the same way run_tapper does, so the aiohttp transport opens
+its own session per profile while the http2 one is shared by all of them.
+"""
+import argparse
+import asyncio
+from time import perf_counter
+
+from bot.core.transport import AiohttpTransport, Http2Transport, StubTransport, Transport, RequestTimeout
+
+
+def create(name: str) -> Transport:
+    if name == Http2Transport.name:
+        return Http2Transport.acquire()
+    if name == StubTransport.name:
+        return StubTransport(handler=lambda url, json: (200, {}))
+    return AiohttpTransport()
+
+
+async def run_profile(transport: Transport, url: str, requests: int, timeout: RequestTimeout):
+    for _ in range(requests):
+        response = await transport.post(url=url, headers={}, json={}, timeout=timeout)
+        response.raise_for_status()
+
+
+async def bench(name: str, url: str, profiles: int, requests: int, timeout: float):
+    try:
+        transports = [create(name) for _ in range(profiles)]
+    except RuntimeError as error:
+        print(f"{name:<8} skipped: {error}")
+        return
+
+    started = perf_counter()
+    request_timeout = RequestTimeout(connect=timeout, read=timeout, total=timeout)
+    results = await asyncio.gather(*(run_profile(transport, url, requests, request_timeout)
+                                     for transport in transports), return_exceptions=True)
+    elapsed = perf_counter() - started
+
+    errors = sum(1 for result in results if isinstance(result, BaseException))
+    connections = sum(transport.connections for transport in {id(t): t for t in transports}.values())
+    for transport in transports:
+        await transport.close()
+
+    total = (profiles - errors) * requests
+    print(f"{name:<8} {total / elapsed:>10.1f} {connections:>12} {errors:>8} {elapsed:>9.2f}s")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Compare WebClient transports')
+    parser.add_argument('--url', required=True)
+    parser.add_argument('--transports', nargs='+', default=['aiohttp', 'http2', 'stub'],
+                        choices=['aiohttp', 'http2', 'stub'])
+    parser.add_argument('--profiles', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=5, help='Sequential requests per profile')
+    parser.add_argument('--timeout', type=float, default=30)
+    args = parser.parse_args()
+
+    print(f"{'TRANSPORT':<8} {'REQ/S':>10} {'CONNECTIONS':>12} {'ERRORS':>8} {'TIME':>10}")
+    for name in args.transports:
+        await bench(name, args.url, args.profiles, args.requests, args.timeout)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,13 +1,14 @@
 import asyncio
+import sys
 from contextlib import suppress
 
 from bot.utils.launcher import process
 
 
-async def main():
-    await process()
+async def main() -> int | None:
+    return await process()
 
 
 if __name__ == '__main__':
     with suppress(KeyboardInterrupt):
-        asyncio.run(main())
+        sys.exit(asyncio.run(main()))
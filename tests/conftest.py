@@ -0,0 +1,171 @@
+import asyncio
+import base64
+import os
+import sys
+import tempfile
+from contextlib import suppress
+from pathlib import Path
+
+import pytest
+
+# Settings are read when bot is imported, so the test environment is set up before any bot import
+sys.path.insert(0, str(Path(__file__).parents[1]))
+os.environ.update(API_ID='1', API_HASH='test', PROFILE_DIR=tempfile.mkdtemp(prefix='profiles-'),
+                  HISTORY_ENABLED='false', TRACING='false', REQUEST_RATE='0',
+                  AGENDA_MERGE_WINDOW='120', CYCLE_RETRY_DELAY='60', SLEEP_INTERVAL_BEFORE_UPGRADE='[7, 30]')
+
+from bot.core.tapper import Tapper  # noqa: E402
+from bot.core.transport import StubTransport  # noqa: E402
+from bot.core.web_client import WebClient  # noqa: E402
+from bot.utils.clock import VirtualClock  # noqa: E402
+from bot.utils.profile import Profile  # noqa: E402
+
+START = 1_700_000_000
+
+
+def encode_cipher(word: str) -> str:
+    # The server inserts a random character after the third one of the base64 word
+    encoded = base64.b64encode(word.encode()).decode()
+    return f"{encoded[:3]}x{encoded[3:]}"
+
+
+class FakeGame:
+    # Server state of one account. Energy and coins grow with the virtual clock, every request is logged
+    # as (time, path, body) and the next request to a path in `fail` answers with its status or raises it
+    def __init__(self, clock: VirtualClock, energy: float = 1000, max_energy: int = 1000, balance: float = 1e6):
+        self.clock = clock
+        self.user = {'id': 1, 'balanceCoins': balance, 'earnPassivePerHour': 3600, 'earnPassivePerSec': 1,
+                     'availableTaps': energy, 'maxTaps': max_energy, 'earnPerTap': 1, 'tapsRecoverPerSec': 3,
+                     'exchangeId': 'bybit', 'lastPassiveEarn': 0, 'boosts': []}
+        self.updated_at = clock.time()
+        self.upgrades: dict[str, dict] = {}
+        self.boosts: list[dict] = []
+        self.tasks: list[dict] = []
+        self.cipher: dict | None = None
+        self.combo = {'bonusCoins': 5_000_000, 'upgradeIds': [], 'isClaimed': True, 'remainSeconds': 40000}
+        self.combo_cards: list[str] = []
+        self.log: list[tuple[float, str, dict | None]] = []
+        self.fail: dict[str, int | Exception] = {}
+
+    def add_upgrade(self, upgrade_id: str, price: float, profit: float = 100, cooldown: float = 0, **fields):
+        self.upgrades[upgrade_id] = {'id': upgrade_id, 'name': upgrade_id, 'level': 1, 'price': price,
+                                     'profitPerHourDelta': profit, 'isAvailable': True, 'isExpired': False,
+                                     'readyAt': self.clock.time() + cooldown, **fields}
+
+    def requests(self, path: str) -> list[tuple[float, dict | None]]:
+        return [(time, body) for time, logged_path, body in self.log if logged_path == path]
+
+    def clicker_user(self) -> dict:
+        now = self.clock.time()
+        elapsed, self.updated_at = now - self.updated_at, now
+        self.user['availableTaps'] = min(self.user['availableTaps'] + self.user['tapsRecoverPerSec'] * elapsed,
+                                         self.user['maxTaps'])
+        self.user['balanceCoins'] += self.user['earnPassivePerSec'] * elapsed
+        return {'clickerUser': dict(self.user)}
+
+    def catalog(self) -> dict:
+        now = self.clock.time()
+        upgrades = [{**upgrade, 'cooldownSeconds': max(int(upgrade['readyAt'] - now), 0)}
+                    for upgrade in self.upgrades.values()]
+        return {'upgradesForBuy': upgrades, 'dailyCombo': dict(self.combo, upgradeIds=list(self.combo['upgradeIds']))}
+
+    def handler(self, url: str, body: dict | None) -> tuple[int, dict]:
+        path = url.rsplit('/', 1)[-1]
+        self.log.append((self.clock.time(), path, body))
+        if path in self.fail:
+            failure = self.fail.pop(path)
+            if isinstance(failure, Exception):
+                raise failure
+            return failure, {}
+
+        if path == 'config':
+            return 200, {'dailyCipher': self.cipher} if self.cipher else {}
+        if path == 'upgrades-for-buy':
+            return 200, self.catalog()
+        if path == 'boosts-for-buy':
+            return 200, {'boostsForBuy': self.boosts}
+        if path == 'list-tasks':
+            return 200, {'tasks': self.tasks}
+        if path == 'check-task':
+            return 200, {'task': {'isCompleted': False}}
+        if path == 'tap':
+            self.clicker_user()
+            self.user['availableTaps'] = 0
+            self.user['balanceCoins'] += body['count'] * self.user['earnPerTap']
+        elif path == 'buy-boost':
+            self.clicker_user()
+            self.user['availableTaps'] = self.user['maxTaps']
+            self.user['boosts'] = [{'id': body['boostId'], 'lastUpgradeAt': self.clock.time()}]
+        elif path == 'buy-upgrade':
+            upgrade = self.upgrades[body['upgradeId']]
+            self.clicker_user()
+            self.user['balanceCoins'] -= upgrade['price']
+            self.user['earnPassivePerHour'] += upgrade['profitPerHourDelta']
+            upgrade['level'] += 1
+            upgrade['price'] *= 2
+            if upgrade['id'] in self.combo_cards and upgrade['id'] not in self.combo['upgradeIds']:
+                self.combo['upgradeIds'].append(upgrade['id'])
+            return 200, {**self.clicker_user(), **self.catalog()}
+        elif path == 'claim-daily-cipher':
+            self.clicker_user()
+            self.cipher['isClaimed'] = True
+            self.user['balanceCoins'] += self.cipher['bonusCoins']
+        elif path == 'claim-daily-combo':
+            self.clicker_user()
+            self.combo['isClaimed'] = True
+            self.user['balanceCoins'] += self.combo['bonusCoins']
+        return 200, self.clicker_user()
+
+    def transport(self) -> StubTransport:
+        return StubTransport(handler=self.handler)
+
+
+def make_tapper(game: FakeGame, **profile_fields) -> Tapper:
+    profile = Profile.model_validate({'name': 'test', 'token': 'token', **profile_fields}, context={'rewrite': False})
+    return Tapper(web_client=WebClient(transport=game.transport(), profile=profile), clock=game.clock)
+
+
+class Simulation:
+    # Runs a tapper on the virtual clock, the loop is kept between advance() calls so the state can be
+    # checked between them
+    def __init__(self, clock: VirtualClock):
+        self.clock = clock
+        self.runner = asyncio.Runner()
+        self.task: asyncio.Task | None = None
+
+    def start(self, tapper: Tapper):
+        async def start():
+            return asyncio.create_task(tapper.run())
+        self.task = self.runner.run(start())
+
+    def advance(self, seconds: float):
+        self.runner.run(self.clock.run_until(self.clock.time() + seconds))
+        if self.task.done():
+            self.task.result()
+
+    def close(self):
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+
+            async def wait():
+                with suppress(asyncio.CancelledError):
+                    await self.task
+            self.runner.run(wait())
+        self.runner.close()
+
+
+@pytest.fixture
+def clock() -> VirtualClock:
+    return VirtualClock(start=START)
+
+
+@pytest.fixture
+def simulation(clock: VirtualClock):
+    simulation = Simulation(clock)
+    yield simulation
+    simulation.close()
+
+
+@pytest.fixture
+def game(clock: VirtualClock) -> FakeGame:
+    return FakeGame(clock)
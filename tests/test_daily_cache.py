@@ -0,0 +1,51 @@
+from bot.core.daily_cache import DailyCache
+from bot.core.entities import Upgrade
+
+from conftest import START
+
+
+def upgrade(upgrade_id: str, price: float, available: bool = True, prerequisite: str | None = None) -> Upgrade:
+    condition = {'_type': 'ByUpgrade', 'upgradeId': prerequisite, 'level': 2} if prerequisite else None
+    return Upgrade(data={'id': upgrade_id, 'name': upgrade_id, 'level': 1, 'price': price, 'profitPerHourDelta': 10,
+                         'isAvailable': available, 'isExpired': False, 'condition': condition})
+
+
+def test_combo_plan_gives_the_unlock_chain_and_its_cost():
+    upgrades = {u.id: u for u in [upgrade('base', 100), upgrade('middle', 200, False, 'base'),
+                                  upgrade('card', 400, False, 'middle'), upgrade('open', 50),
+                                  upgrade('orphan', 10, False, 'missing')]}
+    plan = DailyCache().combo_plan(['card', 'open', 'orphan'], now=START)
+
+    unlock = plan.unlock_plan('card', upgrades)
+    assert [u.id for u in unlock.chain] == ['base', 'middle', 'card']
+    assert unlock.total_cost == 700
+    assert unlock.next_step.id == 'base'
+    assert plan.unlock_plan('open', upgrades).total_cost == 50
+    # The prerequisite isn't in the profile's catalog, so the card can't be unlocked
+    assert not plan.unlock_plan('orphan', upgrades).reachable
+    assert plan.unlock_plan('orphan', upgrades).next_step is None
+
+
+def test_cyclic_prerequisites_only_unlock_available_upgrades():
+    upgrades = {u.id: u for u in [upgrade('loop_a', 100, True, 'loop_b'), upgrade('loop_b', 100, False, 'loop_a'),
+                                  upgrade('after_loop', 100, False, 'loop_b')]}
+    graph = DailyCache().upgrade_graph(now=START)
+
+    assert graph.cyclic >= {'loop_a', 'loop_b', 'after_loop'}
+    assert [u.id for u in graph.unlock_plan('loop_a', upgrades).chain] == ['loop_a']
+    assert not graph.unlock_plan('loop_b', upgrades).reachable
+    assert not graph.unlock_plan('after_loop', upgrades).reachable
+
+
+def test_combo_plan_is_shared_until_the_catalog_changes():
+    cache = DailyCache()
+    upgrade('shared', 100)
+    first = cache.combo_plan(['shared'], now=START)
+    assert cache.combo_plan(['shared'], now=START + 60) is first
+    # Plans of other cards use the same graph
+    assert cache.combo_plan(['other'], now=START + 60).graph is first.graph
+
+    upgrade('shared', 100, prerequisite='other')
+    second = cache.combo_plan(['shared'], now=START + 120)
+    assert second is not first
+    assert second.graph is not first.graph
@@ -0,0 +1,60 @@
+import asyncio
+from time import time
+
+from bot.utils.leases import LeaseCoordinator, LeaseStore
+
+
+class MemoryLeaseStore(LeaseStore):
+    # Leases of a single node, renewals hang forever once `hang` is set
+    def __init__(self):
+        self.hang = False
+
+    async def heartbeat(self, node: str, ttl: float, now: float):
+        pass
+
+    async def live_nodes(self, now: float) -> list[str]:
+        return []
+
+    async def owners(self, profiles: list[str], now: float) -> dict[str, str]:
+        return {}
+
+    async def acquire(self, profiles: list[str], node: str, ttl: float, now: float) -> set[str]:
+        return set(profiles)
+
+    async def renew(self, profiles: set[str], node: str, ttl: float, now: float) -> set[str]:
+        if self.hang:
+            await asyncio.Future()
+        return profiles
+
+    async def release(self, profiles: set[str], node: str):
+        pass
+
+
+def test_profiles_stop_before_the_leases_expire_while_a_renewal_hangs():
+    stopped: dict[str, float] = {}
+
+    async def stop(name: str):
+        # Stops are slow, one after another they would outlast the leases
+        await asyncio.sleep(0.1)
+        stopped[name] = time()
+
+    async def main():
+        store = MemoryLeaseStore()
+        coordinator = LeaseCoordinator(store=store, node='node', ttl=0.6, start=lambda _: None, stop=stop)
+        for index in range(10):
+            coordinator.add(f"profile-{index}")
+        await coordinator.tick()
+        renewed_at = coordinator.renewed_at
+
+        store.hang = True
+        run = asyncio.create_task(coordinator.run())
+        await asyncio.sleep(0.5)
+        run.cancel()
+        await coordinator.close()
+        return renewed_at, coordinator.held
+
+    renewed_at, held = asyncio.run(main())
+    assert len(stopped) == 10
+    assert not held
+    # Stopped half a TTL after the renewal, together, long before the leases expire at renewed_at + 0.6
+    assert max(stopped.values()) < renewed_at + 0.45
@@ -0,0 +1,62 @@
+import asyncio
+
+from bot.core.priority import RequestBudget, action_value
+from bot.exceptions import RequestDeferred
+
+from conftest import START
+
+
+def request(budget: RequestBudget, label: str | None = None, value: float = 0):
+    async def acquire():
+        if label is None:
+            await budget.acquire()
+        else:
+            with action_value(label, value):
+                await budget.acquire()
+    return asyncio.create_task(acquire())
+
+
+def test_untagged_requests_wait_past_max_wait(clock):
+    budget = RequestBudget(rate=0.01, burst=1, max_wait=10, clock=clock)
+
+    async def main():
+        first = request(budget)
+        tagged = request(budget, 'upgrade', 100)
+        untagged = request(budget)
+        # Both wait 100s for the next token, the tagged one is deferred and the untagged one is sent
+        await clock.run_until(START + 100)
+        assert first.done() and first.exception() is None
+        assert isinstance(tagged.exception(), RequestDeferred)
+        assert untagged.done() and untagged.exception() is None
+
+    asyncio.run(main())
+
+
+def test_reloaded_settings_apply_to_the_budget(clock):
+    budget = RequestBudget(rate=0.01, burst=1, max_wait=1000, clock=clock)
+
+    async def main():
+        first, second = request(budget, 'taps', 10), request(budget, 'taps', 10)
+        await clock.run_until(START + 1)
+        assert first.done() and not second.done()
+
+        # Turning the budget off releases whatever waits for it
+        budget.configure(rate=0, burst=10, max_wait=1000)
+        await clock.run_until(START + 2)
+        assert second.done() and second.exception() is None
+        assert budget.burst == 10
+
+    asyncio.run(main())
+
+
+def test_dispatcher_stops_when_every_waiter_expired(clock):
+    budget = RequestBudget(rate=0.01, burst=1, max_wait=10, clock=clock)
+
+    async def main():
+        request(budget, 'taps', 10)
+        waiters = [request(budget, 'taps', 10), request(budget, 'upgrade', 100)]
+        await clock.run_until(START + 100)
+        assert all(isinstance(waiter.exception(), RequestDeferred) for waiter in waiters)
+        assert budget.dispatcher.done() and budget.dispatcher.exception() is None
+
+    asyncio.run(main())
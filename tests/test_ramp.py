@@ -0,0 +1,30 @@
+import asyncio
+
+import pytest
+
+from bot.core import tapper
+from bot.utils.profile import Profile
+from bot.utils.ramp import RampController
+
+
+def test_profile_failing_before_its_first_wake_leaves_the_boot_set(monkeypatch):
+    def create_transport(proxy):
+        raise RuntimeError("HTTP/2 transport requires httpx")
+
+    monkeypatch.setattr(tapper, 'create_transport', create_transport)
+    profile = Profile.model_validate({'name': 'broken', 'token': 'token'}, context={'rewrite': False})
+
+    async def main():
+        ramp = RampController(concurrency=1, rate=0)
+        ramp.start(request_counter=lambda: 0)
+        ramp.expect(profile.name, due=True)
+        ramp.finish_loading()
+        with pytest.raises(RuntimeError):
+            await tapper.run_tapper(profile=profile, proxy=None, ramp=ramp)
+        return ramp
+
+    ramp = asyncio.run(main())
+    assert not ramp.booting
+    assert ramp.failed == 1
+    # The boot report was logged and the monitor stopped
+    assert ramp.monitor_task is None
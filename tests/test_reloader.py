@@ -0,0 +1,31 @@
+import json
+
+from bot.config import settings
+from bot.utils.fleet import fleet
+from bot.utils.profile import Profile
+
+from conftest import FakeGame, make_tapper
+
+
+def test_profiles_only_save_the_fields_they_set():
+    profile = Profile(name='saved', token='token', balance_strategy=5)
+
+    data = json.loads(settings.PROFILE_DIR.joinpath('saved.json').read_text())
+    assert data == {'name': 'saved', 'token': 'token', 'balance_strategy': 5}
+    assert profile.min_taps_for_clicker_in_percent == settings.MIN_TAPS_FOR_CLICKER_IN_PERCENT
+
+
+def test_reloaded_settings_reach_running_profiles(clock, monkeypatch):
+    tapper = make_tapper(FakeGame(clock), balance_strategy=5)
+
+    monkeypatch.setattr(settings, 'MIN_TAPS_FOR_CLICKER_IN_PERCENT', 50)
+    monkeypatch.setattr(settings, 'BALANCE_STRATEGY', 20)
+    monkeypatch.setattr(settings, 'AGENDA_MERGE_WINDOW', 300)
+    monkeypatch.setattr(fleet, 'settings_version', fleet.settings_version + 1)
+    tapper.apply_config_changes()
+
+    assert tapper.profile.min_taps_for_clicker_in_percent == 50
+    assert tapper.web_client.profile is tapper.profile
+    # A value the profile sets itself wins over the settings
+    assert tapper.profile.balance_strategy == 5
+    assert tapper.agenda.merge_window == 300
@@ -0,0 +1,285 @@
+import asyncio
+from time import perf_counter
+
+import pytest
+
+from bot.config import settings
+from bot.core.entities import SleepReason
+from bot.core.transport import StubTransport
+from bot.exceptions import AuthUnavailable, TransportError
+from bot.utils.combo import Combo
+
+from conftest import START, FakeGame, encode_cipher, make_tapper
+
+
+def test_sync_sends_the_client_requests_in_order(simulation, game):
+    tapper = make_tapper(game, auto_upgrade=False, auto_clicker=False)
+    simulation.start(tapper)
+    simulation.advance(60)
+
+    assert [path for _, path, _ in game.log] == ['me-telegram', 'config', 'sync', 'upgrades-for-buy',
+                                                 'boosts-for-buy', 'list-tasks']
+    assert set(tapper.agenda.deadlines) == {SleepReason.WAIT_SYNC, SleepReason.WAIT_DAILY_RESET}
+    assert tapper.agenda.deadlines[SleepReason.WAIT_SYNC].wake_at == START + 3600
+
+
+def test_taps_are_sent_in_the_wake_that_finds_the_energy(simulation, game):
+    tapper = make_tapper(game, auto_upgrade=False, apply_daily_energy=False)
+    simulation.start(tapper)
+    simulation.advance(60)
+
+    [(first_time, first_body)] = game.requests('tap')
+    assert first_time == START
+    assert first_body['availableTaps'] == 1000
+    # 1-4% more taps are sent, like the official app does
+    assert 1010 <= first_body['count'] <= 1040
+    # The next taps wait until 80% of the energy is back at 3 per second, rounded up so it is there
+    assert tapper.agenda.deadlines[SleepReason.WAIT_ENERGY_RECOVER].wake_at == START + 267
+
+    simulation.advance(3540)
+    second_time, second_body = game.requests('tap')[1]
+    assert second_time >= first_time + 800 / 3
+    assert second_body['availableTaps'] >= 800
+
+
+def test_next_taps_wait_as_long_as_tapping_takes(simulation, game):
+    # 10% of the energy is back in 33s, tapping the 1000 taps just sent takes longer at 6 taps per second
+    tapper = make_tapper(game, auto_upgrade=False, apply_daily_energy=False, min_taps_for_clicker_in_percent=10)
+    simulation.start(tapper)
+    simulation.advance(30)
+
+    [(_, body)] = game.requests('tap')
+    assert tapper.agenda.deadlines[SleepReason.WAIT_ENERGY_RECOVER].wake_at == START + int(body['count'] / 6)
+
+
+def test_energy_boost_refills_energy_and_taps_it(simulation, clock):
+    game = FakeGame(clock, energy=0)
+    game.boosts = [{'id': 'BoostFullAvailableTaps', 'cooldownSeconds': 0, 'level': 1, 'maxLevel': 6}]
+    tapper = make_tapper(game, auto_upgrade=False)
+    simulation.start(tapper)
+    simulation.advance(60)
+
+    [(boost_time, boost_body)] = game.requests('buy-boost')
+    assert boost_body['boostId'] == 'BoostFullAvailableTaps'
+    [(tap_time, tap_body)] = game.requests('tap')
+    assert tap_time == boost_time
+    assert tap_body['availableTaps'] == 1000
+    assert tapper.agenda.deadlines[SleepReason.WAIT_ENERGY_RECOVER].wake_at == boost_time + 267
+    assert tapper.agenda.deadlines[SleepReason.WAIT_ENERGY_BOOST].wake_at == boost_time + 3600
+
+
+def test_upgrades_are_bought_until_money_runs_out(simulation, clock):
+    game = FakeGame(clock, balance=10_000)
+    game.add_upgrade('cheap', price=2000, profit=300)
+    tapper = make_tapper(game, auto_clicker=False, balance_strategy=0)
+    simulation.start(tapper)
+    simulation.advance(300)
+
+    # 2000 and 4000 are bought, 8000 is waited for at 1 coin per second
+    bought = game.requests('buy-upgrade')
+    assert [body['upgradeId'] for _, body in bought] == ['cheap', 'cheap']
+    assert game.upgrades['cheap']['level'] == 3
+    money = tapper.agenda.deadlines[SleepReason.WAIT_UPGRADE_MONEY]
+    assert money.wake_at == pytest.approx(START + 8000 - 4000, abs=5)
+
+
+def test_upgrade_on_cooldown_is_scheduled_after_it(simulation, game):
+    game.add_upgrade('slow', price=1000, cooldown=900)
+    tapper = make_tapper(game, auto_clicker=False, balance_strategy=0)
+    simulation.start(tapper)
+    simulation.advance(60)
+
+    assert not game.requests('buy-upgrade')
+    assert tapper.agenda.deadlines[SleepReason.WAIT_UPGRADE_COOLDOWN].wake_at == START + 900
+
+    simulation.advance(900)
+    bought_at, body = game.requests('buy-upgrade')[0]
+    assert body['upgradeId'] == 'slow'
+    assert bought_at >= START + 900
+
+
+def test_daily_cipher_is_decoded_and_claimed(simulation, game):
+    game.cipher = {'cipher': encode_cipher('HAMSTER'), 'bonusCoins': 1_000_000, 'isClaimed': False}
+    tapper = make_tapper(game, auto_upgrade=False, auto_clicker=False)
+    simulation.start(tapper)
+    simulation.advance(60)
+
+    [(_, body)] = game.requests('claim-daily-cipher')
+    assert body == {'cipher': 'HAMSTER'}
+    assert tapper.user.balance == pytest.approx(2e6, abs=100)
+
+
+def test_daily_combo_cards_are_bought_and_claimed(simulation, game, monkeypatch):
+    cards = ['card_a', 'card_b', 'card_c']
+    monkeypatch.setattr('bot.core.tapper.combo',
+                        Combo.model_validate({'combo': cards, 'expired': START + 86400}, context={'rewrite': False}))
+    for card in cards:
+        game.add_upgrade(card, price=1000, profit=0)
+    # card_c is locked behind another level of card_a
+    game.upgrades['card_c'].update(isAvailable=False,
+                                   condition={'_type': 'ByUpgrade', 'upgradeId': 'card_a', 'level': 3})
+    game.combo.update(isClaimed=False)
+    game.combo_cards = cards
+    tapper = make_tapper(game, auto_clicker=False)
+    simulation.start(tapper)
+    simulation.advance(300)
+
+    # The prerequisite of card_c is bought for it, the combo can't be claimed yet
+    assert [body['upgradeId'] for _, body in game.requests('buy-upgrade')] == ['card_a', 'card_b', 'card_a']
+    assert not game.requests('claim-daily-combo')
+
+    game.upgrades['card_c']['isAvailable'] = True
+    simulation.advance(3600)
+    assert game.requests('buy-upgrade')[-1][1]['upgradeId'] == 'card_c'
+    assert len(game.requests('claim-daily-combo')) == 1
+
+
+def test_server_error_syncs_again_in_an_hour(simulation, game):
+    game.fail['upgrades-for-buy'] = 500
+    tapper = make_tapper(game)
+    simulation.start(tapper)
+    simulation.advance(60)
+
+    assert tapper.status.error == 'http 500'
+    assert set(tapper.agenda.deadlines) == {SleepReason.WAIT_SYNC}
+    assert tapper.agenda.deadlines[SleepReason.WAIT_SYNC].wake_at == START + 3600
+    assert not game.requests('tap')
+
+    simulation.advance(3800)
+    assert [time for time, _ in game.requests('sync')] == [START, START + 3600]
+    assert tapper.status.error is None
+    assert game.requests('tap')
+
+
+def test_timed_out_request_retries_its_action(simulation, game):
+    game.fail['tap'] = TimeoutError()
+    tapper = make_tapper(game, auto_upgrade=False, apply_daily_energy=False)
+    simulation.start(tapper)
+    simulation.advance(30)
+
+    assert tapper.status.error == 'request timeout'
+    assert tapper.agenda.deadlines[SleepReason.WAIT_ENERGY_RECOVER].wake_at == START + 60
+
+    simulation.advance(60)
+    assert [time for time, _ in game.requests('tap')] == [START, START + 60]
+    assert tapper.status.error is None
+
+
+def test_cycle_budget_runs_out_on_the_tapper_clock(simulation, game, monkeypatch):
+    class SlowTapTransport(StubTransport):
+        async def post(self, url, headers, json, timeout):
+            if url.endswith('/tap'):
+                await game.clock.sleep(100)
+            return await super().post(url, headers, json, timeout)
+
+    monkeypatch.setattr(settings, 'CYCLE_BUDGET', 30)
+    tapper = make_tapper(game, auto_upgrade=False, apply_daily_energy=False)
+    tapper.web_client.transport = SlowTapTransport(handler=game.handler)
+    simulation.start(tapper)
+    simulation.advance(40)
+
+    assert tapper.status.error == 'cycle timeout'
+    assert tapper.agenda.deadlines[SleepReason.WAIT_ENERGY_RECOVER].wake_at == START + 30 + 60
+
+
+def test_failed_connection_retries_its_action(simulation, game):
+    game.fail['tap'] = TransportError(url='tap', reason="connection reset")
+    tapper = make_tapper(game, auto_upgrade=False, apply_daily_energy=False)
+    simulation.start(tapper)
+    simulation.advance(30)
+
+    assert tapper.status.error == 'connection error'
+    assert tapper.agenda.deadlines[SleepReason.WAIT_ENERGY_RECOVER].wake_at == START + 60
+
+    simulation.advance(60)
+    assert [time for time, _ in game.requests('tap')] == [START, START + 60]
+
+
+def test_unavailable_auth_retries_its_action_without_dropping_the_session(simulation, game):
+    class FloodedAuth:
+        async def refresh_token(self, profile, proxy):
+            raise AuthUnavailable(profile.name, "FloodWait for 90s", retry_after=90)
+
+    game.fail['tap'] = 401
+    tapper = make_tapper(game, auto_upgrade=False, apply_daily_energy=False)
+    tapper.web_client.auth_manager = FloodedAuth()
+    simulation.start(tapper)
+    simulation.advance(30)
+
+    assert tapper.status.error == 'auth unavailable'
+    assert tapper.agenda.deadlines[SleepReason.WAIT_ENERGY_RECOVER].wake_at == START + 90
+
+    simulation.advance(90)
+    assert [time for time, _ in game.requests('tap')] == [START, START + 90]
+    assert tapper.status.error is None
+
+
+def test_run_once_reports_errors_of_the_whole_wake(clock):
+    game = FakeGame(clock, balance=5000)
+    game.add_upgrade('mine', price=1000)
+    game.fail['buy-upgrade'] = 500
+    tapper = make_tapper(game, apply_daily_energy=False, balance_strategy=0)
+
+    async def main():
+        wake = asyncio.create_task(tapper.run_once())
+        await clock.run_until(START + 300)
+        return await wake
+
+    errors = asyncio.run(main())
+    # The taps after the failed upgrade succeed and clear the status, the wake still failed
+    assert errors == ['upgrade (money): http 500']
+    assert tapper.status.error is None
+    # Taps are sent before the wake ends, a batch run has no later wake to send them from
+    assert len(game.requests('tap')) == 1
+
+
+def test_history_records_cover_the_wakes_since_the_last_one(simulation, clock, monkeypatch):
+    records = []
+    monkeypatch.setattr('bot.core.tapper.settings.HISTORY_ENABLED', True)
+    monkeypatch.setattr('bot.core.tapper.history.record', records.append)
+    monkeypatch.setattr('bot.core.tapper.history.save_wake', lambda *_: None)
+    game = FakeGame(clock, balance=10_000)
+    game.add_upgrade('cheap', price=2000, profit=300)
+    tapper = make_tapper(game, balance_strategy=0)
+    simulation.start(tapper)
+    simulation.advance(3700)
+
+    first, second = records
+    assert second.finished_at >= START + 3600
+    assert second.wakes > 1
+    assert second.requests == sum(1 for time, _, _ in game.log if first.finished_at < time <= second.finished_at)
+    # The upgrades slept 7-30s before each purchase in their wakes
+    assert 7 * second.purchases <= second.duration < 3600
+
+
+def test_a_day_runs_in_under_a_second(simulation, game):
+    game.add_upgrade('mine', price=50_000, profit=500)
+    tapper = make_tapper(game)
+    started = perf_counter()
+    simulation.start(tapper)
+    simulation.advance(86400)
+
+    assert perf_counter() - started < 1
+    # Syncs drift by the merge window, so a day has one or two less than 24 hours
+    assert len(game.requests('sync')) >= 23
+    assert len(game.requests('tap')) > 100
+    assert game.requests('buy-upgrade')
+
+
+def test_virtual_clock_waits_for_tasks_to_block(clock):
+    woke = []
+
+    async def busy():
+        # Far more loop iterations than any fixed settle count before reaching the clock
+        for _ in range(500):
+            await asyncio.sleep(0)
+        await clock.sleep(10)
+        woke.append(clock.time())
+
+    async def main():
+        task = asyncio.create_task(busy())
+        await clock.run_until(START + 10)
+        await task
+
+    asyncio.run(main())
+    assert woke == [START + 10]
@@ -0,0 +1,42 @@
+import asyncio
+
+import httpx
+import pytest
+
+from bot.core.transport import AiohttpTransport, Http2Transport, RequestTimeout
+from bot.exceptions import TransportError
+
+TIMEOUT = RequestTimeout(connect=1, read=1, total=2)
+
+
+def post_with_http2(error: Exception):
+    def handler(request: httpx.Request):
+        raise error
+
+    async def main():
+        transport = Http2Transport(proxy=None)
+        transport.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        async with transport:
+            await transport.post(url='https://example.test/tap', headers={}, json=None, timeout=TIMEOUT)
+
+    asyncio.run(main())
+
+
+def test_http2_timeouts_are_timeout_errors():
+    with pytest.raises(TimeoutError):
+        post_with_http2(httpx.ReadTimeout("read timed out"))
+
+
+def test_http2_connection_failures_are_transport_errors():
+    with pytest.raises(TransportError):
+        post_with_http2(httpx.ConnectError("connection refused"))
+
+
+def test_aiohttp_connection_failures_are_transport_errors():
+    async def main():
+        async with AiohttpTransport() as transport:
+            # Nothing listens on port 1
+            await transport.post(url='http://127.0.0.1:1/tap', headers={}, json=None, timeout=TIMEOUT)
+
+    with pytest.raises(TransportError):
+        asyncio.run(main())